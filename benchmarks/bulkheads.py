@@ -0,0 +1,87 @@
+"""
+Measures API checkout latency while bulk imports of coupons run, with imports on the bulk pool or on the API pool.
+
+    python -m benchmarks.bulkheads --rows 50000 --imports 4
+
+Imports run in one transaction each, like /bulk/coupons, and are rolled back. Uses the database from the `db_*`
+and `db_bulk_*` settings
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+from uuid import uuid4
+
+from sqlalchemy import text
+
+from svc.api.models.bulk import BulkCouponModel
+from svc.api.models.coupon import CouponKind
+from svc.persist.database import Database, bulk_database, database
+from svc.persist.pool import checkout
+from svc.services.bulk.bulk_coupon_manager import BulkCouponManager
+from svc.services.bulk.dto import BulkCouponRecord
+
+_CHUNK_SIZE = 1000
+
+
+async def run_import(target: Database, rows: int) -> None:
+    connection = await checkout(target.engine)
+    try:
+        async with connection.begin() as transaction:
+            manager = BulkCouponManager(connection)
+            for offset in range(0, rows, _CHUNK_SIZE):
+                models = [
+                    BulkCouponModel(name=f"bench-{uuid4()}", active=True, value=100, kind=CouponKind.fixed)
+                    for _ in range(min(_CHUNK_SIZE, rows - offset))
+                ]
+                await manager.bulk_upsert(BulkCouponRecord.from_models(models))
+            await transaction.rollback()
+    finally:
+        await connection.close()
+
+
+async def probe(stop: asyncio.Event, interval: float) -> List[float]:
+    latencies: List[float] = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        connection = await checkout(database.engine)
+        try:
+            await connection.execute(text("SELECT 1"))
+        finally:
+            await connection.close()
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def measure(target: Database, rows: int, imports: int, probes: int) -> List[float]:
+    stop = asyncio.Event()
+    probe_tasks = [asyncio.create_task(probe(stop, 0.005)) for _ in range(probes)]
+    # Imports queued beyond the bulk pool queue limit are rejected, as they would be for concurrent uploads
+    await asyncio.gather(*(run_import(target, rows) for _ in range(imports)), return_exceptions=True)
+    stop.set()
+    return [latency for latencies in await asyncio.gather(*probe_tasks) for latency in latencies]
+
+
+def report(name: str, latencies: List[float]) -> None:
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(f"{name:<16} p50={quantiles[49] * 1000:.3f}ms p99={quantiles[98] * 1000:.3f}ms n={len(latencies)}")
+
+
+async def main(rows: int, imports: int, probes: int) -> None:
+    try:
+        for name, target in (("shared pool", database), ("bulk bulkhead", bulk_database)):
+            report(name, await measure(target, rows, imports, probes))
+    finally:
+        await bulk_database.shutdown()
+        await database.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--imports", type=int, default=4)
+    parser.add_argument("--probes", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.imports, args.probes))
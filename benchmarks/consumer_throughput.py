@@ -0,0 +1,52 @@
+"""
+Measures consumer throughput of order paid events for different worker concurrency against the in-memory broker.
+
+    python -m benchmarks.consumer_throughput --messages 2000 --concurrency 1 4 8 16
+
+Events reference orders without coupons, each one runs the coupon lookup against the database
+from the `db_*` and `db_consumer_*` settings
+"""
+import argparse
+import asyncio
+import time
+from typing import List
+from uuid import uuid4
+
+from svc.events.consumer import create_consumer
+from svc.persist.database import consumer_database
+from svc.settings import get_service_settings
+from tests.broker import InMemoryKafkaBroker
+
+
+async def measure(messages: int, concurrency: int) -> float:
+    settings = get_service_settings().copy(deep=True)
+    settings.kafka.consumer_concurrency = concurrency
+
+    broker = InMemoryKafkaBroker()
+    for _ in range(messages):
+        broker.publish("customer.order.paid", {"event": "customer-order-paid", "order_id": str(uuid4())})
+
+    consumer = create_consumer(
+        settings, consumer_database, client_factory=broker.client, producer_factory=broker.producer
+    )
+    started = time.perf_counter()
+    await consumer.start()
+    await broker.join(timeout=600)
+    await consumer.stop()
+    return messages / (time.perf_counter() - started)
+
+
+async def main(messages: int, concurrency: List[int]) -> None:
+    try:
+        for value in concurrency:
+            print(f"concurrency={value:<3} {await measure(messages, value):.0f} messages/s")
+    finally:
+        await consumer_database.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    args = parser.parse_args()
+    asyncio.run(main(args.messages, args.concurrency))
@@ -0,0 +1,66 @@
+"""
+Measures the decode stage of the Kafka consumer, from record value bytes to the message handed to the handler,
+for every available codec with full and partial validation.
+
+    python -m benchmarks.event_decoding --messages 100000
+"""
+import argparse
+import json
+import time
+from typing import Any, Callable, List
+from uuid import uuid4
+
+from svc.events.messages import OrderPaidMessage, PriceChangedMessage
+from svc.infrastructure.kafka.codecs import Codec, get_codecs
+from svc.infrastructure.kafka.message import partial_decoder
+
+
+def order_paid_values(messages: int) -> List[bytes]:
+    return [
+        json.dumps(
+            {"event": "customer-order-paid", "order_id": str(uuid4()), "created_at": "2024-01-01T00:00:00+00:00"}
+        ).encode()
+        for _ in range(messages)
+    ]
+
+
+def price_changed_values(messages: int) -> List[bytes]:
+    return [
+        json.dumps(
+            {
+                "event": "pricing-price-changed",
+                "warehouse_id": str(uuid4()),
+                "items": [{"product_id": str(uuid4()), "product_type": "alcohol", "purchase_price": 100}] * 10,
+            }
+        ).encode()
+        for _ in range(messages)
+    ]
+
+
+def measure(values: List[bytes], codec: Codec, decode: Callable[[Any], Any]) -> float:
+    started = time.perf_counter()
+    for value in values:
+        decode(codec.loads(value))
+    return len(values) / (time.perf_counter() - started)
+
+
+def main(messages: int) -> None:
+    order_paid = order_paid_values(messages)
+    price_changed = price_changed_values(messages // 10)
+    decoders = [
+        ("order paid, decode only", order_paid, lambda value: value),
+        ("order paid, full", order_paid, OrderPaidMessage.parse_obj),
+        ("order paid, order_id", order_paid, partial_decoder(OrderPaidMessage, "order_id")),
+        ("price changed, full", price_changed, PriceChangedMessage.parse_obj),
+    ]
+    for codec_cls in get_codecs().values():
+        codec = codec_cls()
+        for name, values, decode in decoders:
+            print(f"{codec.name:<8} {name:<24} {measure(values, codec, decode):>8.0f} messages/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100000)
+    args = parser.parse_args()
+    main(args.messages)
@@ -0,0 +1,58 @@
+"""
+Compares checkout plus a trivial query with per-checkout pre-ping and with background validation.
+
+    python -m benchmarks.pool_pre_ping --requests 2000 --concurrency 4
+
+Uses the database from the `db_*` settings
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from svc.settings import get_service_settings
+
+
+async def measure(engine: AsyncEngine, requests: int, concurrency: int) -> List[float]:
+    latencies: List[float] = []
+
+    async def worker(count: int) -> None:
+        for _ in range(count):
+            started = time.perf_counter()
+            async with engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+            latencies.append(time.perf_counter() - started)
+
+    # Warm the pool so both runs reuse connections
+    await asyncio.gather(*(worker(1) for _ in range(concurrency)))
+    latencies.clear()
+
+    await asyncio.gather(*(worker(requests // concurrency) for _ in range(concurrency)))
+    return latencies
+
+
+def report(name: str, latencies: List[float]) -> None:
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(f"{name:<22} p50={quantiles[49] * 1000:.3f}ms p99={quantiles[98] * 1000:.3f}ms n={len(latencies)}")
+
+
+async def main(requests: int, concurrency: int) -> None:
+    settings = get_service_settings().db
+    for name, pre_ping in (("pre-ping", True), ("background validation", False)):
+        engine = create_async_engine(settings.url, pool_size=concurrency, pool_pre_ping=pre_ping)
+        try:
+            report(name, await measure(engine, requests, concurrency))
+        finally:
+            await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
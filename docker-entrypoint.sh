@@ -9,6 +9,17 @@ case "$1" in
     api)
         exec berglas exec -- gunicorn -w ${GUNICORN_WORKERS:-1} -k uvicorn.workers.UvicornWorker -b 0.0.0.0:${APP_HTTP_PORT:-8000} --access-logfile '-' svc.app:create_app
         ;;
+    consumer)
+        exec berglas exec -- python3 -m svc.consumer
+        ;;
+    replay-dead-letters)
+        shift
+        exec berglas exec -- python3 -m svc.dead_letters "$@"
+        ;;
+    backfill)
+        shift
+        exec berglas exec -- python3 -m svc.backfill "$@"
+        ;;
     tests)
         exec pytest tests
         ;;
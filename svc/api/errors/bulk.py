@@ -0,0 +1,9 @@
+from typing import Dict, Optional
+
+from svc.api.errors.base import ApiError
+from svc.api.models.error_code import ErrorCode
+
+
+class UnsupportedContentTypeError(ApiError):
+    def __init__(self, data: Optional[Dict] = None) -> None:
+        super().__init__(ErrorCode.unsupported_content_type, data)
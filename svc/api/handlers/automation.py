@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends
 from starlette.responses import JSONResponse
+from starlette.status import HTTP_503_SERVICE_UNAVAILABLE
 
 from svc.services.infrastructure.healthcheck_manager import HealthcheckManager
 
@@ -10,3 +11,12 @@ router = APIRouter(prefix="")
 async def health(healthcheck_manager: HealthcheckManager = Depends(HealthcheckManager)) -> JSONResponse:
     await healthcheck_manager.check_db()
     return JSONResponse(None)
+
+
+@router.get("/ready")
+async def ready(healthcheck_manager: HealthcheckManager = Depends(HealthcheckManager)) -> JSONResponse:
+    if not healthcheck_manager.is_ready():
+        return JSONResponse(None, status_code=HTTP_503_SERVICE_UNAVAILABLE)
+
+    await healthcheck_manager.check_db()
+    return JSONResponse(None)
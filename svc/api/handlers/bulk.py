@@ -1,11 +1,41 @@
-from fastapi import APIRouter, Depends
+from typing import AsyncIterable, AsyncIterator
 
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+
+from svc.api.errors.bulk import UnsupportedContentTypeError
 from svc.api.models.base_model import ApiResponse
-from svc.api.models.bulk import BulkCouponRequest, BulkCouponValueRequest, BulkResponse
+from svc.api.models.bulk import BulkCouponRequest, BulkCouponValueRequest, BulkResponse, BulkResultModel
 from svc.services.bulk.bulk_coupon_service import BulkCouponService
+from svc.services.bulk.stream import RawItem, parse_csv, parse_ndjson
+from svc.settings import BulkUploadConfig, Settings, get_service_settings
 
 router = APIRouter(prefix="/bulk")
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+CSV_MEDIA_TYPE = "text/csv"
+# Cells of these CSV columns hold semicolon separated ids and true or false
+_CSV_LIST_FIELDS = {"users", "categories", "warehouses"}
+_CSV_BOOL_FIELDS = {"active"}
+_STREAM_RESPONSES = {
+    200: {"content": {NDJSON_MEDIA_TYPE: {"schema": BulkResultModel.schema()}}, "description": "A result per line"}
+}
+
+
+def _parse_body(request: Request, config: BulkUploadConfig) -> AsyncIterable[RawItem]:
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type == NDJSON_MEDIA_TYPE:
+        return parse_ndjson(request.stream(), config.max_line_bytes)
+    if content_type == CSV_MEDIA_TYPE:
+        return parse_csv(request.stream(), _CSV_LIST_FIELDS, _CSV_BOOL_FIELDS, config.max_line_bytes)
+
+    raise UnsupportedContentTypeError({"supported": [NDJSON_MEDIA_TYPE, CSV_MEDIA_TYPE]})
+
+
+async def _dump_ndjson(results: AsyncIterator[BulkResultModel]) -> AsyncIterator[str]:
+    async for result in results:
+        yield f"{result.json()}\n"
+
 
 @router.post("/coupons", response_model=ApiResponse[BulkResponse])
 async def bulk_upload_coupons(
@@ -29,3 +59,29 @@ async def bulk_upload_coupon_values(
     return ApiResponse[BulkResponse](
         result=BulkResponse(items=bulk_result),
     )
+
+
+@router.post("/coupons/stream", response_class=StreamingResponse, responses=_STREAM_RESPONSES)
+async def bulk_stream_coupons(
+    request: Request,
+    bulk_service: BulkCouponService = Depends(BulkCouponService),
+    settings: Settings = Depends(get_service_settings),
+) -> StreamingResponse:
+    """
+    Takes NDJSON, one coupon per line, or CSV with a header row. Items are saved a chunk at a time
+    and a result per item is streamed back as NDJSON, in the order of the items
+    """
+    items = _parse_body(request, settings.bulk_upload)
+    results = bulk_service.stream_coupons(items, settings.bulk_upload.chunk_size)
+    return StreamingResponse(_dump_ndjson(results), media_type=NDJSON_MEDIA_TYPE)
+
+
+@router.post("/coupons/values/stream", response_class=StreamingResponse, responses=_STREAM_RESPONSES)
+async def bulk_stream_coupon_values(
+    request: Request,
+    bulk_service: BulkCouponService = Depends(BulkCouponService),
+    settings: Settings = Depends(get_service_settings),
+) -> StreamingResponse:
+    items = _parse_body(request, settings.bulk_upload)
+    results = bulk_service.stream_coupon_values(items, settings.bulk_upload.chunk_size)
+    return StreamingResponse(_dump_ndjson(results), media_type=NDJSON_MEDIA_TYPE)
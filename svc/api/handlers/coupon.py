@@ -1,8 +1,10 @@
+from functools import partial
 from uuid import UUID
 
 import fastapi
 from fastapi import Depends
 
+from svc.api.idempotency import Idempotency
 from svc.api.models.base_model import ApiResponse
 from svc.api.models.coupon import (
     AddOrderCouponRequest,
@@ -29,8 +31,9 @@ async def add_order_coupon(
     order_id: UUID,
     request: AddOrderCouponRequest,
     coupon_service: CouponService = Depends(CouponService),
+    idempotency: Idempotency = Depends(Idempotency),
 ) -> ApiResponse[OrderCouponDetail]:
-    return ApiResponse(result=await coupon_service.add_coupon(order_id, request))
+    return await idempotency.run(OrderCouponDetail, partial(coupon_service.add_coupon, order_id, request), request)
 
 
 @router.post("/{coupon_id}/orders/{order_id}", response_model=ApiResponse[OrderCouponDetail])
@@ -39,8 +42,13 @@ async def recalculate_coupon_for_order(
     order_id: UUID,
     request: RecalculateOrderCouponRequest,
     coupon_service: CouponService = Depends(CouponService),
+    idempotency: Idempotency = Depends(Idempotency),
 ) -> ApiResponse[OrderCouponDetail]:
-    return ApiResponse(result=await coupon_service.recalculate_coupon_discount(order_id, coupon_id, request))
+    return await idempotency.run(
+        OrderCouponDetail,
+        partial(coupon_service.recalculate_coupon_discount, order_id, coupon_id, request),
+        request,
+    )
 
 
 @router.delete("/{coupon_id}/orders/{order_id}", response_model=ApiResponse[OrderCouponDetail])
@@ -48,13 +56,15 @@ async def delete_order_coupon(
     coupon_id: UUID,
     order_id: UUID,
     coupon_service: CouponService = Depends(CouponService),
+    idempotency: Idempotency = Depends(Idempotency),
 ) -> ApiResponse[OrderCouponDetail]:
-    return ApiResponse(result=await coupon_service.delete_coupon(coupon_id, order_id))
+    return await idempotency.run(OrderCouponDetail, partial(coupon_service.delete_coupon, coupon_id, order_id))
 
 
 @router.post("/referral", response_model=ApiResponse[str])
 async def create_referral_coupon(
     request: CreateReferralCouponRequest,
     coupon_service: CouponService = Depends(CouponService),
+    idempotency: Idempotency = Depends(Idempotency),
 ) -> ApiResponse[str]:
-    return ApiResponse(result=await coupon_service.create_referral_coupon(request))
+    return await idempotency.run(str, partial(coupon_service.create_referral_coupon, request), request)
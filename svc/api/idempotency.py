@@ -0,0 +1,37 @@
+from typing import Any, Awaitable, Callable, Optional, Type, TypeVar
+
+from fastapi import Depends, Header, Request
+
+from svc.api.models.base_model import ApiResponse
+from svc.services.cache import DistributedCacheRegistry
+from svc.services.coalescing import canonical_hash
+
+T = TypeVar("T")
+
+
+class Idempotency:
+    """
+    Replays the stored response of a request with the same `Idempotency-Key` header, route and body
+    instead of executing it again. Only successful responses are stored, failed requests may be retried
+    """
+
+    def __init__(
+        self,
+        request: Request,
+        idempotency_key: Optional[str] = Header(None),
+        cache_registry: DistributedCacheRegistry = Depends(DistributedCacheRegistry),
+    ) -> None:
+        self._request = request
+        self._idempotency_key = idempotency_key
+        self._cache_registry = cache_registry
+
+    async def run(self, result_type: Type[T], call: Callable[[], Awaitable[T]], body: Any = None) -> ApiResponse[T]:
+        if not self._idempotency_key:
+            return ApiResponse(result=await call())
+
+        async def execute() -> str:
+            return ApiResponse(result=await call()).json()
+
+        key = canonical_hash(self._idempotency_key, self._request.method, self._request.url.path, body)
+        payload = await self._cache_registry.idempotent_responses.run(key, execute)
+        return ApiResponse[result_type].parse_raw(payload)  # type: ignore[valid-type]
@@ -18,3 +18,4 @@ class ErrorCode(str, Enum):
     gift_settings_min_sum = "gift_settings_min_sum"
     user_not_eligible_to_use_coupon = "user_not_eligible_to_use_coupon"
     warehouse_not_found = "warehouse_not_found"
+    unsupported_content_type = "unsupported_content_type"
@@ -8,16 +8,34 @@ from svc.infrastructure.catalog.client import CatalogClient
 from svc.infrastructure.logging import configure_logging
 from svc.infrastructure.metrics import configure_metrics, errors_counter
 from svc.infrastructure.traces import configure_traces
-from svc.persist.database import database
+from svc.persist.database import bulk_database, conditions_database, consumer_database, database
 from svc.router import prepare_router
+from svc.services.adapters.warehouse_directory import warehouse_directory
+from svc.services.invalidation import invalidation_bus
+from svc.services.outbox_relay import outbox_relay
+from svc.services.snapshot_builder import snapshot_publisher
 from svc.settings import get_service_settings
 
 
 async def on_startup() -> None:
     await database.startup()
+    await conditions_database.startup()
+    await bulk_database.startup()
+    await consumer_database.startup()
+    await warehouse_directory.start()
+    await invalidation_bus.start()
+    await snapshot_publisher.start()
+    await outbox_relay.start()
 
 
 async def on_shutdown() -> None:
+    await outbox_relay.stop()
+    await snapshot_publisher.stop()
+    await invalidation_bus.stop()
+    await warehouse_directory.stop()
+    await consumer_database.shutdown()
+    await bulk_database.shutdown()
+    await conditions_database.shutdown()
     await database.shutdown()
 
 
@@ -25,7 +43,6 @@ def create_app() -> FastAPI:
     settings = get_service_settings()
     configure_logging(settings.logging_profile)
 
-    consumer = create_consumer(settings, database)
     warehouse_client = WarehouseGeneralClient.instance()
     customer_client = CustomerProfileClient.instance()
     catalog_client = CatalogClient.instance()
@@ -35,17 +52,21 @@ def create_app() -> FastAPI:
         version="0.0.0",
         on_startup=[
             on_startup,
-            consumer.start,
         ],
         on_shutdown=[
             on_shutdown,
-            consumer.stop,
             warehouse_client.shutdown,
             customer_client.shutdown,
             catalog_client.shutdown,
         ],
     )
 
+    if settings.kafka.consumer_enabled:
+        consumer = create_consumer(settings, consumer_database)
+        app.router.on_startup.append(consumer.start)
+        # Lanes still draining need the pools, the consumer stops before they are shut down
+        app.router.on_shutdown.insert(0, consumer.stop)
+
     prepare_router(app.router)
 
     configure_traces(app, settings.tracing)
@@ -0,0 +1,301 @@
+"""
+Replays order paid history into users_coupons.order_paid, outside of the live consumer group.
+
+    python -m svc.backfill --from-timestamp 2024-01-01T00:00:00+00:00 --to-timestamp 2024-01-02T00:00:00+00:00
+    python -m svc.backfill --from-offset 1000 --partitions 0 1 --checkpoint paid.json --dry-run
+
+Partitions are replayed in parallel, each batch in one transaction on the bulk database pool.
+The next offset of a partition is saved to the checkpoint file after every batch,
+a rerun with the same file resumes from there. A dry run logs the user coupons that would change
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncContextManager, AsyncIterator, Callable, Dict, List, Optional
+
+from aiokafka import AIOKafkaConsumer, TopicPartition
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from svc.events.initiate import create_coupon_service
+from svc.events.messages import OrderPaidMessage
+from svc.infrastructure.kafka.codecs import Codec, get_codec
+from svc.infrastructure.kafka.message import partial_decoder
+from svc.infrastructure.logging import configure_logging
+from svc.persist.database import bulk_database
+from svc.persist.pool import checkout
+from svc.settings import Settings, get_service_settings
+
+logger = logging.getLogger(__name__)
+
+ORDER_PAID_TOPIC = "customer.order.paid"
+_FETCH_TIMEOUT_MS = 1000
+# A partition whose remaining offsets are never delivered, e.g. compacted or deleted, ends after this many empty fetches
+_MAX_EMPTY_FETCHES = 10
+
+_decode_order_paid = partial_decoder(OrderPaidMessage, "order_id")
+
+
+def parse_timestamp(value: str) -> datetime:
+    """ISO 8601 timestamp, naive ones are UTC rather than the local time of the host"""
+    return _as_utc(datetime.fromisoformat(value))
+
+
+def _as_utc(timestamp: datetime) -> datetime:
+    return timestamp if timestamp.tzinfo is not None else timestamp.replace(tzinfo=timezone.utc)
+
+
+@dataclass
+class PartitionRange:
+    partition: int
+    # Replays offsets from `start` up to, but not including, `end`
+    start: int
+    end: int
+
+
+@dataclass
+class BackfillReport:
+    messages: int = 0
+    changed_rows: int = 0
+
+
+class Checkpoint:
+    """Next offset to replay per partition, kept in a JSON file when a path is given"""
+
+    def __init__(self, path: Optional[Path], topic: str) -> None:
+        self._path = path
+        self._topic = topic
+        self._offsets: Dict[int, int] = {}
+        if path is not None and path.exists():
+            stored = json.loads(path.read_text())
+            if stored["topic"] != topic:
+                raise ValueError(f"Checkpoint {path} belongs to topic {stored['topic']}")
+            self._offsets = {int(partition): offset for partition, offset in stored["offsets"].items()}
+
+    def get(self, partition: int) -> Optional[int]:
+        return self._offsets.get(partition)
+
+    def save(self, partition: int, offset: int) -> None:
+        self._offsets[partition] = offset
+        if self._path is None:
+            return
+
+        # Replaced at once, an interrupted write leaves the previous checkpoint
+        temporary = self._path.with_suffix(f"{self._path.suffix}.tmp")
+        temporary.write_text(json.dumps({"topic": self._topic, "offsets": self._offsets}))
+        os.replace(temporary, self._path)
+
+
+@asynccontextmanager
+async def _bulk_connection() -> AsyncIterator[AsyncConnection]:
+    connection = await checkout(bulk_database.engine)
+    try:
+        yield connection
+    finally:
+        await connection.close()
+
+
+async def resolve_ranges(
+    client: AIOKafkaConsumer,
+    topic: str,
+    partitions: Optional[List[int]] = None,
+    from_offset: Optional[int] = None,
+    to_offset: Optional[int] = None,
+    from_timestamp: Optional[datetime] = None,
+    to_timestamp: Optional[datetime] = None,
+) -> List[PartitionRange]:
+    """
+    Offset ranges per partition, timestamps are resolved to the first offset at or after them.
+    Naive timestamps are UTC
+    """
+    await client.topics()
+    known_partitions = client.partitions_for_topic(topic)
+    if not known_partitions:
+        raise ValueError(f"Topic {topic} has no partitions")
+
+    topic_partitions = [TopicPartition(topic, it) for it in sorted(partitions or known_partitions)]
+    beginnings = await client.beginning_offsets(topic_partitions)
+    ends = await client.end_offsets(topic_partitions)
+
+    async def at_time(timestamp: Optional[datetime], defaults: Dict[TopicPartition, int]) -> Dict[TopicPartition, int]:
+        if timestamp is None:
+            return defaults
+
+        timestamp_ms = int(_as_utc(timestamp).timestamp() * 1000)
+        found = await client.offsets_for_times({it: timestamp_ms for it in topic_partitions})
+        return {it: ends[it] if found[it] is None else found[it].offset for it in topic_partitions}
+
+    starts = await at_time(from_timestamp, beginnings)
+    stops = await at_time(to_timestamp, ends)
+    return [
+        PartitionRange(
+            partition=it.partition,
+            start=max(starts[it], beginnings[it], from_offset or 0),
+            end=min(stops[it], ends[it], ends[it] if to_offset is None else to_offset),
+        )
+        for it in topic_partitions
+    ]
+
+
+async def replay_partition(
+    client: AIOKafkaConsumer,
+    topic: str,
+    partition_range: PartitionRange,
+    checkpoint: Checkpoint,
+    connection: AsyncConnection,
+    batch_size: int,
+    dry_run: bool,
+    codec: Codec,
+) -> BackfillReport:
+    report = BackfillReport()
+    partition = TopicPartition(topic, partition_range.partition)
+    position = max(partition_range.start, checkpoint.get(partition_range.partition) or 0)
+    client.assign([partition])
+    client.seek(partition, position)
+    coupon_service = create_coupon_service(connection)
+    empty_fetches = 0
+    while position < partition_range.end:
+        batches = await client.getmany(
+            partition, timeout_ms=_FETCH_TIMEOUT_MS, max_records=min(batch_size, partition_range.end - position)
+        )
+        records = [it for it in batches.get(partition, []) if it.offset < partition_range.end]
+        if not records:
+            # Offsets up to the end may hold no records, e.g. transaction markers the fetch skips
+            if await client.position(partition) >= partition_range.end:
+                break
+            empty_fetches += 1
+            if empty_fetches >= _MAX_EMPTY_FETCHES:
+                logger.warning(
+                    f"No records of {topic}:{partition_range.partition} from offset {position} "
+                    f"after {empty_fetches} fetches, stopping before offset {partition_range.end}"
+                )
+                break
+            continue
+
+        empty_fetches = 0
+
+        order_ids = []
+        for msg in records:
+            try:
+                order_ids.append(_decode_order_paid(codec.loads(msg.value)).order_id)
+            except ValueError:
+                logger.exception(f"Skip malformed message {topic}:{msg.partition}:{msg.offset}")
+        order_ids = list(dict.fromkeys(order_ids))
+
+        if dry_run:
+            unpaid = await coupon_service.get_unpaid_order_coupons(order_ids)
+            for user_coupon_id, order_id in unpaid:
+                logger.info(f"[order_id={order_id}] Would set user coupon {user_coupon_id} paid")
+            report.changed_rows += len(unpaid)
+        else:
+            report.changed_rows += await coupon_service.process_paid_batch(order_ids)
+            checkpoint.save(partition_range.partition, records[-1].offset + 1)
+
+        report.messages += len(records)
+        position = records[-1].offset + 1
+
+    logger.info(f"Replayed partition {partition_range.partition} of {topic}: {report}")
+    return report
+
+
+async def backfill(
+    settings: Settings,
+    partitions: Optional[List[int]] = None,
+    from_offset: Optional[int] = None,
+    to_offset: Optional[int] = None,
+    from_timestamp: Optional[datetime] = None,
+    to_timestamp: Optional[datetime] = None,
+    batch_size: int = 1000,
+    parallelism: int = 4,
+    checkpoint_path: Optional[Path] = None,
+    dry_run: bool = False,
+    client_factory: Callable[..., AIOKafkaConsumer] = AIOKafkaConsumer,
+    connection_factory: Callable[[], AsyncContextManager[AsyncConnection]] = _bulk_connection,
+) -> BackfillReport:
+    def create_client() -> AIOKafkaConsumer:
+        # No group, the live consumer group and its committed offsets are left alone
+        return client_factory(bootstrap_servers=settings.kafka.bootstrap, group_id=None, enable_auto_commit=False)
+
+    client = create_client()
+    await client.start()
+    try:
+        ranges = await resolve_ranges(
+            client, ORDER_PAID_TOPIC, partitions, from_offset, to_offset, from_timestamp, to_timestamp
+        )
+    finally:
+        await client.stop()
+
+    checkpoint = Checkpoint(checkpoint_path, ORDER_PAID_TOPIC)
+    codec = get_codec(settings.kafka.consumer_codec)
+    semaphore = asyncio.Semaphore(parallelism)
+
+    async def replay(partition_range: PartitionRange) -> BackfillReport:
+        async with semaphore:
+            partition_client = create_client()
+            await partition_client.start()
+            try:
+                async with connection_factory() as connection:
+                    return await replay_partition(
+                        partition_client,
+                        ORDER_PAID_TOPIC,
+                        partition_range,
+                        checkpoint,
+                        connection,
+                        batch_size,
+                        dry_run,
+                        codec,
+                    )
+            finally:
+                await partition_client.stop()
+
+    report = BackfillReport()
+    for partition_report in await asyncio.gather(*(replay(it) for it in ranges)):
+        report.messages += partition_report.messages
+        report.changed_rows += partition_report.changed_rows
+    logger.info(f"{'Would change' if dry_run else 'Changed'} {report.changed_rows} rows for {report.messages} messages")
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--partitions", type=int, nargs="+", default=None, help="All partitions by default")
+    parser.add_argument("--from-offset", type=int, default=None)
+    parser.add_argument("--to-offset", type=int, default=None, help="Exclusive, the end of the partition by default")
+    parser.add_argument("--from-timestamp", type=parse_timestamp, default=None, help="Naive ones are UTC")
+    parser.add_argument("--to-timestamp", type=parse_timestamp, default=None, help="Naive ones are UTC")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--parallelism", type=int, default=4, help="Partitions replayed at the same time")
+    parser.add_argument("--checkpoint", type=Path, default=None, help="Resume from and save progress to this file")
+    parser.add_argument("--dry-run", action="store_true", help="Only log the rows that would change")
+    args = parser.parse_args()
+
+    settings = get_service_settings()
+    configure_logging(settings.logging_profile)
+
+    async def run() -> None:
+        try:
+            await backfill(
+                settings,
+                partitions=args.partitions,
+                from_offset=args.from_offset,
+                to_offset=args.to_offset,
+                from_timestamp=args.from_timestamp,
+                to_timestamp=args.to_timestamp,
+                batch_size=args.batch_size,
+                parallelism=args.parallelism,
+                checkpoint_path=args.checkpoint,
+                dry_run=args.dry_run,
+            )
+        finally:
+            await bulk_database.shutdown()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
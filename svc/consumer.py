@@ -0,0 +1,47 @@
+import asyncio
+import signal
+
+from prometheus_client import start_http_server
+
+from svc.events.consumer import create_consumer
+from svc.infrastructure.logging import configure_logging
+from svc.infrastructure.traces import configure_tracer_provider
+from svc.persist.database import consumer_database
+from svc.settings import get_service_settings
+
+
+async def run() -> None:
+    settings = get_service_settings()
+    consumer = create_consumer(settings, consumer_database)
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    await consumer_database.startup()
+    await consumer.start()
+    try:
+        stopped = asyncio.create_task(stopping.wait())
+        consuming = asyncio.create_task(consumer.wait())
+        await asyncio.wait([stopped, consuming], return_when=asyncio.FIRST_COMPLETED)
+        stopped.cancel()
+        if consuming.done():
+            # The process exits with the failure of the consumer loop and gets restarted
+            consuming.result()
+            raise RuntimeError("Kafka consumer loop exited")
+    finally:
+        await consumer.stop()
+        await consumer_database.shutdown()
+
+
+def main() -> None:
+    settings = get_service_settings()
+    configure_logging(settings.logging_profile)
+    configure_tracer_provider(settings.tracing)
+    start_http_server(settings.kafka.consumer_metrics_port)
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Replays dead letters of the consumer group through its first retry topic, for a new round of attempts.
+
+    python -m svc.dead_letters --limit 100
+    python -m svc.dead_letters --dry-run
+
+Replayed dead letters are committed for a separate `<group_id>.dlq-replay` group,
+the replay stops once no dead letter arrives for `--idle-timeout` seconds
+"""
+import argparse
+import asyncio
+import logging
+from typing import Callable, Dict, Optional
+
+from aiokafka import AIOKafkaConsumer, AIOKafkaProducer, TopicPartition
+
+from svc.events.consumer import create_retry_publisher
+from svc.infrastructure.kafka.retry import ERROR_HEADER
+from svc.infrastructure.logging import configure_logging
+from svc.settings import Settings, get_service_settings
+
+logger = logging.getLogger(__name__)
+
+
+async def replay(
+    settings: Settings,
+    limit: Optional[int] = None,
+    dry_run: bool = False,
+    idle_timeout: float = 5.0,
+    client_factory: Callable[..., AIOKafkaConsumer] = AIOKafkaConsumer,
+    producer_factory: Callable[..., AIOKafkaProducer] = AIOKafkaProducer,
+) -> int:
+    """Returns the number of replayed dead letters"""
+    retry = create_retry_publisher(settings, producer_factory)
+    if retry is None:
+        raise RuntimeError("Dead letters are replayed through retry topics, enable consumer retries")
+
+    client = client_factory(
+        retry.dead_letter_topic,
+        bootstrap_servers=settings.kafka.bootstrap,
+        group_id=f"{settings.kafka.group_id}.dlq-replay",
+        enable_auto_commit=False,
+        auto_offset_reset="earliest",
+    )
+    await client.start()
+    await retry.start()
+    replayed = 0
+    try:
+        while limit is None or replayed < limit:
+            max_records = None if limit is None else limit - replayed
+            batches = await client.getmany(timeout_ms=int(idle_timeout * 1000), max_records=max_records)
+            if not batches:
+                break
+
+            positions: Dict[TopicPartition, int] = {}
+            for partition, records in batches.items():
+                for msg in records:
+                    error = next((value.decode() for key, value in msg.headers if key == ERROR_HEADER), "")
+                    if dry_run:
+                        logger.info(f"Would replay {retry.original_topic(msg)} message {msg.key!r}: {error}")
+                    else:
+                        await retry.replay(msg)
+                    positions[partition] = msg.offset + 1
+                    replayed += 1
+            if not dry_run:
+                await client.commit(positions)
+    finally:
+        await retry.stop()
+        await client.stop()
+
+    logger.info(f"{'Found' if dry_run else 'Replayed'} {replayed} dead letters")
+    return replayed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, default=None, help="Replay at most this many dead letters")
+    parser.add_argument("--dry-run", action="store_true", help="Only log the dead letters, without committing")
+    parser.add_argument("--idle-timeout", type=float, default=5.0)
+    args = parser.parse_args()
+
+    settings = get_service_settings()
+    configure_logging(settings.logging_profile)
+    asyncio.run(replay(settings, limit=args.limit, dry_run=args.dry_run, idle_timeout=args.idle_timeout))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,80 @@
-from svc.events.message_handlers import handle_order_canceled, handle_order_paid
-from svc.events.messages import OrderCanceledMessage, OrderPaidMessage
+from operator import itemgetter
+from typing import Any, Callable, Coroutine, Hashable, List, Optional, Tuple, Type
+
+from aiokafka import AIOKafkaConsumer, AIOKafkaProducer
+
+from svc.events.message_handlers import (
+    handle_order_canceled,
+    handle_order_paid,
+    handle_orders_canceled,
+    handle_orders_paid,
+    handle_price_changed,
+)
+from svc.events.messages import OrderCanceledMessage, OrderPaidMessage, PriceChangedMessage
+from svc.infrastructure.kafka.codecs import get_codec
 from svc.infrastructure.kafka.consumer import KafkaConsumer, TopicInfo
+from svc.infrastructure.kafka.message import Message, partial_decoder
+from svc.infrastructure.kafka.retry import RetryPublisher
 from svc.infrastructure.traces import set_trace_context_var
 from svc.persist.database import Database
+from svc.services.cache import DistributedCacheRegistry
 from svc.settings import Settings
 
+_Handler = Callable[..., Coroutine[Any, Any, None]]
+# Topic, message class, handler, batch handler, key and decoder
+_Topic = Tuple[
+    str, Type[Message], _Handler, Optional[_Handler], Callable[[Any], Hashable], Optional[Callable[[Any], Message]]
+]
+
+
+def create_retry_publisher(
+    settings: Settings,
+    producer_factory: Callable[..., AIOKafkaProducer] = AIOKafkaProducer,
+) -> Optional[RetryPublisher]:
+    if not settings.kafka.consumer_retry_enabled:
+        return None
+
+    return RetryPublisher(
+        settings.kafka.bootstrap,
+        settings.kafka.group_id,
+        settings.kafka.consumer_retry_delays,
+        producer_factory=producer_factory,
+    )
+
 
-def create_consumer(settings: Settings, database: Database) -> KafkaConsumer:
-    topics = [
-        ("customer.order.canceled", OrderCanceledMessage, handle_order_canceled),
-        ("customer.order.paid", OrderPaidMessage, handle_order_paid),
+def create_consumer(
+    settings: Settings,
+    database: Database,
+    client_factory: Callable[..., AIOKafkaConsumer] = AIOKafkaConsumer,
+    producer_factory: Callable[..., AIOKafkaProducer] = AIOKafkaProducer,
+) -> KafkaConsumer:
+    # Batches are applied in this order, payments of a batch before its cancellations.
+    # Order handlers read nothing but the order id, only it is validated
+    topics: List[_Topic] = [
+        (
+            "customer.order.paid",
+            OrderPaidMessage,
+            handle_order_paid,
+            handle_orders_paid,
+            itemgetter("order_id"),
+            partial_decoder(OrderPaidMessage, "order_id"),
+        ),
+        (
+            "customer.order.canceled",
+            OrderCanceledMessage,
+            handle_order_canceled,
+            handle_orders_canceled,
+            itemgetter("order_id"),
+            partial_decoder(OrderCanceledMessage, "order_id"),
+        ),
+        (
+            "pricing.product.price.changed",
+            PriceChangedMessage,
+            handle_price_changed,
+            None,
+            itemgetter("warehouse_id"),
+            None,
+        ),
     ]
     consumer = KafkaConsumer(
         [t for t, *_ in topics],
@@ -17,11 +82,28 @@ def create_consumer(settings: Settings, database: Database) -> KafkaConsumer:
         settings.kafka.group_id,
         database,
         set_trace_context_var,
+        client_factory,
+        concurrency=settings.kafka.consumer_concurrency,
+        max_pending=settings.kafka.consumer_max_pending,
+        batch_size=settings.kafka.consumer_batch_size,
+        batch_linger=settings.kafka.consumer_batch_linger_ms / 1000,
+        commit_batch_size=settings.kafka.consumer_commit_batch_size,
+        commit_interval=settings.kafka.consumer_commit_interval_ms / 1000,
+        processed_events=DistributedCacheRegistry.processed_events,
+        retry=create_retry_publisher(settings, producer_factory),
+        codec=get_codec(settings.kafka.consumer_codec),
     )
 
-    for topic, message_cls, handler in topics:
+    for topic, message_cls, handler, batch_handler, key, decoder in topics:
         consumer.register_topic_handler(
-            topic, TopicInfo(message_cls=message_cls, handler=handler)  # type:ignore[arg-type]
+            topic,
+            TopicInfo(
+                message_cls=message_cls,
+                handler=handler,
+                key=key,
+                batch_handler=batch_handler,
+                decoder=decoder,
+            ),
         )
 
     return consumer
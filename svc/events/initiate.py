@@ -1,8 +1,15 @@
+from pricing.api_client.client import PricingClient
 from sqlalchemy.ext.asyncio import AsyncConnection
 
+from svc.infrastructure.pricing.pricing_adapter import PricingAdapter
+from svc.infrastructure.pricing.pricing_manager import PricingManager
+from svc.services.cache import DistributedCacheRegistry
+from svc.services.coupon.coupon_events import CouponEventOutbox
 from svc.services.coupon.coupon_manager import CouponManager
 from svc.services.coupon.coupon_service import CouponService
+from svc.services.coupon.order_coupon_index import OrderCouponIndex
 from svc.services.gift.gift_manager import GiftManager
+from svc.services.infrastructure.metrics_registry import get_metrics_registry
 from svc.services.uow import UnitOfWork
 from svc.settings import get_service_settings
 
@@ -20,5 +27,24 @@ def create_coupon_service(connection: AsyncConnection) -> CouponService:
         config=get_service_settings(),
         uow=UnitOfWork(
             connection=connection,
+            config=get_service_settings(),
+        ),
+        order_coupon_index=OrderCouponIndex(
+            cache_registry=DistributedCacheRegistry(),
+            config=get_service_settings(),
+        ),
+        coupon_events=CouponEventOutbox(
+            connection=connection,
+            config=get_service_settings(),
+        ),
+    )
+
+
+def create_pricing_manager() -> PricingManager:
+    return PricingManager(
+        pricing_adapter=PricingAdapter(
+            pricing_client=PricingClient.instance(),
         ),
+        cache_registry=DistributedCacheRegistry(),
+        metrics_registry=get_metrics_registry(),
     )
@@ -1,7 +1,11 @@
+from typing import List
+
 from sqlalchemy.ext.asyncio import AsyncConnection
 
-from svc.events.initiate import create_coupon_service
-from svc.events.messages import OrderCanceledMessage, OrderPaidMessage
+from svc.api.models.order import ProductType
+from svc.events.initiate import create_coupon_service, create_pricing_manager
+from svc.events.messages import OrderCanceledMessage, OrderPaidMessage, PriceChangedMessage
+from svc.settings import get_service_settings
 
 
 async def handle_order_canceled(message: OrderCanceledMessage, connection: AsyncConnection) -> None:
@@ -12,3 +16,30 @@ async def handle_order_canceled(message: OrderCanceledMessage, connection: Async
 async def handle_order_paid(message: OrderPaidMessage, connection: AsyncConnection) -> None:
     coupon_service = create_coupon_service(connection)
     await coupon_service.process_paid(order_id=message.order_id)
+
+
+async def handle_orders_canceled(messages: List[OrderCanceledMessage], connection: AsyncConnection) -> None:
+    coupon_service = create_coupon_service(connection)
+    await coupon_service.process_cancelled_batch(order_ids=list(dict.fromkeys(it.order_id for it in messages)))
+
+
+async def handle_orders_paid(messages: List[OrderPaidMessage], connection: AsyncConnection) -> None:
+    coupon_service = create_coupon_service(connection)
+    await coupon_service.process_paid_batch(order_ids=list(dict.fromkeys(it.order_id for it in messages)))
+
+
+async def handle_price_changed(message: PriceChangedMessage, connection: AsyncConnection) -> None:
+    pricing_manager = create_pricing_manager()
+    # Purchase prices are requested (and cached) for alcohol products only
+    items = [it for it in message.items if it.product_type == ProductType.alcohol]
+
+    await pricing_manager.set_product_prices(
+        warehouse_id=message.warehouse_id,
+        purchase_prices={it.product_id: it.purchase_price for it in items if it.purchase_price is not None},
+    )
+
+    stale_product_ids = [it.product_id for it in items if it.purchase_price is None]
+    if get_service_settings().price_events.warm_up_enabled:
+        await pricing_manager.warm_product_prices(message.warehouse_id, stale_product_ids)
+    else:
+        await pricing_manager.evict_product_prices(message.warehouse_id, stale_product_ids)
@@ -1,5 +1,9 @@
+from typing import List, Optional
 from uuid import UUID
 
+from pydantic import BaseModel
+
+from svc.api.models.order import ProductType
 from svc.infrastructure.kafka.message import Message
 
 
@@ -11,3 +15,15 @@ class OrderCanceledMessage(Message):
 class OrderPaidMessage(Message):
     event = "customer-order-paid"
     order_id: UUID
+
+
+class PriceChangedItem(BaseModel):
+    product_id: UUID
+    product_type: ProductType = ProductType.regular
+    purchase_price: Optional[int] = None
+
+
+class PriceChangedMessage(Message):
+    event = "pricing-price-changed"
+    warehouse_id: UUID
+    items: List[PriceChangedItem]
@@ -0,0 +1,228 @@
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiocache.base import BaseCache
+from aiocache.serializers import NullSerializer
+
+from svc.services.infrastructure.metrics_registry import MetricsRegistry, get_metrics_registry
+
+
+def approximate_size(value: Any) -> int:
+    """Shallow size of the value plus its direct attributes/items, good enough to bound memory of caches"""
+    size = sys.getsizeof(value)
+    if isinstance(value, (str, bytes, int, float, bool)) or value is None:
+        return size
+
+    if isinstance(value, dict):
+        items = [*value.keys(), *value.values()]
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        items = list(value)
+    elif hasattr(value, "__dict__"):
+        items = list(vars(value).values())
+    else:
+        items = []
+
+    return size + sum(sys.getsizeof(it) for it in items)
+
+
+class MemoryBudget:
+    """
+    Approximate bytes held by the in-process caches sharing it. Over the budget, the cache storing a value
+    evicts its own least recently used entries, so the process stays within the budget whichever cache grows
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.used = 0
+
+    @property
+    def exceeded(self) -> bool:
+        return self.used > self.max_bytes
+
+
+@dataclass
+class _Namespace:
+    name: str
+    max_entries: int
+    max_bytes: int
+    entries: OrderedDict[str, Tuple[Any, Optional[float], int]] = field(default_factory=OrderedDict)
+    size: int = 0
+
+
+class BoundedMemoryCache(BaseCache):
+    """
+    In-process aiocache backend with LRU eviction by entry count and approximate byte size per namespace,
+    and by the shared `budget` if given. Keys are assigned to the longest configured namespace prefix,
+    everything else shares the default limits. Raw commands are not supported, `raw()` raises NotImplementedError
+    """
+
+    NAME = "bounded_memory"
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        namespace_max_entries: Optional[Dict[str, int]] = None,
+        budget: Optional[MemoryBudget] = None,
+        metrics: Optional[MetricsRegistry] = None,
+        serializer: Any = None,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(serializer=serializer or NullSerializer(), **kwargs)
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._namespace_max_entries = namespace_max_entries or {}
+        self._budget = budget
+        self._metrics = metrics or get_metrics_registry()
+        self._namespaces: Dict[str, _Namespace] = {}
+
+    def _namespace(self, key: str) -> _Namespace:
+        name = max((it for it in self._namespace_max_entries if key.startswith(it)), key=len, default="")
+        if (namespace := self._namespaces.get(name)) is None:
+            namespace = _Namespace(
+                name=name or "default",
+                max_entries=self._namespace_max_entries.get(name, self._max_entries),
+                max_bytes=self._max_bytes,
+            )
+            self._namespaces[name] = namespace
+
+        return namespace
+
+    def _lookup(self, key: str) -> Tuple[_Namespace, Optional[Any]]:
+        namespace = self._namespace(key)
+        item = namespace.entries.get(key)
+        if item is None:
+            return namespace, None
+
+        value, expires_at, _ = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._remove(namespace, key)
+            self._metrics.register_cache_evictions(namespace.name, "ttl")
+            self._report(namespace)
+            return namespace, None
+
+        namespace.entries.move_to_end(key)
+        return namespace, value
+
+    def _remove(self, namespace: _Namespace, key: str) -> bool:
+        item = namespace.entries.pop(key, None)
+        if item is None:
+            return False
+
+        namespace.size -= item[2]
+        if self._budget is not None:
+            self._budget.used -= item[2]
+        return True
+
+    def _store(self, key: str, value: Any, ttl: Optional[float]) -> None:
+        namespace = self._namespace(key)
+        self._remove(namespace, key)
+        size = approximate_size(key) + approximate_size(value)
+        namespace.entries[key] = (value, time.monotonic() + ttl if ttl else None, size)
+        namespace.size += size
+        if self._budget is not None:
+            self._budget.used += size
+
+        evicted = 0
+        while len(namespace.entries) > 1 and (
+            len(namespace.entries) > namespace.max_entries
+            or namespace.size > namespace.max_bytes
+            or (self._budget is not None and self._budget.exceeded)
+        ):
+            self._remove(namespace, next(iter(namespace.entries)))
+            evicted += 1
+
+        if evicted:
+            self._metrics.register_cache_evictions(namespace.name, "size", evicted)
+        self._report(namespace)
+
+    def _report(self, namespace: _Namespace) -> None:
+        self._metrics.set_cache_size(namespace.name, len(namespace.entries), namespace.size)
+
+    async def _get(self, key: str, encoding: str = "utf-8", _conn: Any = None) -> Any:
+        return self._lookup(key)[1]
+
+    async def _gets(self, key: str, encoding: str = "utf-8", _conn: Any = None) -> Any:
+        return self._lookup(key)[1]
+
+    async def _multi_get(self, keys: List[str], encoding: str = "utf-8", _conn: Any = None) -> List[Any]:
+        return [self._lookup(key)[1] for key in keys]
+
+    async def _set(
+        self,
+        key: str,
+        value: Any,
+        ttl: Optional[float] = None,
+        _cas_token: Any = None,
+        _conn: Any = None,
+    ) -> bool:
+        if _cas_token is not None and _cas_token != self._lookup(key)[1]:
+            return False
+
+        self._store(key, value, ttl)
+        return True
+
+    async def _multi_set(self, pairs: List[Tuple[str, Any]], ttl: Optional[float] = None, _conn: Any = None) -> bool:
+        for key, value in pairs:
+            self._store(key, value, ttl)
+        return True
+
+    async def _add(self, key: str, value: Any, ttl: Optional[float] = None, _conn: Any = None) -> bool:
+        if self._lookup(key)[1] is not None:
+            raise ValueError(f"Key {key} already exists, use .set to update the value")
+
+        self._store(key, value, ttl)
+        return True
+
+    async def _exists(self, key: str, _conn: Any = None) -> bool:
+        return self._lookup(key)[1] is not None
+
+    async def _increment(self, key: str, delta: int, _conn: Any = None) -> int:
+        namespace, value = self._lookup(key)
+        if value is None:
+            value = delta
+            ttl = None
+        else:
+            if not isinstance(value, int):
+                raise TypeError("Value is not an integer")
+            expires_at = namespace.entries[key][1]
+            ttl = expires_at - time.monotonic() if expires_at is not None else None
+            value += delta
+
+        self._store(key, value, ttl)
+        return value
+
+    async def _expire(self, key: str, ttl: Optional[float], _conn: Any = None) -> bool:
+        namespace, value = self._lookup(key)
+        if value is None:
+            return False
+
+        self._store(key, value, ttl)
+        return True
+
+    async def _delete(self, key: str, _conn: Any = None) -> int:
+        namespace = self._namespace(key)
+        removed = self._remove(namespace, key)
+        self._report(namespace)
+        return int(removed)
+
+    async def _clear(self, namespace: Optional[str] = None, _conn: Any = None) -> bool:
+        for item in self._namespaces.values():
+            for key in [it for it in item.entries if namespace is None or it.startswith(namespace)]:
+                self._remove(item, key)
+            self._report(item)
+        return True
+
+    async def _redlock_release(self, key: str, value: Any) -> int:
+        if self._lookup(key)[1] == value:
+            return await self._delete(key)
+        return 0
+
+    async def acquire_conn(self) -> "BoundedMemoryCache":
+        return self
+
+    async def release_conn(self, conn: Any) -> None:
+        pass
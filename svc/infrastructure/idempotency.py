@@ -0,0 +1,64 @@
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+from aiocache.base import BaseCache
+
+from svc.services.coalescing import RequestCoalescer
+
+_PENDING = "pending"
+_DONE = "done:"
+
+
+class IdempotencyStore:
+    """
+    Stores the serialized result of the first execution per key for `ttl` seconds, replays return it.
+    A pending marker makes duplicates in other processes wait for the first execution, it expires after `lock_ttl`
+    so a crashed execution does not block the key
+    """
+
+    def __init__(
+        self,
+        cache: BaseCache,
+        namespace: str,
+        ttl: int,
+        lock_ttl: int,
+        poll_interval: float = 0.05,
+    ) -> None:
+        self._cache = cache
+        self._namespace = namespace
+        self._ttl = ttl
+        self._lock_ttl = lock_ttl
+        self._poll_interval = poll_interval
+        # Duplicates within the process wait on the same call instead of polling
+        self._coalescer = RequestCoalescer(namespace)
+
+    async def run(self, key: str, call: Callable[[], Awaitable[str]]) -> str:
+        return await self._coalescer.run(key, lambda: self._run(f"{self._namespace}:{key}", call))
+
+    async def _run(self, key: str, call: Callable[[], Awaitable[str]]) -> str:
+        deadline = time.monotonic() + self._lock_ttl
+        while True:
+            stored = await self._cache.get(key)
+            if stored is not None and stored.startswith(_DONE):
+                return stored[len(_DONE) :]
+
+            if stored is None:
+                try:
+                    await self._cache.add(key, _PENDING, ttl=self._lock_ttl)
+                except ValueError:
+                    # Another process started the execution
+                    continue
+
+                try:
+                    payload = await call()
+                except BaseException:
+                    await self._cache.delete(key)
+                    raise
+
+                await self._cache.set(key, f"{_DONE}{payload}", ttl=self._ttl)
+                return payload
+
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Execution for idempotency key {key} is still pending")
+            await asyncio.sleep(self._poll_interval)
@@ -0,0 +1,98 @@
+import abc
+import json
+import logging
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Coroutine, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class InvalidationEvent:
+    entity: str
+    # None invalidates every cached value of the entity
+    keys: Optional[List[str]]
+    version: int
+
+    def dumps(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def loads(cls, payload: str | bytes) -> "InvalidationEvent":
+        return cls(**json.loads(payload))
+
+
+InvalidationHandler = Callable[[InvalidationEvent], Coroutine[Any, Any, None]]
+
+
+class InvalidationTransport(abc.ABC):
+    """
+    Delivers published events to every subscribed process, the publishing one included
+    """
+
+    @abc.abstractmethod
+    async def start(self, callback: InvalidationHandler) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def publish(self, event: InvalidationEvent) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def stop(self) -> None:
+        pass
+
+
+class InvalidationBus:
+    def __init__(self, transport: Optional[InvalidationTransport] = None, max_keys: int = 100) -> None:
+        self._transport = transport
+        self._max_keys = max_keys
+        self._handlers: Dict[str, List[InvalidationHandler]] = defaultdict(list)
+
+    def subscribe(self, entity: str, handler: InvalidationHandler) -> None:
+        self._handlers[entity].append(handler)
+
+    def unsubscribe(self, entity: str, handler: InvalidationHandler) -> None:
+        self._handlers[entity].remove(handler)
+
+    def create_event(
+        self, entity: str, keys: Optional[Iterable[Any]] = None, version: Optional[int] = None
+    ) -> InvalidationEvent:
+        """Too many keys invalidate every cached value of the entity"""
+        event_keys = None if keys is None else [str(it) for it in keys]
+        if event_keys is not None and len(event_keys) > self._max_keys:
+            event_keys = None
+
+        return InvalidationEvent(entity=entity, keys=event_keys, version=version or time.time_ns())
+
+    async def publish(self, entity: str, keys: Optional[Iterable[Any]] = None, version: Optional[int] = None) -> None:
+        event = self.create_event(entity, keys, version)
+        try:
+            await self.send(event)
+        except Exception:
+            # Caches are TTL-bound anyway, failing the write because of the bus is not worth it
+            logger.exception(f"Unable to publish invalidation event {event}")
+
+    async def send(self, event: InvalidationEvent) -> None:
+        """Publishes the event, unlike `publish` failures are raised"""
+        if self._transport is None:
+            await self.dispatch(event)
+        else:
+            await self._transport.publish(event)
+
+    async def dispatch(self, event: InvalidationEvent) -> None:
+        for handler in self._handlers.get(event.entity, []):
+            try:
+                await handler(event)
+            except Exception:
+                logger.exception(f"Unhandled exception while applying invalidation event {event}")
+
+    async def start(self) -> None:
+        if self._transport is not None:
+            await self._transport.start(self.dispatch)
+
+    async def stop(self) -> None:
+        if self._transport is not None:
+            await self._transport.stop()
@@ -0,0 +1,57 @@
+import asyncio
+import logging
+from typing import Optional
+
+from aiokafka import AIOKafkaConsumer, AIOKafkaProducer
+
+from svc.infrastructure.invalidation.bus import InvalidationEvent, InvalidationHandler, InvalidationTransport
+
+logger = logging.getLogger(__name__)
+
+
+class KafkaInvalidationTransport(InvalidationTransport):
+    """
+    Every process reads the topic without a consumer group, so each of them gets all the events
+    """
+
+    def __init__(self, bootstrap: str, topic: str) -> None:
+        self._bootstrap = bootstrap
+        self._topic = topic
+        self._producer: Optional[AIOKafkaProducer] = None
+        self._consumer: Optional[AIOKafkaConsumer] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, callback: InvalidationHandler) -> None:
+        self._producer = AIOKafkaProducer(bootstrap_servers=self._bootstrap)
+        self._consumer = AIOKafkaConsumer(
+            self._topic,
+            bootstrap_servers=self._bootstrap,
+            group_id=None,
+            auto_offset_reset="latest",
+        )
+        await self._producer.start()
+        await self._consumer.start()
+        self._task = asyncio.create_task(self._loop(self._consumer, callback))
+        logger.info(f"Listening for cache invalidation on topic {self._topic}")
+
+    async def _loop(self, consumer: AIOKafkaConsumer, callback: InvalidationHandler) -> None:
+        async for msg in consumer:
+            try:
+                await callback(InvalidationEvent.loads(msg.value))
+            except Exception:
+                logger.exception(f"Unable to apply invalidation event: {msg.value!r}")
+
+    async def publish(self, event: InvalidationEvent) -> None:
+        if self._producer is None:
+            raise RuntimeError("uninitialized kafka invalidation transport!")
+
+        await self._producer.send_and_wait(self._topic, event.dumps().encode())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+        if self._consumer is not None:
+            await self._consumer.stop()
+        if self._producer is not None:
+            await self._producer.stop()
+        self._consumer = self._producer = self._task = None
@@ -0,0 +1,57 @@
+import asyncio
+import logging
+from typing import Any, Optional, Set
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from svc.infrastructure.invalidation.bus import InvalidationEvent, InvalidationHandler, InvalidationTransport
+from svc.persist.database import Database
+
+logger = logging.getLogger(__name__)
+
+
+class PostgresInvalidationTransport(InvalidationTransport):
+    """
+    LISTEN/NOTIFY on the service database. The listener keeps one pooled connection for itself
+    """
+
+    def __init__(self, database: Database, channel: str) -> None:
+        self._database = database
+        self._channel = channel
+        self._connection: Optional[AsyncConnection] = None
+        self._driver_connection: Any = None
+        self._callback: Optional[InvalidationHandler] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def start(self, callback: InvalidationHandler) -> None:
+        self._callback = callback
+        self._connection = await self._database.engine.connect()
+        raw_connection = await self._connection.get_raw_connection()
+        self._driver_connection = raw_connection.driver_connection
+        await self._driver_connection.add_listener(self._channel, self._on_notification)
+        logger.info(f"Listening for cache invalidation on channel {self._channel}")
+
+    def _on_notification(self, connection: Any, pid: int, channel: str, payload: str) -> None:
+        if self._callback is None:
+            return
+
+        task = asyncio.create_task(self._callback(InvalidationEvent.loads(payload)))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def publish(self, event: InvalidationEvent) -> None:
+        async with self._database.engine.connect() as connection:
+            await connection.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": self._channel, "payload": event.dumps()},
+            )
+            await connection.commit()
+
+    async def stop(self) -> None:
+        if self._connection is None:
+            return
+
+        await self._driver_connection.remove_listener(self._channel, self._on_notification)
+        await self._connection.close()
+        self._connection = None
@@ -0,0 +1,50 @@
+import asyncio
+import logging
+from typing import Optional
+
+import aioredis
+
+from svc.infrastructure.invalidation.bus import InvalidationEvent, InvalidationHandler, InvalidationTransport
+
+logger = logging.getLogger(__name__)
+
+
+class RedisInvalidationTransport(InvalidationTransport):
+    def __init__(self, url: str, channel: str) -> None:
+        self._url = url
+        self._channel = channel
+        self._publisher: Optional[aioredis.Redis] = None
+        self._subscriber: Optional[aioredis.Redis] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, callback: InvalidationHandler) -> None:
+        # Subscribed connection can't issue other commands, so publishing needs its own one
+        self._publisher = await aioredis.create_redis(self._url)
+        self._subscriber = await aioredis.create_redis(self._url)
+        (channel,) = await self._subscriber.subscribe(self._channel)
+        self._task = asyncio.create_task(self._loop(channel, callback))
+        logger.info(f"Listening for cache invalidation on redis channel {self._channel}")
+
+    async def _loop(self, channel: aioredis.Channel, callback: InvalidationHandler) -> None:
+        while await channel.wait_message():
+            payload = await channel.get()
+            try:
+                await callback(InvalidationEvent.loads(payload))
+            except Exception:
+                logger.exception(f"Unable to apply invalidation event: {payload!r}")
+
+    async def publish(self, event: InvalidationEvent) -> None:
+        if self._publisher is None:
+            raise RuntimeError("uninitialized redis invalidation transport!")
+
+        await self._publisher.publish(self._channel, event.dumps())
+
+    async def stop(self) -> None:
+        for connection in (self._subscriber, self._publisher):
+            if connection is not None:
+                connection.close()
+                await connection.wait_closed()
+
+        if self._task is not None:
+            await self._task
+        self._subscriber = self._publisher = self._task = None
@@ -0,0 +1,75 @@
+import json
+from typing import Any, Dict, Type
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore[assignment]
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover
+    msgspec = None
+
+
+class Codec:
+    """Decodes and encodes Kafka message values, stdlib json by default"""
+
+    name = "json"
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(value, default=str).encode()
+
+
+class OrjsonCodec(Codec):
+    name = "orjson"
+
+    def loads(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+    def dumps(self, value: Any) -> bytes:
+        return orjson.dumps(value, default=str)
+
+
+class MsgspecCodec(Codec):
+    name = "msgspec"
+
+    def __init__(self) -> None:
+        self._decoder = msgspec.json.Decoder()
+        self._encoder = msgspec.json.Encoder(enc_hook=str)
+
+    def loads(self, data: bytes) -> Any:
+        try:
+            return self._decoder.decode(data)
+        except msgspec.DecodeError as exc:
+            # Malformed values fail the same way whatever the codec is
+            raise ValueError(str(exc)) from exc
+
+    def dumps(self, value: Any) -> bytes:
+        return self._encoder.encode(value)
+
+
+def get_codecs() -> Dict[str, Type[Codec]]:
+    """Codecs available in the environment by name"""
+    codecs: Dict[str, Type[Codec]] = {Codec.name: Codec}
+    if orjson is not None:
+        codecs[OrjsonCodec.name] = OrjsonCodec
+    if msgspec is not None:
+        codecs[MsgspecCodec.name] = MsgspecCodec
+    return codecs
+
+
+def get_codec(name: str = "auto") -> Codec:
+    """Returns the named codec, `auto` picks the fastest available one"""
+    codecs = get_codecs()
+    if name == "auto":
+        for candidate in (OrjsonCodec.name, MsgspecCodec.name, Codec.name):
+            if candidate in codecs:
+                return codecs[candidate]()
+
+    if name not in codecs:
+        raise ValueError(f"Codec '{name}' is not available, install it or pick one of {sorted(codecs)}")
+    return codecs[name]()
@@ -1,32 +1,93 @@
 import asyncio
-import json
 import logging
+import time
+from collections import deque
 from dataclasses import dataclass
-from typing import Any, Callable, Coroutine, Dict, List, Optional, Type
+from typing import Any, Awaitable, Callable, Coroutine, Deque, Dict, Hashable, List, Optional, Set, Tuple, Type
 
-from aiokafka import AIOKafkaConsumer, ConsumerRecord
+from aiokafka import AIOKafkaConsumer, ConsumerRebalanceListener, ConsumerRecord, TopicPartition
 from opentelemetry import context, trace
 from sqlalchemy.ext.asyncio.engine import AsyncConnection
 
+from svc.infrastructure.kafka.codecs import Codec
+from svc.infrastructure.kafka.dedupe import ProcessedEventStore
 from svc.infrastructure.kafka.kafka_instrumentation import kafka_trace_formatter
 from svc.infrastructure.kafka.message import Message
+from svc.infrastructure.kafka.offsets import OffsetTracker
+from svc.infrastructure.kafka.retry import RetryPublisher
 from svc.persist.database import Database
+from svc.persist.pool import checkout, is_saturated
+from svc.services.infrastructure.metrics_registry import MetricsRegistry, get_metrics_registry
 
 logger = logging.getLogger(__name__)
 tracer = trace.get_tracer(__name__)
 
+_BACKPRESSURE_INTERVAL = 0.05
 
-def deserializer(serialized: bytes) -> dict:
-    return json.loads(serialized)
+
+def _event_key(msg: ConsumerRecord) -> str:
+    return f"{msg.topic}:{msg.partition}:{msg.offset}"
 
 
 @dataclass
 class TopicInfo:
     message_cls: Type[Message]
     handler: Callable[[Message, AsyncConnection], Coroutine[Any, Any, None]]
+    # Messages with equal keys are handled in order, by default the record key or else the partition
+    key: Optional[Callable[[Any], Hashable]] = None
+    # Handles all messages of the topic fetched together in batch mode
+    batch_handler: Optional[Callable[[List[Message], AsyncConnection], Coroutine[Any, Any, None]]] = None
+    # Builds the message from the decoded value, by default validating all fields
+    decoder: Optional[Callable[[Any], Message]] = None
+
+    def decode(self, value: Any) -> Message:
+        if self.decoder is not None:
+            return self.decoder(value)
+        return self.message_cls.parse_obj(value)
+
+
+# Record, its offset tracker generation, handler and decoded value
+_Task = Tuple[ConsumerRecord, int, TopicInfo, Any]
+
+
+class _RevokeListener(ConsumerRebalanceListener):
+    def __init__(self, on_revoked: Callable[[Set[TopicPartition]], Awaitable[None]]) -> None:
+        self._on_revoked = on_revoked
+
+    async def on_partitions_revoked(self, revoked: Set[TopicPartition]) -> None:
+        await self._on_revoked(revoked)
+
+    async def on_partitions_assigned(self, assigned: Set[TopicPartition]) -> None:
+        pass
 
 
 class KafkaConsumer:
+    """
+    Handles messages on `concurrency` worker lanes. Messages with the same ordering key always go to the same lane
+    and are handled in order. Fetching blocks while the lane is full and partitions are paused
+    while the database pool is saturated.
+
+    With a positive `batch_size` records are fetched in batches of up to that size, waiting at most `batch_linger`
+    seconds to fill one. Topics with a batch handler are then handled in one call per batch on a long-lived
+    connection, in the order they were registered.
+
+    Offsets are committed manually, up to the first message of each partition that is not handled yet.
+    Commits happen once `commit_batch_size` messages are handled, every `commit_interval` seconds,
+    before partitions are revoked and on stop. Messages in flight on revoked partitions are redelivered
+    to their new consumer.
+
+    With a processed event store, messages redelivered after a rebalance or a restart are skipped
+    before any database access.
+
+    With a retry publisher, failed messages are republished to its delay topics and finally to its dead letter
+    topic. Retries wait for their due time off the lanes, so other keys are not blocked. A retry partition is paused
+    while its first record is not due, at most `max_pending` retries wait at a time and fetching blocks beyond that.
+    Malformed messages go to the dead letter topic directly. Without it failed messages are logged and skipped.
+
+    Values are decoded with `codec` by the consumer itself, messages of topics without a handler are skipped
+    before decoding
+    """
+
     def __init__(
         self,
         topics: List[str],
@@ -34,6 +95,17 @@ class KafkaConsumer:
         group_id: str,
         database: Database,
         before_handler_hook: Optional[Callable[[trace.Span, Any], None]] = None,
+        client_factory: Callable[..., AIOKafkaConsumer] = AIOKafkaConsumer,
+        concurrency: int = 1,
+        max_pending: int = 16,
+        batch_size: int = 0,
+        batch_linger: float = 0.1,
+        commit_batch_size: int = 100,
+        commit_interval: float = 1.0,
+        metrics: Optional[MetricsRegistry] = None,
+        processed_events: Optional[ProcessedEventStore] = None,
+        retry: Optional[RetryPublisher] = None,
+        codec: Optional[Codec] = None,
     ) -> None:
         self._topics = topics
         self._bootstrap = bootstrap
@@ -42,53 +114,420 @@ class KafkaConsumer:
         self._handlers_registry: Dict[str, TopicInfo] = {}
         self._database = database
         self._before_handler_hook = before_handler_hook
+        self._client_factory = client_factory
+        self._task: Optional[asyncio.Task] = None
+        self._lanes: List[asyncio.Queue[_Task]] = [asyncio.Queue(max_pending) for _ in range(concurrency)]
+        self._workers: List[asyncio.Task] = []
+        self._batch_size = batch_size
+        self._batch_linger = batch_linger
+        self._batch_connection: Optional[AsyncConnection] = None
+        self._stopping = False
+        self._offsets = OffsetTracker()
+        self._commit_batch_size = commit_batch_size
+        self._commit_interval = commit_interval
+        self._commit_requested = asyncio.Event()
+        self._commit_task: Optional[asyncio.Task] = None
+        self._metrics = metrics or get_metrics_registry()
+        self._processed_events = processed_events
+        self._retry = retry
+        self._max_pending = max_pending
+        self._delayed: Dict[TopicPartition, Deque[Tuple[float, _Task]]] = {}
+        self._delayed_count = 0
+        self._delayed_changed = asyncio.Event()
+        self._delayed_released = asyncio.Event()
+        self._delay_task: Optional[asyncio.Task] = None
+        self._codec = codec or Codec()
 
     def register_topic_handler(self, topic: str, topic_info: TopicInfo) -> None:
         self._handlers_registry[topic] = topic_info
 
     async def start(self) -> None:
         logger.info(f"Starting Kafka consumer group {self._group_id}, topics: {self._topics}")
-        self._client = AIOKafkaConsumer(
-            *self._topics,
+        self._client = self._client_factory(
             bootstrap_servers=self._bootstrap,
             group_id=self._group_id,
-            enable_auto_commit=True,
-            auto_commit_interval_ms=5000,
+            enable_auto_commit=False,
             auto_offset_reset="earliest",
-            value_deserializer=deserializer,
         )
-        asyncio.create_task(self._loop())
+        topics = list(self._topics)
+        if self._retry is not None:
+            await self._retry.start()
+            topics += self._retry.retry_topics
+        self._client.subscribe(topics, listener=_RevokeListener(self._on_partitions_revoked))
+        self._workers = [asyncio.create_task(self._work(lane)) for lane in self._lanes]
+        self._commit_task = asyncio.create_task(self._commit_loop())
+        if self._retry is not None:
+            self._delay_task = asyncio.create_task(self._delay_loop())
+        self._task = asyncio.create_task(self._loop())
+
+    async def wait(self) -> None:
+        """Waits until the consumer loop exits"""
+        if self._task is None:
+            raise RuntimeError("uninitialized kafka producer!")
+
+        await self._task
 
     async def _loop(self) -> None:
         if self._client is None:
             raise RuntimeError("uninitialized kafka producer!")
 
         await self._client.start()
+        if self._batch_size > 0:
+            await self._batch_loop()
+            return
+
         msg: ConsumerRecord
         async for msg in self._client:
-            trace_context = kafka_trace_formatter.extract(msg.headers)
-            token = context.attach(trace_context)
+            generation = self._offsets.add(TopicPartition(msg.topic, msg.partition), msg.offset)
+            await self._wait_for_pool()
+            await self._dispatch(msg, generation)
+
+    async def _batch_loop(self) -> None:
+        try:
+            while not self._stopping:
+                records = await self._fetch_batch()
+                generations = [self._offsets.add(TopicPartition(it.topic, it.partition), it.offset) for it in records]
+                await self._wait_for_pool()
+
+                batched: Dict[str, List[Tuple[ConsumerRecord, int]]] = {topic: [] for topic in self._handlers_registry}
+                for msg, generation in zip(records, generations):
+                    topic_info = self._handlers_registry.get(msg.topic)
+                    if topic_info is not None and topic_info.batch_handler is not None:
+                        batched[msg.topic].append((msg, generation))
+                    else:
+                        await self._dispatch(msg, generation)
+
+                for topic, topic_records in batched.items():
+                    if topic_records:
+                        await self._process_batch(topic, [msg for msg, _ in topic_records])
+                        for msg, generation in topic_records:
+                            self._done(msg, generation)
+        finally:
+            if self._batch_connection is not None:
+                await self._batch_connection.close()
+                self._batch_connection = None
+
+    async def _fetch_batch(self) -> List[ConsumerRecord]:
+        if self._client is None:
+            raise RuntimeError("uninitialized kafka producer!")
+
+        loop = asyncio.get_running_loop()
+        records: List[ConsumerRecord] = []
+        linger_until: Optional[float] = None
+        while len(records) < self._batch_size and not self._stopping:
+            timeout = self._batch_linger if linger_until is None else linger_until - loop.time()
+            if timeout <= 0:
+                break
+
+            batches = await self._client.getmany(
+                timeout_ms=int(timeout * 1000), max_records=self._batch_size - len(records)
+            )
+            for partition_records in batches.values():
+                records.extend(partition_records)
+            if records and linger_until is None:
+                linger_until = loop.time() + self._batch_linger
+        return records
+
+    async def _dispatch(self, msg: ConsumerRecord, generation: int) -> None:
+        topic = self._retry.original_topic(msg) if self._retry is not None else msg.topic
+        topic_info = self._handlers_registry.get(topic)
+        if topic_info is None:
+            logger.error(f"No handler for topic '{topic}' registered")
+            self._done(msg, generation)
+            return
+
+        try:
+            value = self._codec.loads(msg.value)
+        except ValueError as exc:
+            logger.exception(f"Unable to decode message: {msg.value!r}")
+            await self._fail(msg, exc, retryable=False)
+            self._done(msg, generation)
+            return
+
+        due_in = self._retry.due_in(msg) if self._retry is not None else 0.0
+        partition = TopicPartition(msg.topic, msg.partition)
+        # Records behind a delayed one wait for it, retries of a partition are handled in order
+        if due_in > 0 or partition in self._delayed:
+            await self._delay(partition, (msg, generation, topic_info, value), due_in)
+            return
+
+        await self._enqueue(msg, generation, topic_info, value)
+
+    async def _delay(self, partition: TopicPartition, task: _Task, due_in: float) -> None:
+        # The offset stays uncommitted meanwhile, the retry is redelivered if the consumer stops first
+        # Once stopping, nothing releases delayed retries anymore
+        while self._delayed_count >= self._max_pending and self._delay_task is not None:
+            self._delayed_released.clear()
+            await self._delayed_released.wait()
+
+        delayed = self._delayed.get(partition)
+        if delayed is None:
+            delayed = self._delayed[partition] = deque()
+            if self._client is not None:
+                self._client.pause(partition)
+        delayed.append((asyncio.get_running_loop().time() + due_in, task))
+        self._delayed_count += 1
+        self._delayed_changed.set()
+
+    async def _delay_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._delayed_changed.clear()
+            next_due: Optional[float] = None
+            for partition, delayed in list(self._delayed.items()):
+                while delayed and delayed[0][0] <= loop.time():
+                    _, task = delayed.popleft()
+                    self._delayed_count -= 1
+                    self._delayed_released.set()
+                    await self._enqueue(*task)
+
+                if self._delayed.get(partition) is not delayed:
+                    # Revoked meanwhile
+                    continue
+                if delayed:
+                    next_due = delayed[0][0] if next_due is None else min(next_due, delayed[0][0])
+                else:
+                    del self._delayed[partition]
+                    self._resume(partition)
+
+            timeout = None if next_due is None else max(next_due - loop.time(), 0.0)
             try:
-                with tracer.start_as_current_span(f"kafka topic {msg.topic}", kind=trace.SpanKind.CONSUMER) as span:
-                    if self._before_handler_hook is not None:
-                        self._before_handler_hook(span, {})
+                await asyncio.wait_for(self._delayed_changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
 
-                    topic_info = self._handlers_registry[msg.topic]
-                    message = topic_info.message_cls.parse_obj(msg.value)
+    def _resume(self, partition: TopicPartition) -> None:
+        if self._client is not None and partition in self._client.assignment():
+            self._client.resume(partition)
 
-                    # We need DI container here
-                    async with self._database.engine.connect() as connection:
-                        await topic_info.handler(message, connection)
-            except KeyError:
-                logger.exception(f"No handler for topic '{msg.topic}' registered")
+    def _forget_delayed(self, partitions: Set[TopicPartition]) -> None:
+        for partition in partitions:
+            delayed = self._delayed.pop(partition, None)
+            if delayed is not None:
+                self._delayed_count -= len(delayed)
+        self._delayed_released.set()
+
+    async def _enqueue(self, msg: ConsumerRecord, generation: int, topic_info: TopicInfo, value: Any) -> None:
+        lane = self._lanes[hash(self._get_key(msg, topic_info, value)) % len(self._lanes)]
+        await lane.put((msg, generation, topic_info, value))
+
+    def _get_key(self, msg: ConsumerRecord, topic_info: TopicInfo, value: Any) -> Hashable:
+        if topic_info.key is not None:
+            try:
+                return topic_info.key(value)
             except Exception:
-                logger.exception(f"Unhandled exception while processing message: {msg.value}")
+                # Malformed messages fail in the handler, any lane will do
+                pass
+        if msg.key is not None:
+            return msg.key
+        return msg.topic, msg.partition
+
+    async def _wait_for_pool(self) -> None:
+        if self._client is None or not is_saturated(self._database.engine):
+            return
+
+        partitions = self._client.assignment()
+        self._client.pause(*partitions)
+        try:
+            while is_saturated(self._database.engine):
+                await asyncio.sleep(_BACKPRESSURE_INTERVAL)
+        finally:
+            # Retry partitions stay paused until their first record is due
+            self._client.resume(*(partition for partition in partitions if partition not in self._delayed))
+
+    async def _work(self, lane: "asyncio.Queue[_Task]") -> None:
+        while True:
+            msg, generation, topic_info, value = await lane.get()
+            try:
+                await self._process(msg, topic_info, value)
             finally:
-                context.detach(token)
+                self._done(msg, generation)
+                lane.task_done()
+
+    def _done(self, msg: ConsumerRecord, generation: int) -> None:
+        # Failed messages are done as well, they are republished for a retry or skipped
+        self._offsets.done(TopicPartition(msg.topic, msg.partition), msg.offset, generation)
+        if self._offsets.advanced >= self._commit_batch_size:
+            self._commit_requested.set()
+
+    async def _commit_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._commit_requested.wait(), self._commit_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._commit_requested.clear()
+            await self._commit()
+
+    async def _commit(self) -> None:
+        if self._client is None:
+            raise RuntimeError("uninitialized kafka producer!")
+
+        positions = self._offsets.positions()
+        assignment = self._client.assignment()
+        # Positions of partitions assigned elsewhere meanwhile can't be committed anymore
+        self._offsets.forget(partition for partition in positions if partition not in assignment)
+        positions = {partition: offset for partition, offset in positions.items() if partition in assignment}
+        if positions:
+            started = time.perf_counter()
+            try:
+                await self._client.commit(positions)
+            except Exception:
+                logger.exception(f"Unable to commit offsets {positions}")
+                self._metrics.register_kafka_commit_failure(self._group_id)
+            else:
+                self._offsets.committed(positions)
+                self._metrics.observe_kafka_commit(self._group_id, time.perf_counter() - started)
+        self._metrics.set_kafka_uncommitted_messages(self._group_id, self._offsets.backlog)
+
+    async def _on_partitions_revoked(self, revoked: Set[TopicPartition]) -> None:
+        await self._commit()
+        self._offsets.forget(revoked)
+        # Delayed retries of revoked partitions are redelivered to their new consumer
+        self._forget_delayed(revoked)
+
+    async def _process(self, msg: ConsumerRecord, topic_info: TopicInfo, value: Any) -> None:
+        trace_context = kafka_trace_formatter.extract(msg.headers)
+        token = context.attach(trace_context)
+        try:
+            with tracer.start_as_current_span(f"kafka topic {msg.topic}", kind=trace.SpanKind.CONSUMER) as span:
+                if self._before_handler_hook is not None:
+                    self._before_handler_hook(span, {})
+
+                if not await self._filter_processed([msg]):
+                    return
+
+                try:
+                    message = topic_info.decode(value)
+                except ValueError as exc:
+                    logger.exception(f"Unable to parse message: {value}")
+                    await self._fail(msg, exc, retryable=False)
+                    return
+
+                try:
+                    # We need DI container here
+                    connection = await checkout(self._database.engine)
+                    try:
+                        await topic_info.handler(message, connection)
+                    finally:
+                        await connection.close()
+                except Exception as exc:
+                    logger.exception(f"Unhandled exception while processing message: {value}")
+                    await self._fail(msg, exc)
+                    return
+                await self._mark_processed([msg])
+        except Exception:
+            logger.exception(f"Unhandled exception while processing message: {value}")
+        finally:
+            context.detach(token)
+
+    async def _process_batch(self, topic: str, records: List[ConsumerRecord]) -> None:
+        topic_info = self._handlers_registry[topic]
+        if topic_info.batch_handler is None:
+            raise RuntimeError(f"No batch handler for topic '{topic}' registered")
+
+        with tracer.start_as_current_span(f"kafka topic {topic} batch", kind=trace.SpanKind.CONSUMER) as span:
+            if self._before_handler_hook is not None:
+                self._before_handler_hook(span, {})
+
+            records = await self._filter_processed(records)
+            if not records:
+                return
+
+            messages, parsed = [], []
+            for msg in records:
+                try:
+                    messages.append(topic_info.decode(self._codec.loads(msg.value)))
+                    parsed.append(msg)
+                except ValueError as exc:
+                    logger.exception(f"Unable to parse message: {msg.value!r}")
+                    await self._fail(msg, exc, retryable=False)
+
+            try:
+                if self._batch_connection is None:
+                    self._batch_connection = await checkout(self._database.engine)
+                await topic_info.batch_handler(messages, self._batch_connection)
+                await self._mark_processed(parsed)
+            except Exception as exc:
+                logger.exception(f"Unhandled exception while processing {len(messages)} messages of '{topic}'")
+                # The connection may be broken, a new one is checked out for the next batch
+                if self._batch_connection is not None:
+                    await self._batch_connection.close()
+                    self._batch_connection = None
+                # Retries are handled one by one, so a single failing message doesn't fail the others again
+                for msg in parsed:
+                    await self._fail(msg, exc)
+
+    async def _fail(self, msg: ConsumerRecord, error: BaseException, retryable: bool = True) -> None:
+        if self._retry is None:
+            return
+
+        try:
+            target = await self._retry.publish(msg, error, retryable)
+        except Exception:
+            logger.exception(f"Unable to republish failed message {_event_key(msg)}")
+            return
+        self._metrics.register_kafka_failed_message(self._retry.original_topic(msg), target)
+        await self._mark_processed([msg])
+
+    async def _filter_processed(self, records: List[ConsumerRecord]) -> List[ConsumerRecord]:
+        if self._processed_events is None:
+            return records
+
+        try:
+            new_keys = set(await self._processed_events.filter_new([_event_key(msg) for msg in records]))
+        except Exception:
+            logger.exception("Unable to read processed events, handling messages anyway")
+            return records
+
+        new_records = []
+        for msg in records:
+            if _event_key(msg) in new_keys:
+                new_records.append(msg)
+            else:
+                logger.info(f"Skip already processed message {_event_key(msg)}")
+                self._metrics.register_kafka_duplicate_message(msg.topic)
+        return new_records
+
+    async def _mark_processed(self, records: List[ConsumerRecord]) -> None:
+        if self._processed_events is None:
+            return
+
+        try:
+            await self._processed_events.mark_processed([_event_key(msg) for msg in records])
+        except Exception:
+            logger.exception("Unable to store processed events")
 
     async def stop(self) -> None:
         logger.info("Stop Kafka consumer")
         if self._client is None:
             raise RuntimeError("uninitialized kafka producer!")
 
+        # Delayed retries are left uncommitted and redelivered after a restart, fetching doesn't wait for them anymore
+        if self._delay_task is not None:
+            self._delay_task.cancel()
+            self._delay_task = None
+        self._forget_delayed(set(self._delayed))
+        if self._task is not None:
+            if self._batch_size > 0:
+                # Lets the current batch finish, fetching returns within the linger time
+                self._stopping = True
+                await asyncio.gather(self._task, return_exceptions=True)
+            else:
+                self._task.cancel()
+            self._task = None
+        # Fetched messages are handled before the consumer leaves the group
+        for lane in self._lanes:
+            await lane.join()
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+
+        if self._commit_task is not None:
+            self._commit_task.cancel()
+            self._commit_task = None
+        await self._commit()
+
         await self._client.stop()
+        if self._retry is not None:
+            await self._retry.stop()
@@ -0,0 +1,49 @@
+from collections import OrderedDict
+from typing import List, Sequence
+
+from aiocache.base import BaseCache
+
+_PROCESSED = "1"
+
+
+class ProcessedEventStore:
+    """
+    Remembers keys of processed events for `ttl` seconds, so redelivered events are skipped.
+    The last `window_size` keys are kept in process as well and are checked without a cache round trip.
+    Events are marked after they are handled, a crash in between lets the event be handled again
+    """
+
+    def __init__(self, cache: BaseCache, namespace: str, ttl: int, window_size: int) -> None:
+        self._cache = cache
+        self._namespace = namespace
+        self._ttl = ttl
+        self._window_size = window_size
+        self._window: OrderedDict[str, None] = OrderedDict()
+
+    async def filter_new(self, keys: Sequence[str]) -> List[str]:
+        """Returns the keys not processed yet, in the given order"""
+        unknown = [key for key in keys if key not in self._window]
+        if not unknown:
+            return []
+
+        stored = await self._cache.multi_get([self._key(key) for key in unknown])
+        return [key for key, value in zip(unknown, stored) if value is None]
+
+    async def mark_processed(self, keys: Sequence[str]) -> None:
+        if not keys:
+            return
+
+        for key in keys:
+            self._window[key] = None
+            self._window.move_to_end(key)
+        while len(self._window) > self._window_size:
+            self._window.popitem(last=False)
+
+        await self._cache.multi_set([(self._key(key), _PROCESSED) for key in keys], ttl=self._ttl)
+
+    async def clear(self) -> None:
+        self._window.clear()
+        await self._cache.clear(namespace=self._namespace)
+
+    def _key(self, key: str) -> str:
+        return f"{self._namespace}:{key}"
@@ -1,9 +1,43 @@
 from datetime import datetime
+from typing import Any, Callable, Type, TypeVar
 
 import pytz
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
+from pydantic.error_wrappers import ErrorWrapper
+from pydantic.errors import DictError
+from pydantic.utils import ROOT_KEY
 
 
 class Message(BaseModel):
     event: str
     created_at: datetime = Field(default_factory=lambda: datetime.now(pytz.UTC))
+
+
+M = TypeVar("M", bound=Message)
+
+
+def partial_decoder(message_cls: Type[M], *fields: str) -> Callable[[Any], M]:
+    """
+    Builds messages validating only `fields`, the rest keep their decoded JSON values or defaults.
+    For handlers reading nothing but the listed fields
+    """
+    model_fields = [message_cls.__fields__[name] for name in fields]
+
+    def decode(value: Any) -> M:
+        if not isinstance(value, dict):
+            raise ValidationError([ErrorWrapper(DictError(), loc=ROOT_KEY)], message_cls)
+
+        values = dict(value)
+        errors = []
+        for field in model_fields:
+            validated, error = field.validate(value.get(field.alias), values, loc=field.alias, cls=message_cls)
+            if error:
+                errors.append(error)
+            else:
+                values[field.name] = validated
+        if errors:
+            raise ValidationError(errors, message_cls)
+
+        return message_cls.construct(**values)
+
+    return decode
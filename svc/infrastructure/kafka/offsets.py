@@ -0,0 +1,64 @@
+from collections import defaultdict, deque
+from typing import Deque, Dict, Iterable, Set
+
+from aiokafka import TopicPartition
+
+
+class OffsetTracker:
+    """
+    Tracks offsets of fetched records per partition. The commit position of a partition only advances past records
+    that are done together with every record fetched before them, so a commit never skips a record still handled.
+    Forgetting a partition starts a new generation of it, records of an earlier one are ignored when done
+    """
+
+    def __init__(self) -> None:
+        self._pending: Dict[TopicPartition, Deque[int]] = defaultdict(deque)
+        self._done: Dict[TopicPartition, Set[int]] = defaultdict(set)
+        self._positions: Dict[TopicPartition, int] = {}
+        self._advanced: Dict[TopicPartition, int] = defaultdict(int)
+        self._generations: Dict[TopicPartition, int] = defaultdict(int)
+
+    def add(self, partition: TopicPartition, offset: int) -> int:
+        """Returns the generation of the partition to pass to `done`"""
+        self._pending[partition].append(offset)
+        return self._generations[partition]
+
+    def done(self, partition: TopicPartition, offset: int, generation: int) -> None:
+        pending = self._pending.get(partition)
+        if not pending or generation != self._generations[partition]:
+            # The partition was revoked meanwhile, a later assignment fetches the record again
+            return
+
+        done = self._done[partition]
+        done.add(offset)
+        while pending and pending[0] in done:
+            done.discard(pending[0])
+            self._positions[partition] = pending.popleft() + 1
+            self._advanced[partition] += 1
+
+    @property
+    def advanced(self) -> int:
+        """Number of records the uncommitted positions advanced past"""
+        return sum(self._advanced.values())
+
+    @property
+    def backlog(self) -> int:
+        """Number of fetched records that are not committed yet"""
+        return self.advanced + sum(len(it) for it in self._pending.values())
+
+    def positions(self) -> Dict[TopicPartition, int]:
+        return dict(self._positions)
+
+    def committed(self, positions: Dict[TopicPartition, int]) -> None:
+        for partition, position in positions.items():
+            if self._positions.get(partition) == position:
+                del self._positions[partition]
+                self._advanced.pop(partition, None)
+
+    def forget(self, partitions: Iterable[TopicPartition]) -> None:
+        for partition in partitions:
+            self._pending.pop(partition, None)
+            self._done.pop(partition, None)
+            self._positions.pop(partition, None)
+            self._advanced.pop(partition, None)
+            self._generations[partition] += 1
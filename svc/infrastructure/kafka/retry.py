@@ -0,0 +1,112 @@
+import json
+import logging
+import time
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from aiokafka import AIOKafkaProducer, ConsumerRecord
+
+from svc.infrastructure.kafka.kafka_instrumentation import kafka_trace_formatter
+
+logger = logging.getLogger(__name__)
+
+ORIGINAL_TOPIC_HEADER = "retry_topic"
+ATTEMPT_HEADER = "retry_attempt"
+DUE_HEADER = "retry_due_ms"
+ERROR_HEADER = "retry_error"
+_RETRY_HEADERS = {ORIGINAL_TOPIC_HEADER, ATTEMPT_HEADER, DUE_HEADER, ERROR_HEADER}
+_MAX_ERROR_LENGTH = 256
+
+
+def serializer(value: Any) -> bytes:
+    return json.dumps(value, default=str).encode()
+
+
+def _get_header(headers: Sequence[Tuple[str, bytes]], key: str) -> Optional[str]:
+    return next((value.decode() for header, value in headers if header == key), None)
+
+
+class RetryPublisher:
+    """
+    Republishes failed messages of a consumer group to delay topics, one per entry of `delays`, and then
+    to the dead letter topic. Retry topics belong to the group, so other groups of the original topic
+    don't see the retries. Headers keep the original topic, the attempt, when it is due and the last error.
+    The trace context of the failed attempt is injected, so the next attempt continues its trace
+    """
+
+    def __init__(
+        self,
+        bootstrap: str,
+        group_id: str,
+        delays: Sequence[float],
+        producer_factory: Callable[..., AIOKafkaProducer] = AIOKafkaProducer,
+        value_serializer: Callable[[Any], bytes] = serializer,
+    ) -> None:
+        self._bootstrap = bootstrap
+        self._delays = list(delays)
+        self._producer_factory = producer_factory
+        self._value_serializer = value_serializer
+        self._producer: Optional[AIOKafkaProducer] = None
+        self.retry_topics: List[str] = [f"{group_id}.retry.{delay:g}s" for delay in self._delays]
+        self.dead_letter_topic = f"{group_id}.dlq"
+
+    async def start(self) -> None:
+        self._producer = self._producer_factory(bootstrap_servers=self._bootstrap)
+        await self._producer.start()
+
+    async def stop(self) -> None:
+        if self._producer is not None:
+            await self._producer.stop()
+        self._producer = None
+
+    def original_topic(self, msg: ConsumerRecord) -> str:
+        if msg.topic in self.retry_topics or msg.topic == self.dead_letter_topic:
+            return _get_header(msg.headers, ORIGINAL_TOPIC_HEADER) or msg.topic
+        return msg.topic
+
+    def due_in(self, msg: ConsumerRecord) -> float:
+        """Seconds until a retried message is due"""
+        if msg.topic not in self.retry_topics:
+            return 0.0
+
+        due_ms = _get_header(msg.headers, DUE_HEADER)
+        if due_ms is None:
+            return 0.0
+        return max(int(due_ms) / 1000 - time.time(), 0.0)
+
+    async def publish(self, msg: ConsumerRecord, error: BaseException, retryable: bool = True) -> str:
+        """Republishes a failed message to the next retry topic or the dead letter topic and returns the topic"""
+        attempt = int(_get_header(msg.headers, ATTEMPT_HEADER) or 0) + 1
+        if retryable and attempt <= len(self._delays):
+            topic = self.retry_topics[attempt - 1]
+            due = time.time() + self._delays[attempt - 1]
+        else:
+            topic = self.dead_letter_topic
+            due = time.time()
+
+        await self._send(topic, msg, attempt, due, repr(error)[:_MAX_ERROR_LENGTH])
+        logger.info(f"Republished message {msg.topic}:{msg.partition}:{msg.offset} to {topic}, attempt {attempt}")
+        return topic
+
+    async def replay(self, msg: ConsumerRecord) -> str:
+        """Republishes a dead letter to the first retry topic for a new round of attempts, due immediately"""
+        if not self.retry_topics:
+            raise RuntimeError("Dead letters are replayed through a retry topic, none is configured")
+
+        await self._send(self.retry_topics[0], msg, 0, time.time(), _get_header(msg.headers, ERROR_HEADER) or "")
+        return self.retry_topics[0]
+
+    async def _send(self, topic: str, msg: ConsumerRecord, attempt: int, due: float, error: str) -> None:
+        if self._producer is None:
+            raise RuntimeError("uninitialized kafka producer!")
+
+        ignored = _RETRY_HEADERS | kafka_trace_formatter.fields
+        headers = [(key, value) for key, value in msg.headers if key not in ignored]
+        headers += [
+            (ORIGINAL_TOPIC_HEADER, self.original_topic(msg).encode()),
+            (ATTEMPT_HEADER, str(attempt).encode()),
+            (DUE_HEADER, str(int(due * 1000)).encode()),
+            (ERROR_HEADER, error.encode()),
+        ]
+        kafka_trace_formatter.inject(headers)
+        value = msg.value if isinstance(msg.value, bytes) else self._value_serializer(msg.value)
+        await self._producer.send_and_wait(topic, value=value, key=msg.key, headers=headers)
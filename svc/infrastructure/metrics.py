@@ -10,6 +10,7 @@ errors_counter = Counter(
 
 METRICS_PATH = "/metrics"
 HEALTH_PATH = "/health"
+READY_PATH = "/ready"
 
 
 def configure_metrics(app: FastAPI) -> None:
@@ -17,6 +18,6 @@ def configure_metrics(app: FastAPI) -> None:
         PrometheusMiddleware,
         app_name="promotion-service",
         group_paths=True,
-        skip_paths=[METRICS_PATH, HEALTH_PATH],
+        skip_paths=[METRICS_PATH, HEALTH_PATH, READY_PATH],
     )
     app.add_route(METRICS_PATH, handle_metrics)
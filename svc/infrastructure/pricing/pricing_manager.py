@@ -1,4 +1,5 @@
 import logging
+import time
 from typing import Dict, List
 from uuid import UUID
 
@@ -7,6 +8,7 @@ from fastapi import Depends
 from svc.infrastructure.pricing.models import ProductsPricesItemCacheKey
 from svc.infrastructure.pricing.pricing_adapter import PricingAdapter
 from svc.services.cache import DistributedCacheRegistry
+from svc.services.infrastructure.metrics_registry import MetricsRegistry, get_metrics_registry
 
 logger = logging.getLogger(__name__)
 
@@ -16,9 +18,11 @@ class PricingManager:
         self,
         pricing_adapter: PricingAdapter = Depends(PricingAdapter),
         cache_registry: DistributedCacheRegistry = Depends(DistributedCacheRegistry),
+        metrics_registry: MetricsRegistry = Depends(get_metrics_registry),
     ) -> None:
         self._pricing_adapter = pricing_adapter
         self._cache = cache_registry
+        self._metrics_registry = metrics_registry
 
     async def get_product_prices_mapper(self, warehouse_id: UUID, product_ids: List[UUID]) -> Dict[UUID, int]:
         if not product_ids:
@@ -39,8 +43,12 @@ class PricingManager:
             else:
                 cache_miss.append(key.product_id)
 
+        self._metrics_registry.register_cache_hits("purchase_prices", len(products_prices_mapper))
+        self._metrics_registry.register_cache_misses("purchase_prices", len(cache_miss))
         if cache_miss:
+            started_at = time.perf_counter()
             product_purchase_prices = await self._pricing_adapter.get_product_prices(warehouse_id, cache_miss)
+            self._metrics_registry.observe_cache_load("purchase_prices", time.perf_counter() - started_at)
             multi_set_pairs = []
             for it in product_purchase_prices:
                 multi_set_pairs.append(
@@ -58,3 +66,36 @@ class PricingManager:
 
         logger.info(f"[get_product_prices_mapper] purchase_prices: {products_prices_mapper}")
         return products_prices_mapper
+
+    async def set_product_prices(self, warehouse_id: UUID, purchase_prices: Dict[UUID, int]) -> None:
+        if not purchase_prices:
+            return
+
+        await self._cache.purchase_prices.multi_set(
+            [
+                (ProductsPricesItemCacheKey(product_id=product_id, warehouse_id=warehouse_id), purchase_price)
+                for product_id, purchase_price in purchase_prices.items()
+            ]
+        )
+        logger.info(f"[warehouse_id={warehouse_id}] Overwritten {len(purchase_prices)} cached purchase prices")
+
+    async def evict_product_prices(self, warehouse_id: UUID, product_ids: List[UUID]) -> None:
+        for product_id in product_ids:
+            await self._cache.purchase_prices.delete(
+                ProductsPricesItemCacheKey(product_id=product_id, warehouse_id=warehouse_id)
+            )
+        if product_ids:
+            logger.info(f"[warehouse_id={warehouse_id}] Evicted {len(product_ids)} cached purchase prices")
+
+    async def warm_product_prices(self, warehouse_id: UUID, product_ids: List[UUID]) -> Dict[UUID, int]:
+        if not product_ids:
+            return {}
+
+        product_purchase_prices = await self._pricing_adapter.get_product_prices(warehouse_id, product_ids)
+        purchase_prices = {it.product_id: it.purchase_price for it in product_purchase_prices}
+        await self.set_product_prices(warehouse_id, purchase_prices)
+
+        missing = [product_id for product_id in product_ids if product_id not in purchase_prices]
+        await self.evict_product_prices(warehouse_id, missing)
+
+        return purchase_prices
@@ -0,0 +1,304 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+from dataclasses import asdict, dataclass, fields, is_dataclass
+from datetime import datetime, time
+from decimal import Decimal
+from enum import Enum
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    get_args,
+    get_origin,
+    get_type_hints,
+)
+from uuid import UUID
+
+logger = logging.getLogger(__name__)
+
+SnapshotKey = Union[UUID, str]
+
+_MAGIC = b"PROMOSNP"
+_FORMAT = 1
+# magic, format, snapshot version, section count
+_HEADER = struct.Struct("<8sIQI")
+# section name, index offset, entries count
+_SECTION = struct.Struct("<32sQI")
+# key, record offset, record length
+_ENTRY = struct.Struct("<16sQI")
+# Id lists are records of sorted fixed size ids
+_ID_SIZE = 16
+
+T = TypeVar("T")
+
+
+def encode_key(key: SnapshotKey) -> bytes:
+    """Fixed size index key, strings are hashed"""
+    if isinstance(key, UUID):
+        return key.bytes
+
+    return hashlib.blake2b(key.encode(), digest_size=16).digest()
+
+
+def dump_dataclass(value: Any) -> Dict[str, Any]:
+    return asdict(value)
+
+
+def _load_value(tp: Any, value: Any) -> Any:
+    if value is None:
+        return None
+
+    origin = get_origin(tp)
+    if origin is Union:
+        return _load_value(next(it for it in get_args(tp) if it is not type(None)), value)
+    if origin is list:
+        return [_load_value(get_args(tp)[0], it) for it in value]
+    if tp is datetime:
+        return datetime.fromisoformat(value)
+    if tp is time:
+        return time.fromisoformat(value)
+    if tp in (UUID, Decimal) or (isinstance(tp, type) and issubclass(tp, Enum)):
+        return tp(value)
+    if is_dataclass(tp):
+        return load_dataclass(tp, value)
+
+    return value
+
+
+def load_dataclass(cls: Type[T], record: Dict[str, Any]) -> T:
+    """Restores a dataclass written with `dump_dataclass`, values are converted by the field annotations"""
+    hints = get_type_hints(cls)
+    return cls(**{it.name: _load_value(hints[it.name], record[it.name]) for it in fields(cls)})
+
+
+class SnapshotWriter:
+    """
+    Builds a read-only snapshot file: header, section table, one sorted key index per section and records.
+    Records are JSON serialized with `default=str`, readers restore the types they need,
+    or sorted id lists that readers search in place
+    """
+
+    def __init__(self, version: int) -> None:
+        self.version = version
+        self._sections: Dict[str, Dict[bytes, bytes]] = {}
+
+    def add(self, section: str, key: SnapshotKey, record: Any) -> None:
+        self._sections.setdefault(section, {})[encode_key(key)] = json.dumps(record, default=str).encode()
+
+    def add_ids(self, section: str, key: SnapshotKey, ids: Iterable[UUID]) -> None:
+        self._sections.setdefault(section, {})[encode_key(key)] = b"".join(sorted(it.bytes for it in ids))
+
+    def dumps(self) -> bytes:
+        names = sorted(self._sections)
+        offset = _HEADER.size + _SECTION.size * len(names)
+        table, indexes, records = [], [], []
+        records_offset = offset + sum(_ENTRY.size * len(self._sections[it]) for it in names)
+
+        for name in names:
+            entries = sorted(self._sections[name].items())
+            table.append(_SECTION.pack(name.encode(), offset, len(entries)))
+            offset += _ENTRY.size * len(entries)
+            for key, record in entries:
+                indexes.append(_ENTRY.pack(key, records_offset, len(record)))
+                records.append(record)
+                records_offset += len(record)
+
+        header = _HEADER.pack(_MAGIC, _FORMAT, self.version, len(names))
+        return b"".join([header, *table, *indexes, *records])
+
+    def write(self, path: str) -> None:
+        """Publish atomically, readers see either the previous or the new file, never a partial one"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self.dumps())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+
+class SnapshotFile:
+    """
+    Memory-mapped snapshot, records are located by binary search over the mapped index.
+    JSON records are decoded on access, id lists are searched in place
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            self.inode = os.fstat(f.fileno()).st_ino
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, fmt, self.version, count = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC or fmt != _FORMAT:
+            self._mm.close()
+            raise ValueError(f"Unsupported snapshot file {path}")
+
+        self._sections: Dict[str, Tuple[int, int]] = {}
+        for i in range(count):
+            name, offset, entries = _SECTION.unpack_from(self._mm, _HEADER.size + i * _SECTION.size)
+            self._sections[name.rstrip(b"\0").decode()] = (offset, entries)
+
+    def get(self, section: str, key: SnapshotKey) -> Optional[Any]:
+        if (record := self._find(section, key)) is None:
+            return None
+
+        record_offset, length = record
+        return json.loads(self._mm[record_offset : record_offset + length])
+
+    def get_ids(self, section: str, key: SnapshotKey) -> Optional["SnapshotIds"]:
+        if (record := self._find(section, key)) is None:
+            return None
+
+        record_offset, length = record
+        return SnapshotIds(self._mm, record_offset, length // _ID_SIZE)
+
+    def _find(self, section: str, key: SnapshotKey) -> Optional[Tuple[int, int]]:
+        """Offset and length of the record"""
+        if section not in self._sections:
+            return None
+
+        offset, count = self._sections[section]
+        needle = encode_key(key)
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            position = offset + mid * _ENTRY.size
+            current = self._mm[position : position + 16]
+            if current < needle:
+                lo = mid + 1
+            elif current > needle:
+                hi = mid
+            else:
+                _, record_offset, length = _ENTRY.unpack_from(self._mm, position)
+                return record_offset, length
+
+        return None
+
+    def close(self) -> None:
+        self._mm.close()
+
+
+class SnapshotIds:
+    """
+    Id list of a snapshot record, searched in place in the mapping without decoding the record.
+    Valid until the snapshot is reloaded, so it is not kept across awaits
+    """
+
+    def __init__(self, mm: mmap.mmap, offset: int, count: int) -> None:
+        self._mm = mm
+        self._offset = offset
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, value: UUID) -> bool:
+        needle = value.bytes
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            position = self._offset + mid * _ID_SIZE
+            current = self._mm[position : position + _ID_SIZE]
+            if current < needle:
+                lo = mid + 1
+            elif current > needle:
+                hi = mid
+            else:
+                return True
+
+        return False
+
+    def __iter__(self) -> Iterator[UUID]:
+        for i in range(self._count):
+            position = self._offset + i * _ID_SIZE
+            yield UUID(bytes=self._mm[position : position + _ID_SIZE])
+
+
+@dataclass
+class _Invalidation:
+    keys: Optional[List[bytes]]
+    version: int
+
+
+class SnapshotStore:
+    """
+    Current snapshot of a process. `reload` maps a newly published file,
+    keys invalidated after the snapshot was built are not served from it until a newer one is published
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file: Optional[SnapshotFile] = None
+        self._invalidations: Dict[str, List[_Invalidation]] = {}
+
+    @property
+    def version(self) -> Optional[int]:
+        return self._file.version if self._file is not None else None
+
+    def reload(self) -> bool:
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            return False
+
+        if self._file is not None and self._file.inode == inode:
+            return False
+
+        snapshot = SnapshotFile(self.path)
+        previous, self._file = self._file, snapshot
+        # Records are decoded into new objects and id lists are not kept across awaits,
+        # nothing references the previous mapping
+        if previous is not None:
+            previous.close()
+
+        self._invalidations = {
+            section: kept
+            for section, items in self._invalidations.items()
+            if (kept := [it for it in items if it.version >= snapshot.version])
+        }
+        logger.info(f"Snapshot version {snapshot.version} mapped")
+        return True
+
+    def get(self, section: str, key: SnapshotKey) -> Optional[Any]:
+        """Record from the snapshot, `None` when missing or invalidated"""
+        if self._file is None or self._is_invalidated(section, key):
+            return None
+
+        return self._file.get(section, key)
+
+    def get_ids(self, section: str, key: SnapshotKey) -> Optional[SnapshotIds]:
+        """Id list from the snapshot, `None` when missing or invalidated"""
+        if self._file is None or self._is_invalidated(section, key):
+            return None
+
+        return self._file.get_ids(section, key)
+
+    def invalidate(self, section: str, keys: Optional[Iterable[SnapshotKey]], version: int) -> None:
+        if self._file is None:
+            return
+
+        encoded = None if keys is None else [encode_key(it) for it in keys]
+        self._invalidations.setdefault(section, []).append(_Invalidation(keys=encoded, version=version))
+
+    def _is_invalidated(self, section: str, key: SnapshotKey) -> bool:
+        items = self._invalidations.get(section)
+        if not items:
+            return False
+
+        encoded = encode_key(key)
+        return any(it.keys is None or encoded in it.keys for it in items)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
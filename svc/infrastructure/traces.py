@@ -14,7 +14,7 @@ from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExport
 from opentelemetry.sdk.trace.sampling import ParentBasedTraceIdRatio
 from opentelemetry.trace import format_trace_id
 
-from svc.persist.database import database
+from svc.persist.database import bulk_database, consumer_database, database
 from svc.settings import TracingSettings
 
 trace_id_context_var = contextvars.ContextVar("trace_id", default="")
@@ -25,6 +25,15 @@ def set_trace_context_var(span: trace.Span, scope: dict) -> None:
 
 
 def configure_traces(app: FastAPI, settings: TracingSettings) -> None:
+    configure_tracer_provider(settings)
+    FastAPIInstrumentor.instrument_app(
+        app,
+        server_request_hook=set_trace_context_var,
+        excluded_urls="/health,/ready,/metrics",
+    )
+
+
+def configure_tracer_provider(settings: TracingSettings) -> None:
     tracer_provider = TracerProvider(
         sampler=ParentBasedTraceIdRatio(settings.sampling_rate),
         resource=Resource.create(
@@ -52,9 +61,6 @@ def configure_traces(app: FastAPI, settings: TracingSettings) -> None:
 
     set_global_textmap(B3MultiFormat())
 
-    FastAPIInstrumentor.instrument_app(
-        app,
-        server_request_hook=set_trace_context_var,
-        excluded_urls="/health,/metrics",
+    SQLAlchemyInstrumentor().instrument(
+        engines=[it.engine.sync_engine for it in (database, bulk_database, consumer_database)]
     )
-    SQLAlchemyInstrumentor().instrument(engine=database.engine.sync_engine)
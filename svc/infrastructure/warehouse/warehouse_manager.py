@@ -35,6 +35,27 @@ class WarehouseManager:
 
         return response.result.items
 
+    async def list_all_warehouses(self, page_size: int) -> list[WarehouseShortModel]:
+        result: list[WarehouseShortModel] = []
+        offset = 0
+        while True:
+            response = await self._warehouse_client.warehouse.list_warehouses(
+                WarehouseListFilters(
+                    offset=offset,
+                    limit=page_size,
+                )
+            )
+
+            if response.error is not None:
+                raise Exception(response.error.code)
+
+            items: list[WarehouseModel] = response.result.items if response.result else []
+            result.extend(WarehouseShortModel(id=it.id, active=it.active, tz=it.tz) for it in items)
+            if len(items) < page_size:
+                return result
+
+            offset += page_size
+
     async def get_single_warehouse(self, warehouse_id: UUID) -> WarehouseShortModel:
         response = await self._warehouse_client.warehouse.get_warehouse(warehouse_id=warehouse_id)
         if response.error is not None:
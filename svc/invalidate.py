@@ -0,0 +1,58 @@
+"""
+Publishes a cache invalidation event through the configured transport, for writes made outside of the service:
+warehouse changes and admin edits of warehouse bonus settings, gift promotions or happy hours.
+
+    python -m svc.invalidate happy_hours 0b7e4fcb-3e37-4c43-a4b8-6c1e2d1b2a6f
+    python -m svc.invalidate gift_promotion_settings
+
+Keys are warehouse ids, coupon ids for coupons. Without keys every cached value of the entity is dropped.
+The local transport reaches no other process, a shared one has to be configured
+"""
+import argparse
+import asyncio
+import logging
+from typing import List, Optional
+from uuid import UUID
+
+from svc.infrastructure.logging import configure_logging
+from svc.persist.database import database
+from svc.services.invalidation import InvalidationEntity, create_invalidation_bus
+from svc.settings import InvalidationTransportEnum, Settings, get_service_settings
+
+logger = logging.getLogger(__name__)
+
+
+async def invalidate(settings: Settings, entity: InvalidationEntity, keys: Optional[List[UUID]] = None) -> None:
+    if settings.invalidation.transport == InvalidationTransportEnum.local:
+        raise RuntimeError("The local transport reaches no other process, set INVALIDATION_TRANSPORT")
+
+    bus = create_invalidation_bus(settings, database)
+    await bus.start()
+    try:
+        # Failures are raised, the command exits with an error when nothing was sent
+        await bus.send(bus.create_event(entity, keys))
+    finally:
+        await bus.stop()
+    logger.info(f"Invalidated {entity.value}: {'all' if keys is None else ', '.join(str(it) for it in keys)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("entity", choices=[it.value for it in InvalidationEntity])
+    parser.add_argument("keys", type=UUID, nargs="*", help="Every cached value of the entity by default")
+    args = parser.parse_args()
+
+    settings = get_service_settings()
+    configure_logging(settings.logging_profile)
+
+    async def run() -> None:
+        try:
+            await invalidate(settings, InvalidationEntity(args.entity), args.keys or None)
+        finally:
+            await database.shutdown()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
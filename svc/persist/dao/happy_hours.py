@@ -1,6 +1,6 @@
 from dataclasses import dataclass
 from datetime import datetime, time
-from typing import List, Optional
+from typing import List
 from uuid import UUID
 
 from fastapi import Depends
@@ -38,26 +38,36 @@ class HappyHoursDAO:
     def __init__(self, connection: AsyncConnection = Depends(conditions_database.connection)):
         self._connection = connection
 
-    async def get_forced_happy_hours_bonus(self, warehouse_id: UUID, warehouse_tz: str) -> Optional[int]:
+    async def get_upcoming_forced_happy_hours(self, warehouse_id: UUID, warehouse_tz: str) -> List[ManualHappyHoursDto]:
         current_time = datetime.now(tz=timezone(warehouse_tz)).replace(tzinfo=None)
         from_statement = WarehouseHappyHoursSettingsSchema.table.join(
             WarehouseForcedHappyHoursSchema.table,
             WarehouseHappyHoursSettingsSchema.warehouse_id == WarehouseForcedHappyHoursSchema.warehouse_id,
         )
-        forced_bonus_query = (
-            select([WarehouseHappyHoursSettingsSchema.bonus_amount])
+        columns = [
+            WarehouseHappyHoursSettingsSchema.bonus_amount,
+            WarehouseForcedHappyHoursSchema.start_time,
+            WarehouseForcedHappyHoursSchema.end_time,
+        ]
+        forced_query = (
+            select(columns)
             .select_from(from_statement)
             .where(WarehouseForcedHappyHoursSchema.warehouse_id == warehouse_id)
-            .where(WarehouseForcedHappyHoursSchema.start_time <= current_time)
             .where(WarehouseForcedHappyHoursSchema.end_time > current_time)
+            .order_by(WarehouseForcedHappyHoursSchema.start_time)
         )
 
-        forced_bonus = (await self._connection.execute(forced_bonus_query)).first()
-
-        if forced_bonus:
-            return forced_bonus[WarehouseHappyHoursSettingsSchema.bonus_amount]
+        cursor = await self._connection.execute(forced_query)
 
-        return None
+        return [
+            ManualHappyHoursDto(
+                warehouse_id=warehouse_id,
+                start_time=it[WarehouseForcedHappyHoursSchema.start_time],
+                end_time=it[WarehouseForcedHappyHoursSchema.end_time],
+                value=it[WarehouseHappyHoursSettingsSchema.bonus_amount],
+            )
+            for it in cursor
+        ]
 
     async def get_active_scheduled_happy_hours(self, warehouse_id: UUID) -> List[HappyHoursDto]:
         from_statement = WarehouseHappyHoursSettingsSchema.table.join(
@@ -1,17 +1,35 @@
 import logging
-from typing import AsyncGenerator
+from typing import AsyncGenerator, List, Optional
 
-from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 
+from svc.persist.lazy_connection import LazyConnection
+from svc.persist.pool import PoolValidator, instrument_pool
+from svc.persist.replicas import ReplicaSet
 from svc.settings import DbSettings, get_service_settings
 
 logger = logging.getLogger(__name__)
 
 
 class Database:
-    def __init__(self, db_settings: DbSettings):
+    def __init__(self, db_settings: DbSettings, name: str):
         self._settings = db_settings
-        self.engine: AsyncEngine = self._create_engine(db_settings)
+        self.engine: AsyncEngine = self._create_engine(db_settings.url, db_settings, name)
+        self.replicas: Optional[ReplicaSet] = None
+        if db_settings.replica_hosts:
+            self.replicas = ReplicaSet(
+                [
+                    self._create_engine(url, db_settings, f"{name}_replica_{index}")
+                    for index, url in enumerate(db_settings.replica_urls)
+                ],
+                max_lag=db_settings.replica_max_lag,
+                check_interval=db_settings.replica_lag_check_interval,
+            )
+
+        self._validators: List[PoolValidator] = []
+        if db_settings.pool_validation_interval > 0:
+            engines = [self.engine, *(self.replicas.engines if self.replicas else [])]
+            self._validators = [PoolValidator(engine, db_settings.pool_validation_interval) for engine in engines]
 
     # def _create_url(self):
     #     url = sqlalchemy.engine.url.URL.create(
@@ -24,30 +42,52 @@ class Database:
     #     )
 
     @staticmethod
-    def _create_engine(settings: DbSettings) -> AsyncEngine:
-        logger.debug(f"Connect to database {settings.base_name} at {settings.host}")
-        return create_async_engine(
-            settings.url,
+    def _create_engine(url: str, settings: DbSettings, name: str) -> AsyncEngine:
+        engine = create_async_engine(
+            url,
             pool_size=settings.pool_size,
-            pool_pre_ping=True,
+            max_overflow=settings.max_overflow,
+            pool_timeout=settings.pool_timeout,
+            pool_recycle=settings.pool_recycle,
+            pool_pre_ping=settings.pool_validation_interval <= 0,
+            connect_args={"timeout": settings.connect_timeout},
             echo=settings.echo,
         )
+        instrument_pool(engine, name, settings.pool_queue_limit)
+        logger.debug(f"Connect to database {settings.base_name} at {engine.url.host}")
+        return engine
 
     async def startup(self) -> None:
-        pass
+        if self.replicas is not None:
+            await self.replicas.start()
+        for validator in self._validators:
+            await validator.start()
 
     async def shutdown(self) -> None:
         if self.engine is None:
             raise RuntimeError("Uninitialized database")
+        for validator in self._validators:
+            await validator.stop()
+        if self.replicas is not None:
+            await self.replicas.stop()
+            await self.replicas.dispose()
         await self.engine.dispose()
 
-    async def connection(self) -> AsyncGenerator[AsyncConnection, None]:
+    async def connection(self) -> AsyncGenerator[LazyConnection, None]:
         if self.engine is None:
             raise RuntimeError("Uninitialized database")
 
-        async with self.engine.connect() as connection:
+        connection = LazyConnection(self.engine, self.replicas)
+        try:
             yield connection
+        finally:
+            await connection.close()
 
 
-database = Database(get_service_settings().db)
-conditions_database = Database(get_service_settings().conditions_db)
+database = Database(get_service_settings().db, "main")
+conditions_database = Database(get_service_settings().conditions_db, "conditions")
+# Bulk imports and the Kafka consumer get pools of their own so they cannot starve API requests of connections
+bulk_database = Database(get_service_settings().db.for_workload(get_service_settings().db_bulk_pool), "main_bulk")
+consumer_database = Database(
+    get_service_settings().db.for_workload(get_service_settings().db_consumer_pool), "main_consumer"
+)
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+
+from sqlalchemy.engine import Result
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncTransaction
+
+from svc.persist.pool import checkout, get_pool_name
+from svc.persist.replicas import ReplicaSet
+from svc.services.infrastructure.metrics_registry import get_metrics_registry
+
+logger = logging.getLogger(__name__)
+
+
+def _is_connection_error(exc: DBAPIError) -> bool:
+    return exc.connection_invalidated or isinstance(exc, (InterfaceError, OperationalError))
+
+
+def _is_read(statement: Any) -> bool:
+    """Selects without FOR UPDATE are reads, every other statement, text ones included, is treated as a write"""
+    return getattr(statement, "is_select", False) and getattr(statement, "_for_update_arg", None) is None
+
+
+class LazyConnection:
+    """
+    Request-scoped stand-in for AsyncConnection. A pooled connection is checked out on the first statement
+    and returned as soon as no statement, `begin()` block or uncommitted write holds it,
+    so requests served from caches never touch the pool.
+    Results are buffered by the driver and stay readable after the connection is returned.
+
+    With replicas, selects go to a replica only within `replica_reads()` and only until the request opens
+    a transaction or writes, later statements stay on the primary to read its own writes.
+    Reads that guard writes must not see a lagging replica, so every other statement goes to the primary
+    """
+
+    def __init__(self, engine: AsyncEngine, replicas: Optional[ReplicaSet] = None) -> None:
+        self._engine = engine
+        self._replicas = replicas
+        self._connection: Optional[AsyncConnection] = None
+        self._lock = asyncio.Lock()
+        self._active = 0
+        self._has_writes = False
+        self._pinned_to_primary = False
+        self._replica_reads = 0
+        self._commits = 0
+        self._metrics = get_metrics_registry()
+
+    @property
+    def checked_out(self) -> bool:
+        return self._connection is not None
+
+    @asynccontextmanager
+    async def _use(self) -> AsyncIterator[AsyncConnection]:
+        self._active += 1
+        try:
+            async with self._lock:
+                if self._connection is None:
+                    self._connection = await checkout(self._engine)
+            yield self._connection
+        finally:
+            self._active -= 1
+            await self._release_if_idle()
+
+    async def _release_if_idle(self) -> None:
+        if self._active or self._connection is None:
+            return
+        if self._has_writes and self._connection.in_transaction():
+            # Writes outside of begin() stay on the connection until commit or rollback
+            return
+        self._has_writes = False
+        connection, self._connection = self._connection, None
+        # Rolls back the implicit transaction of reads
+        await connection.close()
+
+    @asynccontextmanager
+    async def replica_reads(self) -> AsyncIterator[None]:
+        """Lets selects within the block go to a replica"""
+        self._replica_reads += 1
+        try:
+            yield
+        finally:
+            self._replica_reads -= 1
+
+    def _reads_from_replica(self, statement: Any) -> bool:
+        return self._replica_reads > 0 and not self._pinned_to_primary and _is_read(statement)
+
+    async def execute(self, statement: Any, parameters: Any = None, **kwargs: Any) -> Result:
+        replicas = self._replicas
+        if replicas is not None and self._reads_from_replica(statement):
+            replica = replicas.choose()
+            if replica is not None:
+                try:
+                    connection = await checkout(replica)
+                    try:
+                        return await connection.execute(statement, parameters, **kwargs)
+                    finally:
+                        await connection.close()
+                except (OSError, DBAPIError) as exc:
+                    if isinstance(exc, DBAPIError) and not _is_connection_error(exc):
+                        raise
+                    logger.warning(f"Replica {replica.url.host} failed, reading from primary", exc_info=True)
+                    replicas.mark_unavailable(replica)
+
+        async with self._use() as connection:
+            result = await connection.execute(statement, parameters, **kwargs)
+            if not _is_read(statement):
+                self._has_writes = True
+                self._pinned_to_primary = True
+            return result
+
+    def in_transaction(self) -> bool:
+        return self._connection is not None and self._connection.in_transaction()
+
+    @asynccontextmanager
+    async def begin(self) -> AsyncIterator[AsyncTransaction]:
+        self._pinned_to_primary = True
+        async with self._use() as connection:
+            async with connection.begin() as transaction:
+                yield transaction
+            # Not reached when the block raised and the transaction was rolled back
+            self._commits += 1
+
+    @asynccontextmanager
+    async def begin_nested(self) -> AsyncIterator[AsyncTransaction]:
+        async with self._use() as connection:
+            async with connection.begin_nested() as savepoint:
+                yield savepoint
+
+    async def commit(self) -> None:
+        if self._connection is None:
+            return
+        await self._connection.commit()
+        self._commits += 1
+        self._has_writes = False
+        await self._release_if_idle()
+
+    async def rollback(self) -> None:
+        if self._connection is None:
+            return
+        await self._connection.rollback()
+        self._has_writes = False
+        await self._release_if_idle()
+
+    async def close(self) -> None:
+        pool = get_pool_name(self._engine)
+        if pool is not None:
+            self._metrics.observe_db_commits(pool, self._commits)
+        self._has_writes = False
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            await connection.close()
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+from weakref import WeakKeyDictionary
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from sqlalchemy.pool import Pool
+
+from svc.services.infrastructure.metrics_registry import MetricsRegistry, get_metrics_registry
+
+logger = logging.getLogger(__name__)
+
+
+class PoolQueueFullError(Exception):
+    pass
+
+
+@dataclass
+class _PoolState:
+    name: str
+    queue_limit: int
+    pending_checkouts: int = 0
+
+
+_pool_states: "WeakKeyDictionary[Pool, _PoolState]" = WeakKeyDictionary()
+
+
+def instrument_pool(
+    engine: AsyncEngine, name: str, queue_limit: int = 0, metrics: Optional[MetricsRegistry] = None
+) -> None:
+    """
+    Reports usage, connection age and invalidations of the engine pool labeled with `name`.
+    With a positive `queue_limit` checkouts beyond that many pending ones fail at once instead of queueing
+    """
+    registry = metrics or get_metrics_registry()
+    pool = engine.sync_engine.pool
+    _pool_states[pool] = _PoolState(name, queue_limit)
+
+    def update_usage(*_: Any) -> None:
+        registry.set_db_pool_usage(name, pool.checkedout(), pool.overflow())
+
+    def on_connect(dbapi_connection: Any, connection_record: Any) -> None:
+        connection_record.info["connected_at"] = time.monotonic()
+
+    def on_checkout(dbapi_connection: Any, connection_record: Any, connection_proxy: Any) -> None:
+        connected_at = connection_record.info.get("connected_at")
+        if connected_at is not None:
+            registry.observe_db_pool_connection_age(name, time.monotonic() - connected_at)
+        update_usage()
+
+    def on_invalidate(dbapi_connection: Any, connection_record: Any, exception: Optional[BaseException]) -> None:
+        registry.register_db_pool_invalidation(name)
+
+    event.listen(pool, "connect", on_connect)
+    event.listen(pool, "checkout", on_checkout)
+    event.listen(pool, "checkin", update_usage)
+    event.listen(pool, "invalidate", on_invalidate)
+
+
+def get_pool_name(engine: AsyncEngine) -> Optional[str]:
+    state = _pool_states.get(engine.sync_engine.pool)
+    return state.name if state is not None else None
+
+
+def is_saturated(engine: AsyncEngine) -> bool:
+    """Checkouts are pending while no idle connection is left"""
+    state = _pool_states.get(engine.sync_engine.pool)
+    idle = engine.sync_engine.pool.checkedin()
+    return state is not None and state.pending_checkouts > 0 and idle == 0
+
+
+async def checkout(engine: AsyncEngine, metrics: Optional[MetricsRegistry] = None) -> AsyncConnection:
+    """Checks a connection out of the engine pool, observing the latency and queue limit of instrumented pools"""
+    state = _pool_states.get(engine.sync_engine.pool)
+    if state is None:
+        return await engine.connect()
+
+    metrics = metrics or get_metrics_registry()
+    if state.queue_limit and state.pending_checkouts >= state.queue_limit:
+        metrics.register_db_pool_rejection(state.name)
+        raise PoolQueueFullError(f"Pool {state.name} has {state.pending_checkouts} pending checkouts")
+
+    started = time.perf_counter()
+    state.pending_checkouts += 1
+    try:
+        connection = await engine.connect()
+    finally:
+        state.pending_checkouts -= 1
+    metrics.observe_db_pool_checkout(state.name, time.perf_counter() - started)
+    return connection
+
+
+class PoolValidator:
+    """
+    Pings idle pooled connections every `interval` seconds in place of pinging on every checkout.
+    Connections failing the ping are invalidated and replaced on the next checkout
+    """
+
+    def __init__(self, engine: AsyncEngine, interval: float) -> None:
+        self._engine = engine
+        self._interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def validate(self) -> None:
+        # Checked in connections are handed out first in first out, checking out one at a time visits each once
+        for _ in range(self._engine.sync_engine.pool.checkedin()):
+            try:
+                async with self._engine.connect() as connection:
+                    await connection.execute(text("SELECT 1"))
+            except Exception:
+                logger.warning(f"Pooled connection to {self._engine.url.host} failed validation", exc_info=True)
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            await self.validate()
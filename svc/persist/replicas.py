@@ -0,0 +1,91 @@
+import asyncio
+import itertools
+import logging
+import math
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+# A caught up replica reports zero lag, an idle primary would otherwise look lagged by its last commit time.
+# A primary used as a single-node stand-in is not in recovery and reports zero lag too
+_LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 'Infinity')
+    END
+    """
+)
+
+
+class ReplicaSet:
+    """
+    Read replicas of a database with periodically measured replication lag.
+    Replicas lagging by more than `max_lag` seconds, failing or not measured recently are skipped,
+    reads fall back to the primary when none is left
+    """
+
+    def __init__(self, engines: List[AsyncEngine], max_lag: float, check_interval: float) -> None:
+        self.engines = engines
+        self._max_lag = max_lag
+        self._check_interval = check_interval
+        self._lags: Dict[int, float] = {}
+        self._checked_at: Dict[int, float] = {}
+        self._round_robin = itertools.cycle(range(len(engines)))
+        self._task: Optional[asyncio.Task] = None
+
+    def choose(self) -> Optional[AsyncEngine]:
+        now = time.monotonic()
+        for _ in range(len(self.engines)):
+            index = next(self._round_robin)
+            # Measurements older than a few intervals mean the lag check is stuck
+            if now - self._checked_at.get(index, -math.inf) > 3 * self._check_interval:
+                continue
+            if self._lags.get(index, math.inf) <= self._max_lag:
+                return self.engines[index]
+        return None
+
+    def mark_unavailable(self, engine: AsyncEngine) -> None:
+        index = self.engines.index(engine)
+        self._lags[index] = math.inf
+
+    async def check(self) -> None:
+        for index, engine in enumerate(self.engines):
+            try:
+                async with engine.connect() as connection:
+                    lag = float((await connection.execute(_LAG_QUERY)).scalar_one())
+            except Exception:
+                logger.warning(f"Unable to check lag of replica {engine.url.host}", exc_info=True)
+                lag = math.inf
+
+            if lag > self._max_lag >= self._lags.get(index, 0):
+                logger.warning(f"Replica {engine.url.host} lags by {lag:.1f}s, reading from primary")
+            self._lags[index] = lag
+            self._checked_at[index] = time.monotonic()
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+
+        await self.check()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        self._task = None
+
+    async def dispose(self) -> None:
+        for engine in self.engines:
+            await engine.dispose()
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._check_interval)
+            await self.check()
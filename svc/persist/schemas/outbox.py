@@ -0,0 +1,15 @@
+from sqlalchemy import BigInteger, Column, String
+from sqlalchemy.dialects.postgresql import JSONB
+
+from svc.persist.schemas.metadata import PublicSchema, TZDateTime
+
+
+class CouponEventOutboxSchema(metaclass=PublicSchema):
+    __table__ = "promotion_coupon_events_outbox"
+
+    id = Column("id", BigInteger, primary_key=True)
+    topic = Column("topic", String, nullable=False)
+    key = Column("key", String, nullable=False)
+    payload = Column("payload", JSONB, nullable=False)
+    headers = Column("headers", JSONB, nullable=False)
+    created_at = Column("created_at", TZDateTime, nullable=False)
@@ -4,23 +4,34 @@ from fastapi import Depends
 
 from svc.infrastructure.warehouse.models import WarehouseShortModel
 from svc.infrastructure.warehouse.warehouse_manager import WarehouseManager
+from svc.services.adapters.warehouse_directory import WarehouseDirectory, warehouse_directory
 from svc.services.cache import LocalCacheRegistry
 
 
+def get_warehouse_directory() -> WarehouseDirectory:
+    return warehouse_directory
+
+
 class WarehouseAdapter:
     def __init__(
         self,
         warehouse_manager: WarehouseManager = Depends(WarehouseManager),
         cache_registry: LocalCacheRegistry = Depends(LocalCacheRegistry),
+        directory: WarehouseDirectory = Depends(get_warehouse_directory),
     ) -> None:
         self._warehouse_manager = warehouse_manager
         self._cache = cache_registry
+        self._directory = directory
 
     async def get_warehouse(self, warehouse_id: UUID) -> WarehouseShortModel:
+        if (warehouse := self._directory.get(warehouse_id)) is not None:
+            return warehouse
+
+        # Unknown to the preloaded directory, e.g. created after the last refresh
         result = await self._cache.warehouses.get(warehouse_id)
         if result is None:
-            warehouse: WarehouseShortModel = await self._warehouse_manager.get_single_warehouse(warehouse_id)
-            await self._cache.warehouses.set(warehouse_id, warehouse)
-            return warehouse
+            result = await self._warehouse_manager.get_single_warehouse(warehouse_id)
+            await self._cache.warehouses.set(warehouse_id, result)
 
+        self._directory.put(result)
         return result
@@ -0,0 +1,89 @@
+import asyncio
+import logging
+from typing import Dict, Optional
+from uuid import UUID
+
+from warehouse.api_client.client import WarehouseGeneralClient
+
+from svc.infrastructure.warehouse.models import WarehouseShortModel
+from svc.infrastructure.warehouse.warehouse_manager import WarehouseManager
+from svc.settings import CacheRegistryConfig, get_cache_config
+
+logger = logging.getLogger(__name__)
+
+
+class WarehouseDirectory:
+    """
+    In-process copy of the whole warehouse directory.
+    Loaded once at startup and refreshed in the background, so lookups never wait for the warehouse service
+    """
+
+    def __init__(self, settings: CacheRegistryConfig):
+        self._settings = settings
+        self._warehouses: Dict[UUID, WarehouseShortModel] = {}
+        self._ready = asyncio.Event()
+        self._refresh_requested = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def get(self, warehouse_id: UUID) -> Optional[WarehouseShortModel]:
+        return self._warehouses.get(warehouse_id)
+
+    def put(self, warehouse: WarehouseShortModel) -> None:
+        self._warehouses[warehouse.id] = warehouse
+
+    def evict(self, warehouse_id: UUID) -> None:
+        self._warehouses.pop(warehouse_id, None)
+
+    def request_refresh(self) -> None:
+        """Reloads the directory in the background, lookups are served from the current one meanwhile"""
+        if self._task is None:
+            # Without the refresh loop the directory only holds warehouses loaded on demand
+            self._warehouses = {}
+            return
+
+        self._refresh_requested.set()
+
+    async def refresh(self, warehouse_manager: WarehouseManager) -> None:
+        warehouses = await warehouse_manager.list_all_warehouses(self._settings.warehouses_page_size)
+        # Swap the whole map at once, readers never see a partially loaded directory
+        self._warehouses = {it.id: it for it in warehouses}
+        self._ready.set()
+        logger.info(f"Warehouse directory loaded, {len(warehouses)} warehouses")
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+
+        self._task = asyncio.create_task(self._loop(WarehouseManager(WarehouseGeneralClient.instance())))
+        try:
+            await asyncio.wait_for(self._ready.wait(), self._settings.warehouses_preload_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Warehouse directory preload timed out, falling back to on-demand loading")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        self._task = None
+
+    async def _loop(self, warehouse_manager: WarehouseManager) -> None:
+        while True:
+            # Requests made while refreshing are served by the next refresh
+            self._refresh_requested.clear()
+            try:
+                await self.refresh(warehouse_manager)
+            except Exception:
+                logger.exception("Unable to refresh warehouse directory")
+
+            try:
+                await asyncio.wait_for(self._refresh_requested.wait(), self._settings.warehouses_refresh_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+warehouse_directory = WarehouseDirectory(get_cache_config())
@@ -1,6 +1,6 @@
 import logging
 from datetime import datetime
-from typing import Any
+from typing import Any, Optional
 from uuid import UUID, uuid4
 
 from fastapi import Depends
@@ -8,7 +8,7 @@ from sqlalchemy.dialects.postgresql import Insert as PgInsert
 from sqlalchemy.ext.asyncio import AsyncConnection
 
 from svc.api.models.bulk import BulkOperation
-from svc.persist.database import database
+from svc.persist.database import bulk_database
 from svc.persist.schemas.coupon import (
     CouponPermitCategorySchema,
     CouponPermitUserSchema,
@@ -25,7 +25,7 @@ logger = logging.getLogger(__name__)
 class BulkCouponManager:
     def __init__(
         self,
-        connection: AsyncConnection = Depends(database.connection),
+        connection: AsyncConnection = Depends(bulk_database.connection),
     ) -> None:
         self._connection = connection
 
@@ -175,7 +175,9 @@ class BulkCouponManager:
         )
         await self._connection.execute(stmt)
 
-    async def overwrite_coupon_values(self, items: list[BulkCouponValueRecord]) -> None:
+    async def overwrite_coupon_values(
+        self, items: list[BulkCouponValueRecord], replaced_before: Optional[datetime] = None
+    ) -> None:
         coupon_ids = [item.coupon_id for item in items if item.coupon_id is not None]
         if not coupon_ids:
             return
@@ -183,6 +185,8 @@ class BulkCouponManager:
         del_stmt = CouponValueOrderNumberSchema.table.delete().where(
             CouponValueOrderNumberSchema.coupon_id.in_(coupon_ids)
         )
+        if replaced_before is not None:
+            del_stmt = del_stmt.where(CouponValueOrderNumberSchema.created_at < replaced_before)
         await self._connection.execute(del_stmt)
 
         created_at = datetime.now()
@@ -1,7 +1,11 @@
 import asyncio
-from uuid import UUID
+from datetime import datetime
+from functools import partial
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Optional, TypeVar, Union
+from uuid import UUID, uuid4
 
 from fastapi import Depends
+from pydantic import ValidationError
 
 from svc.api.models.bulk import (
     BulkCouponModel,
@@ -11,31 +15,39 @@ from svc.api.models.bulk import (
     CategoriesNotFoundError,
     CouponNotFoundError,
     DuplicatedItemError,
+    TextError,
     UsersNotFoundError,
     WarehousesNotFoundError,
 )
 from svc.infrastructure.catalog.catalog_manager import CatalogManager
 from svc.infrastructure.customer.customer_profile_manager import CustomerProfileManager
+from svc.infrastructure.invalidation.bus import InvalidationBus
 from svc.infrastructure.warehouse.warehouse_manager import WarehouseManager
 from svc.services.bulk.bulk_coupon_manager import BulkCouponManager
 from svc.services.bulk.dto import BulkCouponRecord, BulkCouponValueRecord
-from svc.services.uow import UnitOfWork
+from svc.services.bulk.stream import RawItem, RecordError, chunked
+from svc.services.invalidation import InvalidationEntity, get_invalidation_bus
+from svc.services.uow import BulkUnitOfWork
+
+M = TypeVar("M", BulkCouponModel, BulkCouponValueModel)
 
 
 class BulkCouponService:
     def __init__(
         self,
-        uow: UnitOfWork = Depends(UnitOfWork),
+        uow: BulkUnitOfWork = Depends(BulkUnitOfWork),
         bulk_coupon_manager: BulkCouponManager = Depends(BulkCouponManager),
         warehouse_manager: WarehouseManager = Depends(WarehouseManager),
         customer_manager: CustomerProfileManager = Depends(CustomerProfileManager),
         catalog_manager: CatalogManager = Depends(CatalogManager),
+        invalidation_bus: InvalidationBus = Depends(get_invalidation_bus),
     ) -> None:
         self._uow = uow
         self._bulk_coupon_manager = bulk_coupon_manager
         self._warehouse_manager = warehouse_manager
         self._customer_manager = customer_manager
         self._catalog_manager = catalog_manager
+        self._invalidation_bus = invalidation_bus
 
     async def save_coupons(self, items: list[BulkCouponModel]) -> list[BulkResultModel]:
 
@@ -61,9 +73,16 @@ class BulkCouponService:
             await self._bulk_coupon_manager.overwrite_users(to_upsert)
             await self._bulk_coupon_manager.overwrite_categories(to_upsert)
 
+        await self._invalidation_bus.publish(
+            InvalidationEntity.coupon,
+            [record.coupon_id for record in to_upsert if record.coupon_id is not None],
+        )
+
         return [record.to_bulk_result() for record in records]
 
-    async def save_coupon_values(self, items: list[BulkCouponValueModel]) -> list[BulkResultModel]:
+    async def save_coupon_values(
+        self, items: list[BulkCouponValueModel], replaced_before: Optional[datetime] = None
+    ) -> list[BulkResultModel]:
         records = BulkCouponValueRecord.from_models(items)
         records_map = dict[tuple[str, int], BulkCouponValueRecord]()
 
@@ -99,10 +118,50 @@ class BulkCouponService:
                 to_create.append(record)
 
             if to_create:
-                await self._bulk_coupon_manager.overwrite_coupon_values(to_create)
+                await self._bulk_coupon_manager.overwrite_coupon_values(to_create, replaced_before)
+
+        await self._invalidation_bus.publish(
+            InvalidationEntity.coupon,
+            [record.coupon_id for record in to_create if record.coupon_id is not None],
+        )
 
         return [record.to_bulk_result() for record in records]
 
+    def stream_coupons(self, items: AsyncIterable[RawItem], chunk_size: int) -> AsyncIterator[BulkResultModel]:
+        return self._stream(items, chunk_size, BulkCouponModel, self.save_coupons)
+
+    def stream_coupon_values(self, items: AsyncIterable[RawItem], chunk_size: int) -> AsyncIterator[BulkResultModel]:
+        # Values of a coupon may be split between chunks, each chunk only replaces the values saved before the upload
+        return self._stream(
+            items,
+            chunk_size,
+            BulkCouponValueModel,
+            partial(self.save_coupon_values, replaced_before=datetime.now()),
+        )
+
+    async def _stream(
+        self,
+        items: AsyncIterable[RawItem],
+        chunk_size: int,
+        model_cls: type[M],
+        save: Callable[[list[M]], Awaitable[list[BulkResultModel]]],
+    ) -> AsyncIterator[BulkResultModel]:
+        """
+        Validates and saves items a chunk at a time, each chunk in its own transaction, and yields results
+        in the order of the items. Nothing is kept between chunks, so memory stays flat whatever the size
+        of the body. The last occurrence of an item wins: a duplicate within a chunk is rejected as in a bulk
+        request, a duplicate from a later chunk is saved over the earlier one
+        """
+        async for chunk in chunked(items, chunk_size):
+            results = [_parse_item(item, model_cls) for item in chunk]
+            models = [it for it in results if not isinstance(it, BulkResultModel)]
+            saved = await save(models) if models else []
+
+            # Saved results come in the order of the models
+            saved_results = iter(saved)
+            for result in results:
+                yield result if isinstance(result, BulkResultModel) else next(saved_results)
+
     async def _validate_users(self, items: list[BulkCouponRecord]) -> None:
         user_ids = set[UUID]()
         for item in items:
@@ -204,3 +263,23 @@ class BulkCouponService:
 
             if valid_ids:
                 item.valid_categories = valid_ids
+
+
+def _parse_item(item: RawItem, model_cls: type[M]) -> Union[M, BulkResultModel]:
+    if isinstance(item, RecordError):
+        return _error_result(uuid4(), TextError(data=str(item)))
+
+    try:
+        return model_cls.parse_obj(item.data)
+    except ValidationError as exc:
+        try:
+            bulk_item_id = UUID(str(item.data.get("bulk_item_id")))
+        except ValueError:
+            bulk_item_id = uuid4()
+        return _error_result(bulk_item_id, TextError(data=f"Line {item.line_number}: {exc}"))
+
+
+def _error_result(bulk_item_id: UUID, error: TextError) -> BulkResultModel:
+    return BulkResultModel(
+        bulk_item_id=bulk_item_id, operation=BulkOperation.create, errors=[error], warnings=None, applied_at=None
+    )
@@ -0,0 +1,155 @@
+import csv
+import json
+from dataclasses import dataclass
+from typing import AsyncIterable, AsyncIterator, Collection, TypeVar, Union
+
+T = TypeVar("T")
+
+RawItem = Union["Record", "RecordError"]
+
+# Strict boolean fields take no strings, unknown cells are left for validation to reject
+_BOOLEANS = {"true": True, "false": False}
+
+
+@dataclass
+class Record:
+    """A record of the body with the line it starts on, so errors found later still point at the input"""
+
+    line_number: int
+    data: dict
+
+
+class RecordError(ValueError):
+    """A record of the body that could not be read, yielded in place of it so the rest of the body goes on"""
+
+    def __init__(self, line_number: int, message: str) -> None:
+        super().__init__(f"Line {line_number}: {message}")
+        self.line_number = line_number
+
+
+async def iter_lines(chunks: AsyncIterable[bytes], max_line_bytes: int) -> AsyncIterator[Union[bytes, RecordError]]:
+    """Splits the body into lines as it arrives. Lines longer than `max_line_bytes` are skipped as errors"""
+    buffer = bytearray()
+    line_number = 0
+    oversized = False
+    async for chunk in chunks:
+        buffer += chunk
+        while (end := buffer.find(b"\n")) >= 0:
+            line_number += 1
+            if oversized:
+                yield RecordError(line_number, f"Line is longer than {max_line_bytes} bytes")
+            else:
+                yield bytes(buffer[:end]).rstrip(b"\r")
+            oversized = False
+            del buffer[: end + 1]
+
+        if len(buffer) > max_line_bytes:
+            # The rest of the line is dropped as it arrives, memory stays bounded
+            oversized = True
+            buffer.clear()
+
+    if buffer or oversized:
+        line_number += 1
+        yield RecordError(line_number, f"Line is longer than {max_line_bytes} bytes") if oversized else bytes(buffer)
+
+
+async def parse_ndjson(chunks: AsyncIterable[bytes], max_line_bytes: int) -> AsyncIterator[RawItem]:
+    """One JSON object per line, blank lines are skipped"""
+    line_number = 0
+    async for line in iter_lines(chunks, max_line_bytes):
+        line_number += 1
+        if isinstance(line, RecordError):
+            yield line
+            continue
+        if not line.strip():
+            continue
+
+        try:
+            item = json.loads(line)
+        except ValueError as exc:
+            yield RecordError(line_number, f"Invalid JSON: {exc}")
+            continue
+
+        if not isinstance(item, dict):
+            yield RecordError(line_number, "Expected a JSON object")
+            continue
+
+        yield Record(line_number, item)
+
+
+async def parse_csv(
+    chunks: AsyncIterable[bytes], list_fields: Collection[str], bool_fields: Collection[str], max_line_bytes: int
+) -> AsyncIterator[RawItem]:
+    """
+    The first row names the columns. Empty cells are left out of the record,
+    cells of `list_fields` hold values separated by semicolons, cells of `bool_fields` are true or false
+    """
+    header = None
+    pending = ""
+    line_number = row_line_number = 0
+    async for line in iter_lines(chunks, max_line_bytes):
+        line_number += 1
+        if isinstance(line, RecordError):
+            pending = ""
+            yield line
+            continue
+
+        try:
+            text = line.decode()
+        except UnicodeDecodeError:
+            pending = ""
+            yield RecordError(line_number, "Invalid UTF-8")
+            continue
+
+        # A quoted cell may span lines, the row is complete once its quotes are balanced
+        if not pending:
+            row_line_number = line_number
+        pending = f"{pending}\n{text}" if pending else text
+        if pending.count('"') % 2:
+            if len(pending) > max_line_bytes:
+                pending = ""
+                yield RecordError(line_number, f"Row is longer than {max_line_bytes} bytes")
+            continue
+        row, pending = pending, ""
+        if not row.strip():
+            continue
+
+        try:
+            cells = next(csv.reader([row]))
+        except csv.Error as exc:
+            yield RecordError(row_line_number, f"Invalid CSV: {exc}")
+            continue
+
+        if header is None:
+            header = [cell.strip() for cell in cells]
+            continue
+        if len(cells) > len(header):
+            yield RecordError(row_line_number, f"Expected at most {len(header)} cells, got {len(cells)}")
+            continue
+
+        item = dict[str, object]()
+        for name, cell in zip(header, cells):
+            if not cell.strip():
+                continue
+            if name in list_fields:
+                item[name] = [it.strip() for it in cell.split(";") if it.strip()]
+            elif name in bool_fields:
+                item[name] = _BOOLEANS.get(cell.strip().lower(), cell)
+            else:
+                item[name] = cell
+        yield Record(row_line_number, item)
+
+    if pending:
+        yield RecordError(line_number, "Unterminated quoted cell")
+
+
+async def chunked(items: AsyncIterable[T], size: int) -> AsyncIterator[list[T]]:
+    chunk = list[T]()
+    async for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
@@ -1,22 +1,258 @@
+import asyncio
+import functools
+import random
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar, cast
 from uuid import UUID
 
 from aiocache import Cache
 from internal_lib.entry import CacheMapEntry
 from internal_lib.registry import CacheRegistry
 
+from svc.infrastructure.bounded_cache import BoundedMemoryCache, MemoryBudget, approximate_size
+from svc.infrastructure.idempotency import IdempotencyStore
+from svc.infrastructure.kafka.dedupe import ProcessedEventStore
 from svc.infrastructure.pricing.models import ProductsPricesItemCacheKey
 from svc.infrastructure.warehouse.models import WarehouseShortModel
+from svc.services.infrastructure.metrics_registry import MetricsRegistry, get_metrics_registry
 from svc.settings import get_cache_config, get_distributed_cache_config
 
+if TYPE_CHECKING:
+    from svc.persist.dao.bonus import WarehouseBonusSettings
+    from svc.services.coupon.dto import CouponModel
+    from svc.services.gift.dto import GiftPromotionSettingsModel
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+R = TypeVar("R")
+
+_NEGATIVE = object()
+# Promotion windows are open on one side, recompute just after the boundary rather than exactly at it
+_BOUNDARY_MARGIN = timedelta(milliseconds=1)
+
+
+@dataclass
+class TimeBound(Generic[V]):
+    """Cached value with the next instant it may change at, `None` when no such instant is known"""
+
+    value: V
+    valid_till: Optional[datetime] = None
+
+
+class ReadThroughCache(Generic[K, V]):
+    """
+    In-process read-through cache entry.
+    Expired values are reloaded through a single in-flight call per key, `None` results are kept for `negative_ttl`.
+    `TimeBound` values never outlive their `valid_till`, whatever the ttl is.
+    With a `budget`, approximate sizes of the entries count against it and least recently used ones are evicted
+    while it is exceeded
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        *,
+        jitter: float = 0.0,
+        negative_ttl: Optional[float] = None,
+        max_size: Optional[int] = None,
+        budget: Optional[MemoryBudget] = None,
+        metrics: Optional[MetricsRegistry] = None,
+    ) -> None:
+        self.name = name
+        self._ttl = ttl
+        self._jitter = jitter
+        self._negative_ttl = negative_ttl
+        self._max_size = max_size
+        self._budget = budget
+        self._metrics = metrics or get_metrics_registry()
+        self._values: OrderedDict[K, Tuple[float, Any, int]] = OrderedDict()
+        self._in_flight: Dict[K, asyncio.Future] = {}
+
+    def _lookup(self, key: K) -> Tuple[bool, Optional[V]]:
+        item = self._values.get(key)
+        if item is None:
+            return False, None
+
+        expires_at, value, _ = item
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            return False, None
+
+        self._values.move_to_end(key)
+        return True, None if value is _NEGATIVE else value
+
+    def _store(self, key: K, value: Any, ttl: float) -> None:
+        if ttl <= 0:
+            return
+
+        if self._jitter:
+            # Spread expiry of entries loaded together, so they are not reloaded at the same moment
+            ttl *= 1 + random.uniform(-self._jitter, self._jitter)  # nosec B311
+
+        if isinstance(value, TimeBound) and value.valid_till is not None:
+            remaining = value.valid_till - datetime.now(timezone.utc)
+            if remaining <= timedelta(0):
+                return
+            ttl = min(ttl, (remaining + _BOUNDARY_MARGIN).total_seconds())
+
+        self._remove(key)
+        size = 0 if self._budget is None else approximate_size(key) + approximate_size(value)
+        self._values[key] = (time.monotonic() + ttl, value, size)
+        if self._budget is not None:
+            self._budget.used += size
+        while len(self._values) > 1 and (
+            (self._max_size is not None and len(self._values) > self._max_size)
+            or (self._budget is not None and self._budget.exceeded)
+        ):
+            self._remove(next(iter(self._values)))
+            self._metrics.register_cache_evictions(self.name, "size")
+
+    def _remove(self, key: K) -> None:
+        item = self._values.pop(key, None)
+        if item is not None and self._budget is not None:
+            self._budget.used -= item[2]
+
+    async def get(self, key: K) -> Optional[V]:
+        return self._lookup(key)[1]
+
+    async def set(self, key: K, value: V, ttl: Optional[float] = None) -> None:
+        self._store(key, value, self._ttl if ttl is None else ttl)
+
+    async def delete(self, key: K) -> None:
+        self._remove(key)
+
+    async def clear(self) -> None:
+        for key in list(self._values):
+            self._remove(key)
+
+    async def get_or_load(self, key: K, loader: Callable[[], Awaitable[Optional[V]]]) -> Optional[V]:
+        found, value = self._lookup(key)
+        if found:
+            self._metrics.register_cache_hits(self.name)
+            return value
+
+        self._metrics.register_cache_misses(self.name)
+        while (in_flight := self._in_flight.get(key)) is not None:
+            try:
+                return await asyncio.shield(in_flight)
+            except asyncio.CancelledError:
+                # The call loading the value was cancelled, load it for this one instead
+                if not in_flight.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        started_at = time.perf_counter()
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Mark as retrieved, the caller gets the exception directly
+            future.exception()
+            raise
+        else:
+            if value is None:
+                if self._negative_ttl is not None:
+                    self._store(key, _NEGATIVE, self._negative_ttl)
+            else:
+                self._store(key, value, self._ttl)
+
+            future.set_result(value)
+            return value
+        finally:
+            self._in_flight.pop(key, None)
+            self._metrics.observe_cache_load(self.name, time.perf_counter() - started_at)
+
+
+def read_through(
+    cache: ReadThroughCache[K, Any],
+    key: Optional[Callable[..., K]] = None,
+) -> Callable[[Callable[..., Awaitable[R]]], Callable[..., Awaitable[R]]]:
+    """
+    Caches results of an async method. Key is built from the call arguments except `self`,
+    or by `key` called with the same arguments.
+    The method result is returned as is, None only when the method returned None
+    """
+
+    def decorator(fn: Callable[..., Awaitable[R]]) -> Callable[..., Awaitable[R]]:
+        @functools.wraps(fn)
+        async def wrapper(self: Any, *args: Any, **kwargs: Any) -> R:
+            cache_key = key(*args, **kwargs) if key is not None else cast(K, (*args, *sorted(kwargs.items())))
+            return cast(R, await cache.get_or_load(cache_key, lambda: fn(self, *args, **kwargs)))
+
+        return wrapper
+
+    return decorator
+
 
 class LocalCacheRegistry(CacheRegistry):
     _settings = get_cache_config()
-    _cache = Cache(Cache.MEMORY)
+    # Every local cache counts against one budget, a single namespace may take all of it
+    _budget = MemoryBudget(_settings.max_bytes)
+    _cache = BoundedMemoryCache(
+        max_entries=_settings.max_entries,
+        max_bytes=_settings.max_bytes,
+        namespace_max_entries=_settings.namespace_max_entries,
+        budget=_budget,
+    )
 
     warehouses: CacheMapEntry[UUID, WarehouseShortModel] = CacheMapEntry[UUID, WarehouseShortModel](
         _cache, "warehouses", ttl=_settings.warehouses_ttl
     )
 
+    @classmethod
+    async def clear_warehouses(cls) -> None:
+        # Warehouses are the only entry of the bounded backend
+        await cls._cache.clear()
+
+    warehouse_bonus_settings: ReadThroughCache[Tuple[UUID], "WarehouseBonusSettings"] = ReadThroughCache[
+        Tuple[UUID], "WarehouseBonusSettings"
+    ](
+        "warehouse_bonus_settings",
+        ttl=_settings.bonus_settings_ttl,
+        jitter=_settings.ttl_jitter,
+        negative_ttl=_settings.bonus_settings_ttl,
+        max_size=_settings.bonus_settings_max_size,
+        budget=_budget,
+    )
+
+    active_coupons: ReadThroughCache[Tuple[str], TimeBound["CouponModel"]] = ReadThroughCache[
+        Tuple[str], TimeBound["CouponModel"]
+    ](
+        "active_coupons",
+        ttl=_settings.coupons_ttl,
+        jitter=_settings.ttl_jitter,
+        max_size=_settings.promotions_max_size,
+        budget=_budget,
+    )
+
+    gift_promotion_settings: ReadThroughCache[
+        Tuple[UUID], TimeBound[Optional["GiftPromotionSettingsModel"]]
+    ] = ReadThroughCache[Tuple[UUID], TimeBound[Optional["GiftPromotionSettingsModel"]]](
+        "gift_promotion_settings",
+        ttl=_settings.promotions_ttl,
+        jitter=_settings.ttl_jitter,
+        max_size=_settings.promotions_max_size,
+        budget=_budget,
+    )
+
+    happy_hours_bonus: ReadThroughCache[Tuple[UUID], TimeBound[Optional[int]]] = ReadThroughCache[
+        Tuple[UUID], TimeBound[Optional[int]]
+    ](
+        "happy_hours_bonus",
+        ttl=_settings.promotions_ttl,
+        jitter=_settings.ttl_jitter,
+        max_size=_settings.promotions_max_size,
+        budget=_budget,
+    )
+
 
 class DistributedCacheRegistry:
     _settings = get_distributed_cache_config()
@@ -29,3 +265,25 @@ class DistributedCacheRegistry:
         dumps_fn=str,
         loads_fn=int,
     )
+
+    order_coupons: CacheMapEntry[UUID, UUID] = CacheMapEntry[UUID, UUID](
+        _cache,
+        "order_coupons",
+        ttl=_settings.order_coupons_ttl,
+        dumps_fn=str,
+        loads_fn=UUID,
+    )
+
+    idempotent_responses: IdempotencyStore = IdempotencyStore(
+        _cache,
+        "idempotent_responses",
+        ttl=_settings.idempotency_ttl,
+        lock_ttl=_settings.idempotency_lock_ttl,
+    )
+
+    processed_events: ProcessedEventStore = ProcessedEventStore(
+        _cache,
+        "processed_events",
+        ttl=_settings.processed_events_ttl,
+        window_size=_settings.processed_events_window,
+    )
@@ -0,0 +1,77 @@
+import asyncio
+import functools
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from fastapi.encoders import jsonable_encoder
+
+from svc.services.infrastructure.metrics_registry import MetricsRegistry, get_metrics_registry
+
+T = TypeVar("T")
+
+
+def canonical_hash(*args: Any, **kwargs: Any) -> str:
+    """Hash of the arguments that does not depend on key order or on how models and ids are represented"""
+    payload = json.dumps(jsonable_encoder([args, kwargs]), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class RequestCoalescer:
+    """
+    Shares one computation between concurrent identical calls. Nothing is kept once the call completes,
+    later identical calls compute again
+    """
+
+    def __init__(self, name: str, metrics: Optional[MetricsRegistry] = None) -> None:
+        self.name = name
+        self._metrics = metrics or get_metrics_registry()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    async def run(self, key: str, call: Callable[[], Awaitable[T]]) -> T:
+        while (in_flight := self._in_flight.get(key)) is not None:
+            try:
+                result = await asyncio.shield(in_flight)
+            except asyncio.CancelledError:
+                # The request computing the result was cancelled, compute it for this one instead
+                if not in_flight.cancelled():
+                    raise
+            else:
+                self._metrics.register_coalesced_request(self.name)
+                return result
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Mark as retrieved, the caller gets the exception directly
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._in_flight.pop(key, None)
+
+
+def coalesce(name: str) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """
+    Coalesces concurrent calls of a service method with identical arguments, `self` is not part of the key.
+    Every caller gets the same response object, it must not be modified
+    """
+
+    def decorator(fn: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        coalescer = RequestCoalescer(name)
+
+        @functools.wraps(fn)
+        async def wrapper(self: Any, *args: Any, **kwargs: Any) -> T:
+            return await coalescer.run(canonical_hash(*args, **kwargs), lambda: fn(self, *args, **kwargs))
+
+        return wrapper
+
+    return decorator
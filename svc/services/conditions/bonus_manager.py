@@ -1,6 +1,6 @@
 from dataclasses import dataclass
-from datetime import datetime
-from typing import Dict, Iterable, List, Optional
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from uuid import UUID
 
 from fastapi import Depends
@@ -9,9 +9,12 @@ from pytz import timezone
 from svc.api.models.conditions import DeliveryMode
 from svc.api.models.coupon import DistributedDiscountItemShort
 from svc.api.models.order import OrderItem
+from svc.infrastructure.snapshot import load_dataclass
 from svc.infrastructure.warehouse.models import WarehouseShortModel
-from svc.persist.dao.bonus import BonusDAO
-from svc.persist.dao.happy_hours import HappyHoursDAO
+from svc.persist.dao.bonus import BonusDAO, WarehouseBonusSettings
+from svc.persist.dao.happy_hours import HappyHoursDAO, HappyHoursDto, ManualHappyHoursDto
+from svc.services.cache import LocalCacheRegistry, TimeBound, read_through
+from svc.services.snapshot import SnapshotSection, promotion_snapshot
 from svc.utils.discounting import calculate_order_distributed_discount
 
 
@@ -38,12 +41,60 @@ class OrderBonusManager:
         self._bonus_dao = bonus_dao
         self._happy_hours_dao = happy_hours_dao
 
-    async def get_scheduled_happy_hours_bonus(self, warehouse: WarehouseShortModel) -> Optional[int]:
-        happy_hours = await self._happy_hours_dao.get_active_scheduled_happy_hours(warehouse.id)
+    async def get_happy_hours_bonus(self, warehouse: WarehouseShortModel) -> Optional[int]:
+        return (await self._get_happy_hours_bonus_window(warehouse)).value
+
+    @read_through(LocalCacheRegistry.happy_hours_bonus, key=lambda warehouse: (warehouse.id,))
+    async def _get_happy_hours_bonus_window(self, warehouse: WarehouseShortModel) -> TimeBound[Optional[int]]:
+        """Forced or scheduled bonus active now, valid until any happy hours of the warehouse start or end"""
+        forced, scheduled = await self._get_happy_hours(warehouse)
+        warehouse_now = datetime.now(tz=timezone(warehouse.tz))
+
+        bonus = self._get_forced_bonus(forced, warehouse_now)
+        if bonus is None:
+            bonus = self._get_scheduled_bonus(scheduled, warehouse_now)
+
+        transitions = [
+            *self._get_forced_transitions(forced, warehouse.tz),
+            *self._get_scheduled_transitions(scheduled, warehouse_now, warehouse.tz),
+        ]
+        return TimeBound(value=bonus, valid_till=min((it for it in transitions if it > warehouse_now), default=None))
+
+    async def _get_happy_hours(
+        self, warehouse: WarehouseShortModel
+    ) -> Tuple[List[ManualHappyHoursDto], List[HappyHoursDto]]:
+        """Upcoming forced and active scheduled happy hours, from the snapshot when it holds the warehouse"""
+        if (record := promotion_snapshot.get(SnapshotSection.happy_hours, warehouse.id)) is not None:
+            local_now = datetime.now(tz=timezone(warehouse.tz)).replace(tzinfo=None)
+            forced = (load_dataclass(ManualHappyHoursDto, it) for it in record["forced"])
+            return (
+                [it for it in forced if it.end_time > local_now],
+                [load_dataclass(HappyHoursDto, it) for it in record["scheduled"]],
+            )
+
+        return (
+            await self._happy_hours_dao.get_upcoming_forced_happy_hours(warehouse.id, warehouse.tz),
+            await self._happy_hours_dao.get_active_scheduled_happy_hours(warehouse.id),
+        )
+
+    @read_through(LocalCacheRegistry.warehouse_bonus_settings)
+    async def _get_warehouse_bonus_settings(self, warehouse_id: UUID) -> Optional[WarehouseBonusSettings]:
+        if (record := promotion_snapshot.get(SnapshotSection.warehouse_bonus_settings, warehouse_id)) is not None:
+            return load_dataclass(WarehouseBonusSettings, record)
+
+        return await self._bonus_dao.get_warehouse_bonus_settings(warehouse_id)
+
+    @staticmethod
+    def _get_forced_bonus(happy_hours: List[ManualHappyHoursDto], warehouse_now: datetime) -> Optional[int]:
+        # Forced happy hours are stored in warehouse local time
+        local_now = warehouse_now.replace(tzinfo=None)
+        return next((it.value for it in happy_hours if it.start_time <= local_now < it.end_time), None)
+
+    @staticmethod
+    def _get_scheduled_bonus(happy_hours: List[HappyHoursDto], warehouse_now: datetime) -> Optional[int]:
         if not happy_hours:
             return None
 
-        warehouse_now = datetime.now(tz=timezone(warehouse.tz))
         weekday = warehouse_now.weekday()
         warehouse_now_time = warehouse_now.time()
         yesterday = (weekday - 1) % 7
@@ -61,6 +112,27 @@ class OrderBonusManager:
 
         return None
 
+    @staticmethod
+    def _get_forced_transitions(happy_hours: List[ManualHappyHoursDto], warehouse_tz: str) -> Iterator[datetime]:
+        tz = timezone(warehouse_tz)
+        for hh in happy_hours:
+            yield tz.localize(hh.start_time)
+            yield tz.localize(hh.end_time)
+
+    @staticmethod
+    def _get_scheduled_transitions(
+        happy_hours: List[HappyHoursDto], warehouse_now: datetime, warehouse_tz: str
+    ) -> Iterator[datetime]:
+        # Overnight happy hours started yesterday end today, a week ahead covers every weekday
+        tz = timezone(warehouse_tz)
+        today = warehouse_now.date()
+        for days in range(-1, 8):
+            day = today + timedelta(days=days)
+            for hh in (it for it in happy_hours if it.weekday == day.weekday()):
+                end_day = day if hh.start_time < hh.end_time else day + timedelta(days=1)
+                yield tz.localize(datetime.combine(day, hh.start_time))
+                yield tz.localize(datetime.combine(end_day, hh.end_time))
+
     async def calculate_order_bonus(
         self,
         warehouse: WarehouseShortModel,
@@ -69,16 +141,14 @@ class OrderBonusManager:
         order_items: Iterable[OrderItem],
         purchase_prices_mapper: Dict[UUID, int],
     ) -> Optional[OrderBonus]:
-        warehouse_bonus = await self._bonus_dao.get_warehouse_bonus_settings(warehouse.id)
+        warehouse_bonus = await self._get_warehouse_bonus_settings(warehouse.id)
         if not warehouse_bonus:
             return None
 
         if delivery_mode == DeliveryMode.surge:
             happy_hours_bonus = None
         else:
-            happy_hours_bonus = await self._happy_hours_dao.get_forced_happy_hours_bonus(warehouse.id, warehouse.tz)
-            if happy_hours_bonus is None:
-                happy_hours_bonus = await self.get_scheduled_happy_hours_bonus(warehouse)
+            happy_hours_bonus = await self.get_happy_hours_bonus(warehouse)
 
         if happy_hours_bonus is None and warehouse_bonus.happy_hours_only:
             return None
@@ -15,12 +15,14 @@ from svc.infrastructure.pricing.pricing_manager import PricingManager
 from svc.persist.dao.fee import Fee
 from svc.persist.schemas.fee import FeeType
 from svc.services.adapters.warehouse_adapter import WarehouseAdapter
+from svc.services.coalescing import coalesce
 from svc.services.conditions.bar_manager import BarManager
 from svc.services.conditions.bonus_manager import OrderBonusManager
 from svc.services.conditions.conditions_collector import Composer
 from svc.services.conditions.conditions_manager import ConditionsManager
 from svc.services.conditions.fee_manager import FeeManager
 from svc.services.gift.gift_manager import GiftManager
+from svc.services.uow import ConditionsUnitOfWork, UnitOfWork
 
 logger = getLogger(__name__)
 
@@ -35,6 +37,8 @@ class OrderConditionsService:
         warehouse_adapter: WarehouseAdapter = Depends(WarehouseAdapter),
         pricing_manager: PricingManager = Depends(PricingManager),
         gift_manager: GiftManager = Depends(GiftManager),
+        uow: UnitOfWork = Depends(UnitOfWork),
+        conditions_uow: ConditionsUnitOfWork = Depends(ConditionsUnitOfWork),
     ):
         self._fee_manager = fee_manager
         self._bonus_manager = bonus_manager
@@ -43,8 +47,16 @@ class OrderConditionsService:
         self._warehouse_adapter = warehouse_adapter
         self._pricing_manager = pricing_manager
         self._gift_manager = gift_manager
+        self._uow = uow
+        self._conditions_uow = conditions_uow
 
+    @coalesce("order_conditions")
     async def get_order_conditions(self, request: GetOrderConditionsRequest) -> OrderConditionsResponse:
+        # Conditions only read, from replicas of both databases when configured
+        async with self._uow.read_only(), self._conditions_uow.read_only():
+            return await self._get_order_conditions(request)
+
+    async def _get_order_conditions(self, request: GetOrderConditionsRequest) -> OrderConditionsResponse:
         logger.debug(f"Received conditions request: {request}")
 
         bonus_applicable_order_items = [it for it in request.order_items if it.product_type != ProductType.tobacco]
@@ -0,0 +1,69 @@
+from datetime import datetime, timezone
+from enum import Enum
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from svc.infrastructure.kafka.kafka_instrumentation import kafka_trace_formatter
+from svc.persist.database import database
+from svc.persist.schemas.outbox import CouponEventOutboxSchema
+from svc.settings import Settings, get_service_settings
+
+
+class CouponEventType(str, Enum):
+    applied = "coupon-applied"
+    reverted = "coupon-reverted"
+    paid = "coupon-paid"
+
+
+class CouponEventOutbox:
+    """
+    Writes coupon usage events to the outbox table on the connection of the change,
+    so they are committed or rolled back with it. OutboxRelay publishes them afterwards
+    """
+
+    def __init__(
+        self,
+        connection: AsyncConnection = Depends(database.connection),
+        config: Settings = Depends(get_service_settings),
+    ):
+        self._connection = connection
+        self._config = config.coupon_events
+
+    async def add(
+        self, event_type: CouponEventType, coupon_id: UUID, order_id: UUID, user_id: Optional[UUID] = None
+    ) -> None:
+        await self.add_many(event_type, [(coupon_id, order_id)], user_id)
+
+    async def add_many(
+        self, event_type: CouponEventType, coupons: List[Tuple[UUID, UUID]], user_id: Optional[UUID] = None
+    ) -> None:
+        """Adds an event per pair of coupon id and order id"""
+        if not self._config.enabled or not coupons:
+            return
+
+        # The trace of the change continues in the consumers of the relayed events
+        trace_headers: List[Tuple[str, bytes]] = []
+        kafka_trace_formatter.inject(trace_headers)
+        headers = {key: value.decode() for key, value in trace_headers}
+
+        occurred_at = datetime.now(timezone.utc)
+        rows = [
+            {
+                "topic": self._config.topic,
+                "key": str(order_id),
+                "payload": {
+                    "event": event_type.value,
+                    "coupon_id": str(coupon_id),
+                    "order_id": str(order_id),
+                    "user_id": str(user_id) if user_id else None,
+                    "occurred_at": occurred_at.isoformat(),
+                },
+                "headers": headers,
+                "created_at": occurred_at,
+            }
+            for coupon_id, order_id in coupons
+        ]
+        await self._connection.execute(CouponEventOutboxSchema.table.insert(), rows)
@@ -1,17 +1,24 @@
 import logging
 import random
 import string
+from collections import Counter, defaultdict
+from dataclasses import replace
 from datetime import datetime, timezone
 from decimal import ROUND_HALF_UP, Decimal
-from typing import List, Optional, Set
+from typing import Dict, List, Optional, Set, Tuple
 from uuid import UUID, uuid4
 
 from fastapi import Depends
+from sqlalchemy import any_, bindparam
 from sqlalchemy import func as sqla_func
 from sqlalchemy import or_, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
 from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.sql.selectable import Subquery
 
 from svc.api.models.coupon import CouponKind, CouponOrderItem
+from svc.infrastructure.snapshot import load_dataclass
 from svc.persist.database import database
 from svc.persist.schemas.coupon import (
     CouponPermitCategorySchema,
@@ -22,13 +29,17 @@ from svc.persist.schemas.coupon import (
     CouponValueOrderNumberSchema,
     UserCouponSchema,
 )
+from svc.services.cache import LocalCacheRegistry, TimeBound, read_through
 from svc.services.coupon.coupon_mapper import CouponMapper
 from svc.services.coupon.dto import CouponModel, UserCouponModel
+from svc.services.snapshot import SnapshotSection, promotion_snapshot
 from svc.settings import Settings, get_service_settings
 from svc.utils.money import cents_to_dollars
 
 logger = logging.getLogger(__name__)
 
+_UUID_ARRAY = ARRAY(PG_UUID(as_uuid=True))
+
 
 class CouponManager:
     _coupon_columns = [
@@ -107,19 +118,22 @@ class CouponManager:
 
     async def overwrite_coupon_value(self, coupon: CouponModel, delivered_orders_count: int) -> None:
         current_number = delivered_orders_count + 1
-        select_statement = (
-            select(CouponValueOrderNumberSchema.coupon_value)
-            .select_from(CouponValueOrderNumberSchema.table)
-            .where(CouponValueOrderNumberSchema.coupon_id == coupon.id)
-            .where(CouponValueOrderNumberSchema.orders_number == current_number)
-        )
-        entity = (await self._connection.execute(select_statement)).first()
-        if entity is not None:
-            old_coupon_value = coupon.value
-            coupon.value = CouponMapper.calculate_value(
-                value=entity[CouponValueOrderNumberSchema.coupon_value],
-                kind=coupon.kind,
+        if (tiers := promotion_snapshot.get(SnapshotSection.coupon_tiers, coupon.id)) is not None:
+            tier = tiers.get(str(current_number))
+            coupon_value = Decimal(tier) if tier is not None else None
+        else:
+            select_statement = (
+                select(CouponValueOrderNumberSchema.coupon_value)
+                .select_from(CouponValueOrderNumberSchema.table)
+                .where(CouponValueOrderNumberSchema.coupon_id == coupon.id)
+                .where(CouponValueOrderNumberSchema.orders_number == current_number)
             )
+            entity = (await self._connection.execute(select_statement)).first()
+            coupon_value = entity[CouponValueOrderNumberSchema.coupon_value] if entity is not None else None
+
+        if coupon_value is not None:
+            old_coupon_value = coupon.value
+            coupon.value = CouponMapper.calculate_value(value=coupon_value, kind=coupon.kind)
             logger.info(
                 f"[coupon_id={coupon.id}, old_coupon_value={old_coupon_value}, new_coupon_value={coupon.value}]"
                 f"Coupon_value got overwritten."
@@ -225,6 +239,74 @@ class CouponManager:
         )
         await self._connection.execute(update_statement)
 
+    @staticmethod
+    def _current_orders_coupons(order_ids: List[UUID]) -> Subquery:
+        # Latest user coupon per order, as in get_current_order_coupon
+        return (
+            select(UserCouponSchema.order_id, UserCouponSchema.coupon_id)
+            .where(UserCouponSchema.order_id == any_(bindparam("order_ids", order_ids, type_=_UUID_ARRAY)))
+            .distinct(UserCouponSchema.order_id)
+            .order_by(UserCouponSchema.order_id, UserCouponSchema.updated_at.desc())
+            .subquery()
+        )
+
+    async def user_coupons_set_orders_paid(self, order_ids: List[UUID]) -> List[Tuple[UUID, UUID]]:
+        """Sets the current coupon of every order paid and returns coupon and order ids of the ones that changed"""
+        current_coupons = self._current_orders_coupons(order_ids)
+        update_values = {
+            UserCouponSchema.order_paid: True,
+            UserCouponSchema.updated_at: datetime.now(timezone.utc),
+        }
+        update_statement = (
+            UserCouponSchema.table.update()
+            .where(UserCouponSchema.order_id == current_coupons.c.order_id)
+            .where(UserCouponSchema.coupon_id == current_coupons.c.coupon_id)
+            .where(UserCouponSchema.order_paid.is_(False))
+            .values(update_values)
+            .returning(UserCouponSchema.coupon_id, UserCouponSchema.order_id)
+        )
+        return [(it.coupon_id, it.order_id) for it in await self._connection.execute(update_statement)]
+
+    async def get_unpaid_orders_coupons(self, order_ids: List[UUID]) -> List[Tuple[UUID, UUID]]:
+        """Returns ids and order ids of the current order coupons not set paid yet"""
+        current_coupons = self._current_orders_coupons(order_ids)
+        select_statement = (
+            select(UserCouponSchema.id, UserCouponSchema.order_id)
+            .where(UserCouponSchema.order_id == current_coupons.c.order_id)
+            .where(UserCouponSchema.coupon_id == current_coupons.c.coupon_id)
+            .where(UserCouponSchema.order_paid.is_(False))
+        )
+        return [(it.id, it.order_id) for it in await self._connection.execute(select_statement)]
+
+    async def revert_orders_coupons(self, order_ids: List[UUID]) -> List[Tuple[UUID, UUID]]:
+        """Deletes the current coupon of every order and returns it to the coupon quantity"""
+        current_coupons = self._current_orders_coupons(order_ids)
+        delete_statement = (
+            UserCouponSchema.table.delete()
+            .where(UserCouponSchema.order_id == current_coupons.c.order_id)
+            .where(UserCouponSchema.coupon_id == current_coupons.c.coupon_id)
+            .returning(UserCouponSchema.coupon_id, UserCouponSchema.order_id)
+        )
+        reverted = [(it.coupon_id, it.order_id) for it in await self._connection.execute(delete_statement)]
+
+        coupon_ids_by_count: Dict[int, List[UUID]] = defaultdict(list)
+        for coupon_id, count in Counter(coupon_id for coupon_id, _ in reverted).items():
+            coupon_ids_by_count[count].append(coupon_id)
+
+        for count, coupon_ids in coupon_ids_by_count.items():
+            update_values = {
+                CouponSchema.quantity: CouponSchema.quantity + count,
+                CouponSchema.updated_at: datetime.now(timezone.utc),
+            }
+            update_statement = (
+                CouponSchema.table.update()
+                .where(CouponSchema.id == any_(bindparam("coupon_ids", coupon_ids, type_=_UUID_ARRAY)))
+                .values(update_values)
+            )
+            await self._connection.execute(update_statement)
+
+        return reverted
+
     async def delete_user_coupon(self, coupon_id: UUID, order_id: UUID) -> None:
         query = (
             UserCouponSchema.table.delete()
@@ -277,19 +359,36 @@ class CouponManager:
         return CouponMapper.map_to_model(entity)
 
     async def get_active_coupon_by_name(self, name: str) -> Optional[CouponModel]:
+        coupon = await self._get_active_coupon_by_name(name)
+        if coupon is None:
+            return None
+
+        # Callers adjust the value in place, keep the cached model intact
+        return replace(coupon.value)
+
+    @read_through(LocalCacheRegistry.active_coupons)
+    async def _get_active_coupon_by_name(self, name: str) -> Optional[TimeBound[CouponModel]]:
+        dt = datetime.now(timezone.utc)
+        if (record := promotion_snapshot.get(SnapshotSection.coupons, name.lower())) is not None:
+            coupon = load_dataclass(CouponModel, record)
+            if coupon.name.lower() == name.lower() and (coupon.valid_till is None or coupon.valid_till > dt):
+                return TimeBound(value=coupon, valid_till=coupon.valid_till)
+
         from_statement = CouponSchema.table
         select_statement = (
             select(self._coupon_columns)
             .select_from(from_statement)
             .where(CouponSchema.name == name)
             .where(CouponSchema.active.is_(True))
-            .where(or_(CouponSchema.valid_till.is_(None), CouponSchema.valid_till > datetime.utcnow()))
+            .where(or_(CouponSchema.valid_till.is_(None), CouponSchema.valid_till > dt))
         )
         entity = (await self._connection.execute(select_statement)).first()
         if entity is None:
             return None
 
-        return CouponMapper.map_to_model(entity)
+        coupon = CouponMapper.map_to_model(entity)
+        # Quantity changes with every redemption, such coupons are valid for this call only
+        return TimeBound(value=coupon, valid_till=dt if coupon.quantity is not None else coupon.valid_till)
 
     async def get_user_coupon_usage_count(self, user_id: UUID, coupon_id: UUID) -> int:
         columns = [
@@ -308,6 +407,9 @@ class CouponManager:
         return entity["usage_count"]  # type: ignore
 
     async def is_permitted_user(self, user_id: UUID, coupon_id: UUID) -> bool:
+        if (users := promotion_snapshot.get_ids(SnapshotSection.coupon_users, coupon_id)) is not None:
+            return not users or user_id in users
+
         select_statement = (
             select(CouponPermitUserSchema.id)
             .select_from(CouponPermitUserSchema.table)
@@ -325,6 +427,9 @@ class CouponManager:
         return False
 
     async def is_permitted_warehouse(self, warehouse_id: UUID, coupon_id: UUID) -> bool:
+        if (warehouses := promotion_snapshot.get_ids(SnapshotSection.coupon_warehouses, coupon_id)) is not None:
+            return not warehouses or warehouse_id in warehouses
+
         select_statement = (
             select(CouponPermitWarehouseSchema.warehouse_id)
             .select_from(CouponPermitWarehouseSchema.table)
@@ -354,6 +459,9 @@ class CouponManager:
         return items_for_discount
 
     async def get_permitted_categories_ids(self, coupon_id: UUID) -> Set[UUID]:
+        if (categories := promotion_snapshot.get_ids(SnapshotSection.coupon_categories, coupon_id)) is not None:
+            return set(categories)
+
         select_statement = (
             select(CouponPermitCategorySchema.category_id)
             .select_from(CouponPermitCategorySchema.table)
@@ -1,5 +1,6 @@
+import functools
 import logging
-from typing import Optional
+from typing import List, Optional, Tuple
 from uuid import UUID
 
 from fastapi import Depends
@@ -29,11 +30,13 @@ from svc.api.models.coupon import (
 from svc.api.models.order import ProductType
 from svc.infrastructure.pricing.pricing_manager import PricingManager
 from svc.services.antifraud.antifraud_manager import AntifraudManager
+from svc.services.coupon.coupon_events import CouponEventOutbox, CouponEventType
 from svc.services.coupon.coupon_manager import CouponManager
-from svc.services.coupon.dto import CouponType
+from svc.services.coupon.dto import CouponModel, CouponType
+from svc.services.coupon.order_coupon_index import OrderCouponIndex
 from svc.services.gift.gift_manager import GiftManager
 from svc.services.infrastructure.metrics_registry import MetricsRegistry, get_metrics_registry
-from svc.services.uow import UnitOfWork
+from svc.services.uow import UnitOfWork, read_only, transactional
 from svc.settings import Settings, get_service_settings
 from svc.utils.discounting import calculate_order_distributed_discount
 from svc.utils.money import cents_to_dollars
@@ -51,6 +54,8 @@ class CouponService:
         config: Settings = Depends(get_service_settings),
         uow: UnitOfWork = Depends(UnitOfWork),
         metrics_registry: MetricsRegistry = Depends(get_metrics_registry),
+        order_coupon_index: OrderCouponIndex = Depends(OrderCouponIndex),
+        coupon_events: CouponEventOutbox = Depends(CouponEventOutbox),
     ) -> None:
         self._coupon_manager = coupon_manager
         self._gift_manager = gift_manager
@@ -59,7 +64,10 @@ class CouponService:
         self._config = config
         self._uow = uow
         self._metrics_registry = metrics_registry
+        self._order_coupon_index = order_coupon_index
+        self._coupon_events = coupon_events
 
+    @read_only
     async def get_coupon(self, coupon_id: UUID) -> Optional[CouponDetail]:
         coupon = await self._coupon_manager.get_coupon(coupon_id)
         if coupon is None:
@@ -100,6 +108,7 @@ class CouponService:
                     self._metrics_registry.register_antifraud_coupon_ban(user_id, unique_identifier)
                     raise UserNotEligibleToUseCoupon()
 
+    @transactional
     async def add_coupon(self, order_id: UUID, coupon_request: AddOrderCouponRequest) -> OrderCouponDetail:
         user_id = coupon_request.user_id
         warehouse_id = coupon_request.warehouse_id
@@ -109,7 +118,9 @@ class CouponService:
         unique_identifier = coupon_request.unique_identifier
         cart_message_args = None
 
-        await self.antifraud_check(user_id=user_id, unique_identifier=unique_identifier)
+        # Fingerprint counts tolerate replication lag, they are read before the request writes
+        async with self._uow.replica_reads():
+            await self.antifraud_check(user_id=user_id, unique_identifier=unique_identifier)
         # Get coupon by name
         coupon = await self._coupon_manager.get_active_coupon_by_name(coupon_name)
         if coupon is None:
@@ -156,7 +167,7 @@ class CouponService:
         if min_amount is not None and coupon_request.order_subtotal < min_amount:
             raise CouponMinAmountError({"min_amount": cents_to_dollars(min_amount)})
 
-        old_coupon = await self._coupon_manager.get_current_order_coupon(order_id)
+        old_coupon = await self.get_current_order_coupon(order_id)
         if old_coupon is not None:
             logger.info(
                 f"[order_id={order_id}, old_coupon.id={old_coupon.id}] Deleting old order coupon...",
@@ -226,6 +237,7 @@ class CouponService:
             distributed_discount_items=distributed_discount.items,
         )
 
+    @transactional
     async def delete_coupon(self, coupon_id: UUID, order_id: UUID) -> OrderCouponDetail:
         coupon = await self._coupon_manager.get_coupon(coupon_id)
         if coupon is None:
@@ -246,6 +258,7 @@ class CouponService:
             distributed_discount_items=[],
         )
 
+    @transactional
     async def create_referral_coupon(self, coupon_request: CreateReferralCouponRequest) -> str:
         user_id = coupon_request.user_id
         active_user_coupon = await self._coupon_manager.get_active_referral_coupon(user_id)
@@ -265,6 +278,7 @@ class CouponService:
 
         return coupon_name
 
+    @read_only
     async def recalculate_coupon_discount(
         self,
         order_id: UUID,
@@ -379,8 +393,11 @@ class CouponService:
         self, coupon_id: UUID, user_id: UUID, order_id: UUID, order_paid: bool, unique_identifier: Optional[str]
     ) -> None:
         async with self._uow.begin():
+            # Indexed before the commit, the index never misses a stored coupon
+            await self._order_coupon_index.add(order_id, coupon_id)
             await self._coupon_manager.create_user_coupon(coupon_id, user_id, order_id, order_paid)
             await self._coupon_manager.decrement_coupon_quantity(coupon_id)
+            await self._coupon_events.add(CouponEventType.applied, coupon_id, order_id, user_id)
             if unique_identifier:
                 await self._antifraud_manager.register_fingerprint_usage(user_id, unique_identifier)
 
@@ -388,9 +405,18 @@ class CouponService:
         async with self._uow.begin():
             await self._coupon_manager.increment_coupon_quantity(coupon_id)
             await self._coupon_manager.delete_user_coupon(coupon_id, order_id)
+            await self._coupon_events.add(CouponEventType.reverted, coupon_id, order_id)
+        await self._uow.on_commit(functools.partial(self._order_coupon_index.remove, order_id, coupon_id))
 
+    async def get_current_order_coupon(self, order_id: UUID) -> Optional[CouponModel]:
+        if not await self._order_coupon_index.may_have_coupon(order_id):
+            return None
+
+        return await self._coupon_manager.get_current_order_coupon(order_id)
+
+    @transactional
     async def process_paid(self, order_id: UUID) -> None:
-        coupon = await self._coupon_manager.get_current_order_coupon(order_id)
+        coupon = await self.get_current_order_coupon(order_id)
         if coupon is None:
             logger.info(f"[order_id={order_id}] User coupon not found. Nothing to update")
 
@@ -399,9 +425,45 @@ class CouponService:
         # Set coupon applied
         async with self._uow.begin():
             await self._coupon_manager.user_coupon_set_order_paid(coupon.id, order_id)
+            await self._coupon_events.add(CouponEventType.paid, coupon.id, order_id)
+
+    @transactional
+    async def process_paid_batch(self, order_ids: List[UUID]) -> int:
+        order_ids = await self._order_coupon_index.filter_may_have_coupon(order_ids)
+        if not order_ids:
+            return 0
+
+        async with self._uow.begin():
+            paid = await self._coupon_manager.user_coupons_set_orders_paid(order_ids)
+            await self._coupon_events.add_many(CouponEventType.paid, paid)
+        logger.info(f"Set {len(paid)} order coupons paid for {len(order_ids)} orders")
+        return len(paid)
+
+    @read_only
+    async def get_unpaid_order_coupons(self, order_ids: List[UUID]) -> List[Tuple[UUID, UUID]]:
+        """User coupons `process_paid_batch` would change, as pairs of user coupon id and order id"""
+        order_ids = await self._order_coupon_index.filter_may_have_coupon(order_ids)
+        if not order_ids:
+            return []
+
+        return await self._coupon_manager.get_unpaid_orders_coupons(order_ids)
+
+    @transactional
+    async def process_cancelled_batch(self, order_ids: List[UUID]) -> None:
+        order_ids = await self._order_coupon_index.filter_may_have_coupon(order_ids)
+        if not order_ids:
+            return None
+
+        async with self._uow.begin():
+            reverted = await self._coupon_manager.revert_orders_coupons(order_ids)
+            await self._coupon_events.add_many(CouponEventType.reverted, reverted)
+        for coupon_id, order_id in reverted:
+            await self._uow.on_commit(functools.partial(self._order_coupon_index.remove, order_id, coupon_id))
+        logger.info(f"Reverted {len(reverted)} order coupons for {len(order_ids)} orders")
 
+    @transactional
     async def process_cancelled(self, order_id: UUID) -> None:
-        coupon = await self._coupon_manager.get_current_order_coupon(order_id)
+        coupon = await self.get_current_order_coupon(order_id)
         if coupon is None:
             logger.info(f"[order_id={order_id}] User coupon not found. Nothing to delete")
 
@@ -0,0 +1,64 @@
+import logging
+from typing import List
+from uuid import UUID
+
+from fastapi import Depends
+
+from svc.services.cache import DistributedCacheRegistry
+from svc.settings import Settings, get_service_settings
+
+logger = logging.getLogger(__name__)
+
+
+class OrderCouponIndex:
+    """
+    Order ids with an applied coupon, written next to the users_coupons rows.
+    Once authoritative, orders missing from the index are known to have no coupon and skip the database
+    """
+
+    def __init__(
+        self,
+        cache_registry: DistributedCacheRegistry = Depends(DistributedCacheRegistry),
+        config: Settings = Depends(get_service_settings),
+    ) -> None:
+        self._cache_registry = cache_registry
+        self._config = config.order_coupon_index
+
+    async def may_have_coupon(self, order_id: UUID) -> bool:
+        if not self._config.authoritative:
+            return True
+
+        try:
+            return await self._cache_registry.order_coupons.get(order_id) is not None
+        except Exception:
+            logger.exception(f"[order_id={order_id}] Unable to read order coupon index")
+            return True
+
+    async def filter_may_have_coupon(self, order_ids: List[UUID]) -> List[UUID]:
+        if not self._config.authoritative or not order_ids:
+            return order_ids
+
+        try:
+            coupon_ids = await self._cache_registry.order_coupons.multi_get(order_ids)
+        except Exception:
+            logger.exception(f"Unable to read order coupon index for {len(order_ids)} orders")
+            return order_ids
+        return [order_id for order_id, coupon_id in zip(order_ids, coupon_ids) if coupon_id is not None]
+
+    async def add(self, order_id: UUID, coupon_id: UUID) -> None:
+        try:
+            await self._cache_registry.order_coupons.set(order_id, coupon_id)
+        except Exception:
+            # A missing entry would hide the coupon from paid/canceled processing
+            if self._config.authoritative:
+                raise
+            logger.exception(f"[order_id={order_id}, coupon_id={coupon_id}] Unable to update order coupon index")
+
+    async def remove(self, order_id: UUID, coupon_id: UUID) -> None:
+        try:
+            # Reverting a coupon that is not applied to the order keeps the current entry
+            if await self._cache_registry.order_coupons.get(order_id) == coupon_id:
+                await self._cache_registry.order_coupons.delete(order_id)
+        except Exception:
+            # A stale entry only costs a database lookup
+            logger.exception(f"[order_id={order_id}, coupon_id={coupon_id}] Unable to update order coupon index")
@@ -1,15 +1,18 @@
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional
 from uuid import UUID
 
 from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncConnection
 
+from svc.infrastructure.snapshot import load_dataclass
 from svc.persist.database import database
 from svc.persist.schemas.gift import CartBannerSchema, GiftProductSchema, GiftPromotionSettingsSchema
+from svc.services.cache import LocalCacheRegistry, TimeBound, read_through
 from svc.services.gift.dto import CartBannerModel, GiftProductModel, GiftPromotionSettingsModel
 from svc.services.gift.gift_mapper import CartBannerMapper, GiftProductMapper, GiftPromotionSettingsMapper
+from svc.services.snapshot import SnapshotSection, promotion_snapshot
 from svc.settings import Settings, get_service_settings
 
 logger = logging.getLogger(__name__)
@@ -25,18 +28,32 @@ class GiftManager:
         self._config = config
 
     async def get_active_gift_promotion_settings(self, warehouse_id: UUID) -> Optional[GiftPromotionSettingsModel]:
-        dt = datetime.utcnow()
-        query = GiftPromotionSettingsSchema.table.select().where(
-            GiftPromotionSettingsSchema.warehouse_id == warehouse_id,
-            GiftPromotionSettingsSchema.active.is_(True),
-            GiftPromotionSettingsSchema.date_from < dt,
-            GiftPromotionSettingsSchema.date_till > dt,
-        )
-        entity = (await self._connection.execute(query)).first()
-        if entity is None:
-            return None
+        return (await self._get_gift_promotion_settings_window(warehouse_id)).value
+
+    @read_through(LocalCacheRegistry.gift_promotion_settings)
+    async def _get_gift_promotion_settings_window(
+        self, warehouse_id: UUID
+    ) -> TimeBound[Optional[GiftPromotionSettingsModel]]:
+        """Settings active now, valid until the current one ends or an upcoming one starts"""
+        dt = datetime.now(timezone.utc)
+        if (records := promotion_snapshot.get(SnapshotSection.gift_promotion_settings, warehouse_id)) is not None:
+            snapshot_settings = (load_dataclass(GiftPromotionSettingsModel, it) for it in records)
+            settings = [it for it in snapshot_settings if it.date_till > dt]
+        else:
+            query = (
+                GiftPromotionSettingsSchema.table.select()
+                .where(
+                    GiftPromotionSettingsSchema.warehouse_id == warehouse_id,
+                    GiftPromotionSettingsSchema.active.is_(True),
+                    GiftPromotionSettingsSchema.date_till > dt,
+                )
+                .order_by(GiftPromotionSettingsSchema.date_from)
+            )
+            settings = [GiftPromotionSettingsMapper.map_to_model(it) for it in await self._connection.execute(query)]
+        active = next((it for it in settings if it.date_from < dt), None)
+        boundaries = [it.date_from if it.date_from >= dt else it.date_till for it in settings]
 
-        return GiftPromotionSettingsMapper.map_to_model(entity)
+        return TimeBound(value=active, valid_till=min(boundaries, default=None))
 
     async def get_gift_product(self, settings_id: int) -> Optional[GiftProductModel]:
         query = GiftProductSchema.table.select().where(GiftProductSchema.gift_promotion_settings_id == settings_id)
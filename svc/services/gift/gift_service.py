@@ -14,7 +14,9 @@ from svc.api.models.gifts import (
     GiftDetails,
     GiftItem,
 )
+from svc.services.coalescing import coalesce
 from svc.services.gift.gift_manager import GiftManager
+from svc.services.uow import UnitOfWork, read_only
 from svc.utils.money import cents_to_dollars
 
 logger = logging.getLogger(__name__)
@@ -24,9 +26,13 @@ class GiftService:
     def __init__(
         self,
         gift_manager: GiftManager = Depends(GiftManager),
+        uow: UnitOfWork = Depends(UnitOfWork),
     ) -> None:
         self._gift_manager = gift_manager
+        self._uow = uow
 
+    @coalesce("gift")
+    @read_only
     async def get_current_gift(
         self,
         request: GetGiftRequest,
@@ -63,6 +69,8 @@ class GiftService:
             gift_settings_id=gift_settings.id,
         )
 
+    @coalesce("banner")
+    @read_only
     async def get_banner(
         self,
         request: GetBannerRequest,
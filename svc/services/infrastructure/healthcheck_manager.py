@@ -3,11 +3,21 @@ from sqlalchemy.ext.asyncio import AsyncConnection
 from sqlalchemy.sql import text
 
 from svc.persist.database import database
+from svc.services.adapters.warehouse_adapter import get_warehouse_directory
+from svc.services.adapters.warehouse_directory import WarehouseDirectory
 
 
 class HealthcheckManager:
-    def __init__(self, connection: AsyncConnection = Depends(database.connection)):
+    def __init__(
+        self,
+        connection: AsyncConnection = Depends(database.connection),
+        warehouse_directory: WarehouseDirectory = Depends(get_warehouse_directory),
+    ):
         self._connection = connection
+        self._warehouse_directory = warehouse_directory
 
     async def check_db(self) -> None:
         (await self._connection.execute(text("SELECT 1"))).first()
+
+    def is_ready(self) -> bool:
+        return self._warehouse_directory.ready
@@ -2,7 +2,7 @@ from functools import lru_cache
 from typing import Optional
 from uuid import UUID
 
-from prometheus_client import Counter
+from prometheus_client import Counter, Gauge, Histogram
 
 
 class MetricsRegistry:
@@ -22,6 +22,92 @@ class MetricsRegistry:
         namespace="promotion",
     )
 
+    _cache_hits = Counter("cache_hits", "Count cache hits", ["entry"], namespace="promotion")
+    _cache_misses = Counter("cache_misses", "Count cache misses", ["entry"], namespace="promotion")
+    _cache_load_seconds = Histogram(
+        "cache_load_seconds",
+        "Latency of loading missed cache values",
+        ["entry"],
+        namespace="promotion",
+    )
+    _cache_evictions = Counter(
+        "cache_evictions", "Count cache evictions", ["namespace", "reason"], namespace="promotion"
+    )
+    _cache_entries = Gauge("cache_entries", "Number of cached entries", ["namespace"], namespace="promotion")
+    _cache_bytes = Gauge("cache_bytes", "Approximate size of cached entries", ["namespace"], namespace="promotion")
+    _coalesced_requests = Counter(
+        "coalesced_requests", "Count requests served by an identical in-flight call", ["name"], namespace="promotion"
+    )
+    _db_pool_checked_out = Gauge(
+        "db_pool_checked_out", "Number of connections checked out of the pool", ["pool"], namespace="promotion"
+    )
+    _db_pool_overflow = Gauge(
+        "db_pool_overflow", "Number of connections opened over the pool size", ["pool"], namespace="promotion"
+    )
+    _db_pool_checkout_seconds = Histogram(
+        "db_pool_checkout_seconds",
+        "Latency of checking a connection out of the pool, including waiting, connecting and pre-ping",
+        ["pool"],
+        namespace="promotion",
+    )
+    _db_pool_connection_age_seconds = Histogram(
+        "db_pool_connection_age_seconds",
+        "Age of connections on checkout",
+        ["pool"],
+        namespace="promotion",
+        buckets=(1, 10, 60, 5 * 60, 15 * 60, 60 * 60, 4 * 60 * 60, 24 * 60 * 60, float("inf")),
+    )
+    _db_commits_per_request = Histogram(
+        "db_commits_per_request",
+        "Number of commits of a request-scoped connection",
+        ["pool"],
+        namespace="promotion",
+        buckets=(0, 1, 2, 3, 4, 6, 8, float("inf")),
+    )
+    _db_pool_rejections = Counter(
+        "db_pool_rejections", "Count checkouts rejected by the pool queue limit", ["pool"], namespace="promotion"
+    )
+    _db_pool_invalidations = Counter(
+        "db_pool_invalidations",
+        "Count connections invalidated by failed pre-pings, validation or disconnects",
+        ["pool"],
+        namespace="promotion",
+    )
+
+    _kafka_commit_seconds = Histogram(
+        "kafka_commit_seconds", "Latency of committing consumer offsets", ["group"], namespace="promotion"
+    )
+    _kafka_commit_failures = Counter(
+        "kafka_commit_failures", "Count failed consumer offset commits", ["group"], namespace="promotion"
+    )
+    _kafka_uncommitted_messages = Gauge(
+        "kafka_uncommitted_messages",
+        "Number of fetched messages whose offsets are not committed yet",
+        ["group"],
+        namespace="promotion",
+    )
+    _kafka_failed_messages = Counter(
+        "kafka_failed_messages",
+        "Count failed messages by the retry or dead letter topic they were republished to",
+        ["topic", "target"],
+        namespace="promotion",
+    )
+    _kafka_duplicate_messages = Counter(
+        "kafka_duplicate_messages",
+        "Count skipped messages that were processed before",
+        ["topic"],
+        namespace="promotion",
+    )
+    _outbox_published_events = Counter(
+        "outbox_published_events", "Count events relayed from the outbox", ["topic"], namespace="promotion"
+    )
+    _outbox_relay_seconds = Histogram(
+        "outbox_relay_seconds", "Latency of relaying an outbox batch", ["topic"], namespace="promotion"
+    )
+    _outbox_relay_failures = Counter(
+        "outbox_relay_failures", "Count failed outbox relay batches", ["topic"], namespace="promotion"
+    )
+
     def register_antifraud_coupon_ban(self, user_id: UUID, fingerprint: Optional[str]) -> None:
         self._antifraud_coupon_bans.labels(user_id=str(user_id), fingerprint=fingerprint).inc()
 
@@ -33,6 +119,68 @@ class MetricsRegistry:
     ) -> None:
         self._whitelisted_fingerprint_antifraud_coupon_usage.labels(user_id=str(user_id), fingerprint=fingerprint).inc()
 
+    def register_cache_hits(self, entry: str, count: int = 1) -> None:
+        if count:
+            self._cache_hits.labels(entry=entry).inc(count)
+
+    def register_cache_misses(self, entry: str, count: int = 1) -> None:
+        if count:
+            self._cache_misses.labels(entry=entry).inc(count)
+
+    def observe_cache_load(self, entry: str, seconds: float) -> None:
+        self._cache_load_seconds.labels(entry=entry).observe(seconds)
+
+    def register_cache_evictions(self, namespace: str, reason: str, count: int = 1) -> None:
+        self._cache_evictions.labels(namespace=namespace, reason=reason).inc(count)
+
+    def set_cache_size(self, namespace: str, entries: int, size: int) -> None:
+        self._cache_entries.labels(namespace=namespace).set(entries)
+        self._cache_bytes.labels(namespace=namespace).set(size)
+
+    def register_coalesced_request(self, name: str) -> None:
+        self._coalesced_requests.labels(name=name).inc()
+
+    def set_db_pool_usage(self, pool: str, checked_out: int, overflow: int) -> None:
+        self._db_pool_checked_out.labels(pool=pool).set(checked_out)
+        self._db_pool_overflow.labels(pool=pool).set(max(overflow, 0))
+
+    def observe_db_pool_checkout(self, pool: str, seconds: float) -> None:
+        self._db_pool_checkout_seconds.labels(pool=pool).observe(seconds)
+
+    def observe_db_pool_connection_age(self, pool: str, seconds: float) -> None:
+        self._db_pool_connection_age_seconds.labels(pool=pool).observe(seconds)
+
+    def observe_db_commits(self, pool: str, commits: int) -> None:
+        self._db_commits_per_request.labels(pool=pool).observe(commits)
+
+    def register_db_pool_rejection(self, pool: str) -> None:
+        self._db_pool_rejections.labels(pool=pool).inc()
+
+    def register_db_pool_invalidation(self, pool: str) -> None:
+        self._db_pool_invalidations.labels(pool=pool).inc()
+
+    def observe_kafka_commit(self, group: str, seconds: float) -> None:
+        self._kafka_commit_seconds.labels(group=group).observe(seconds)
+
+    def register_kafka_commit_failure(self, group: str) -> None:
+        self._kafka_commit_failures.labels(group=group).inc()
+
+    def set_kafka_uncommitted_messages(self, group: str, count: int) -> None:
+        self._kafka_uncommitted_messages.labels(group=group).set(count)
+
+    def register_kafka_failed_message(self, topic: str, target: str) -> None:
+        self._kafka_failed_messages.labels(topic=topic, target=target).inc()
+
+    def register_kafka_duplicate_message(self, topic: str) -> None:
+        self._kafka_duplicate_messages.labels(topic=topic).inc()
+
+    def observe_outbox_relay(self, topic: str, events: int, seconds: float) -> None:
+        self._outbox_published_events.labels(topic=topic).inc(events)
+        self._outbox_relay_seconds.labels(topic=topic).observe(seconds)
+
+    def register_outbox_relay_failure(self, topic: str) -> None:
+        self._outbox_relay_failures.labels(topic=topic).inc()
+
 
 @lru_cache
 def get_metrics_registry() -> MetricsRegistry:
@@ -0,0 +1,106 @@
+from enum import Enum
+from typing import Any
+from uuid import UUID
+
+from svc.infrastructure.invalidation.bus import InvalidationBus, InvalidationEvent, InvalidationTransport
+from svc.infrastructure.invalidation.kafka import KafkaInvalidationTransport
+from svc.infrastructure.invalidation.postgres import PostgresInvalidationTransport
+from svc.infrastructure.invalidation.redis import RedisInvalidationTransport
+from svc.persist.database import Database, database
+from svc.services.adapters.warehouse_directory import warehouse_directory
+from svc.services.cache import LocalCacheRegistry, ReadThroughCache
+from svc.services.snapshot import SnapshotSection, promotion_snapshot
+from svc.settings import InvalidationTransportEnum, Settings, get_service_settings
+
+
+class InvalidationEntity(str, Enum):
+    coupon = "coupon"
+    warehouse = "warehouse"
+    warehouse_bonus_settings = "warehouse_bonus_settings"
+    gift_promotion_settings = "gift_promotion_settings"
+    happy_hours = "happy_hours"
+
+
+def create_invalidation_bus(settings: Settings, database: Database) -> InvalidationBus:
+    config = settings.invalidation
+    transport: InvalidationTransport | None
+    if config.transport == InvalidationTransportEnum.postgres:
+        transport = PostgresInvalidationTransport(database, config.channel)
+    elif config.transport == InvalidationTransportEnum.redis:
+        transport = RedisInvalidationTransport(config.redis_url, config.channel)
+    elif config.transport == InvalidationTransportEnum.kafka:
+        transport = KafkaInvalidationTransport(settings.kafka.bootstrap, config.channel)
+    else:
+        transport = None
+
+    return InvalidationBus(transport, max_keys=config.max_keys)
+
+
+async def invalidate_warehouse(event: InvalidationEvent) -> None:
+    if event.keys is None:
+        warehouse_directory.request_refresh()
+        await LocalCacheRegistry.clear_warehouses()
+        return
+
+    for key in event.keys:
+        warehouse_directory.evict(UUID(key))
+        await LocalCacheRegistry.warehouses.delete(UUID(key))
+
+
+async def _invalidate_by_warehouse(
+    cache: ReadThroughCache[Any, Any], section: SnapshotSection, event: InvalidationEvent
+) -> None:
+    keys = None if event.keys is None else [UUID(it) for it in event.keys]
+    promotion_snapshot.invalidate(section, keys, event.version)
+    if keys is None:
+        await cache.clear()
+        return
+
+    for key in keys:
+        await cache.delete((key,))
+
+
+async def invalidate_coupons(event: InvalidationEvent) -> None:
+    # Active coupons are cached by name while events carry ids
+    promotion_snapshot.invalidate(SnapshotSection.coupons, None, event.version)
+    keys = None if event.keys is None else [UUID(it) for it in event.keys]
+    for section in (
+        SnapshotSection.coupon_users,
+        SnapshotSection.coupon_warehouses,
+        SnapshotSection.coupon_categories,
+        SnapshotSection.coupon_tiers,
+    ):
+        promotion_snapshot.invalidate(section, keys, event.version)
+    await LocalCacheRegistry.active_coupons.clear()
+
+
+async def invalidate_warehouse_bonus_settings(event: InvalidationEvent) -> None:
+    await _invalidate_by_warehouse(
+        LocalCacheRegistry.warehouse_bonus_settings, SnapshotSection.warehouse_bonus_settings, event
+    )
+
+
+async def invalidate_gift_promotion_settings(event: InvalidationEvent) -> None:
+    await _invalidate_by_warehouse(
+        LocalCacheRegistry.gift_promotion_settings, SnapshotSection.gift_promotion_settings, event
+    )
+
+
+async def invalidate_happy_hours(event: InvalidationEvent) -> None:
+    await _invalidate_by_warehouse(LocalCacheRegistry.happy_hours_bonus, SnapshotSection.happy_hours, event)
+
+
+def register_local_cache_handlers(bus: InvalidationBus) -> None:
+    bus.subscribe(InvalidationEntity.warehouse, invalidate_warehouse)
+    bus.subscribe(InvalidationEntity.coupon, invalidate_coupons)
+    bus.subscribe(InvalidationEntity.warehouse_bonus_settings, invalidate_warehouse_bonus_settings)
+    bus.subscribe(InvalidationEntity.gift_promotion_settings, invalidate_gift_promotion_settings)
+    bus.subscribe(InvalidationEntity.happy_hours, invalidate_happy_hours)
+
+
+invalidation_bus = create_invalidation_bus(get_service_settings(), database)
+register_local_cache_handlers(invalidation_bus)
+
+
+def get_invalidation_bus() -> InvalidationBus:
+    return invalidation_bus
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Callable, Optional
+
+from aiokafka import AIOKafkaProducer
+from sqlalchemy import any_, bindparam, func, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.types import BigInteger
+
+from svc.persist.database import Database, database
+from svc.persist.schemas.outbox import CouponEventOutboxSchema
+from svc.services.infrastructure.metrics_registry import MetricsRegistry, get_metrics_registry
+from svc.settings import CouponEventsConfig, get_service_settings
+
+logger = logging.getLogger(__name__)
+
+_BIGINT_ARRAY = ARRAY(BigInteger)
+
+
+class OutboxRelay:
+    """
+    Publishes coupon events from the outbox table in batches and deletes them once Kafka acknowledged them,
+    so the table only holds events not published yet. A database advisory lock lets one relay at a time
+    take a batch, events are published in id order. Ids follow the commit order only per key: events of an order
+    are written while its user coupon row is locked, events of different orders may commit out of id order and be
+    published out of the order they were written. No transaction is open while events are sent.
+    Delivery is at least once, a batch published right before a failed delete is published again
+    """
+
+    def __init__(
+        self,
+        settings: CouponEventsConfig,
+        bootstrap: str,
+        database: Database,
+        producer_factory: Callable[..., AIOKafkaProducer] = AIOKafkaProducer,
+        metrics: Optional[MetricsRegistry] = None,
+    ):
+        self._settings = settings
+        self._bootstrap = bootstrap
+        self._database = database
+        self._producer_factory = producer_factory
+        self._metrics = metrics or get_metrics_registry()
+        self._producer: Optional[AIOKafkaProducer] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if not self._settings.enabled or not self._settings.relay_enabled or self._task is not None:
+            return
+
+        self._producer = self._producer_factory(
+            bootstrap_servers=self._bootstrap, linger_ms=self._settings.relay_linger_ms, enable_idempotence=True
+        )
+        await self._producer.start()
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"Relaying coupon events to topic {self._settings.topic}")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            # The batch being relayed is abandoned before the producer it sends with is stopped
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._producer is not None:
+            await self._producer.stop()
+        self._producer = self._task = None
+
+    async def relay(self) -> int:
+        """Publishes the next batch of events and returns how many were published"""
+        if self._producer is None:
+            raise RuntimeError("uninitialized outbox relay!")
+
+        started_at = time.perf_counter()
+        async with self._database.engine.connect() as connection:
+            # The lock is held by the session until the delete, other relays skip batches meanwhile
+            lock_statement = select(func.pg_try_advisory_lock(self._settings.relay_lock_id))
+            if not (await connection.execute(lock_statement)).scalar():
+                await connection.commit()
+                return 0
+
+            try:
+                select_statement = (
+                    select(CouponEventOutboxSchema.table)
+                    .order_by(CouponEventOutboxSchema.id)
+                    .limit(self._settings.relay_batch_size)
+                )
+                events = (await connection.execute(select_statement)).all()
+                # Sends don't keep a transaction open
+                await connection.commit()
+                if not events:
+                    return 0
+
+                # Sends are queued at once and leave in producer batches
+                deliveries = [
+                    await self._producer.send(
+                        event.topic,
+                        value=json.dumps(event.payload).encode(),
+                        key=event.key.encode(),
+                        headers=[(key, value.encode()) for key, value in event.headers.items()],
+                    )
+                    for event in events
+                ]
+                await asyncio.gather(*deliveries)
+
+                # Events committed after the select with a lower id stay for the next batch
+                ids = [event.id for event in events]
+                delete_statement = CouponEventOutboxSchema.table.delete().where(
+                    CouponEventOutboxSchema.id == any_(bindparam("ids", ids, type_=_BIGINT_ARRAY))
+                )
+                async with connection.begin():
+                    await connection.execute(delete_statement)
+            finally:
+                await self._unlock(connection)
+
+        self._metrics.observe_outbox_relay(self._settings.topic, len(events), time.perf_counter() - started_at)
+        return len(events)
+
+    async def _unlock(self, connection: AsyncConnection) -> None:
+        try:
+            await connection.rollback()
+            await connection.execute(select(func.pg_advisory_unlock(self._settings.relay_lock_id)))
+            await connection.commit()
+        except BaseException:
+            # A pooled session must not keep the lock, it is released with the discarded connection
+            await connection.invalidate()
+            raise
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                relayed = await self.relay()
+            except Exception:
+                logger.exception("Unable to relay coupon events")
+                self._metrics.register_outbox_relay_failure(self._settings.topic)
+                relayed = 0
+
+            # A full batch means more events are waiting
+            if relayed < self._settings.relay_batch_size:
+                await asyncio.sleep(self._settings.relay_interval)
+
+
+outbox_relay = OutboxRelay(
+    get_service_settings().coupon_events,
+    get_service_settings().kafka.bootstrap,
+    database,
+)
@@ -0,0 +1,25 @@
+from enum import Enum
+
+from svc.infrastructure.snapshot import SnapshotStore
+from svc.settings import get_service_settings
+
+
+class SnapshotSection(str, Enum):
+    # Active coupons without quantity by lowercase name, the name column is case-insensitive
+    coupons = "coupons"
+    # Permitted ids of active coupons by coupon id as sorted id lists, an empty list permits any
+    coupon_users = "coupon_users"
+    coupon_warehouses = "coupon_warehouses"
+    coupon_categories = "coupon_categories"
+    # Values of active coupons by orders number
+    coupon_tiers = "coupon_tiers"
+    warehouse_bonus_settings = "warehouse_bonus_settings"
+    happy_hours = "happy_hours"
+    gift_promotion_settings = "gift_promotion_settings"
+
+
+promotion_snapshot = SnapshotStore(get_service_settings().snapshot.path)
+
+
+def get_promotion_snapshot() -> SnapshotStore:
+    return promotion_snapshot
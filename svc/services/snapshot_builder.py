@@ -0,0 +1,308 @@
+import asyncio
+import fcntl
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.sql import Select
+
+from svc.infrastructure.snapshot import SnapshotStore, SnapshotWriter, dump_dataclass
+from svc.persist.dao.bonus import WarehouseBonusSettings
+from svc.persist.dao.happy_hours import HappyHoursDto, ManualHappyHoursDto
+from svc.persist.database import Database, conditions_database, database
+from svc.persist.schemas.bonus import WarehouseBonusSettingsSchema
+from svc.persist.schemas.coupon import (
+    CouponPermitCategorySchema,
+    CouponPermitUserSchema,
+    CouponPermitWarehouseSchema,
+    CouponSchema,
+    CouponValueOrderNumberSchema,
+)
+from svc.persist.schemas.gift import GiftPromotionSettingsSchema
+from svc.persist.schemas.happy_hours import (
+    WarehouseForcedHappyHoursSchema,
+    WarehouseHappyHoursScheduleSchema,
+    WarehouseHappyHoursSettingsSchema,
+)
+from svc.services.coupon.coupon_mapper import CouponMapper
+from svc.services.gift.gift_mapper import GiftPromotionSettingsMapper
+from svc.services.snapshot import SnapshotSection, promotion_snapshot
+from svc.settings import SnapshotSettings, get_service_settings
+
+logger = logging.getLogger(__name__)
+
+
+class PromotionSnapshotBuilder:
+    """Reads the active promotion state of every warehouse into a snapshot"""
+
+    def __init__(self, connection: AsyncConnection, conditions_connection: AsyncConnection):
+        self._connection = connection
+        self._conditions_connection = conditions_connection
+
+    async def build(self, version: int) -> SnapshotWriter:
+        writer = SnapshotWriter(version)
+        await self._add_coupons(writer)
+        await self._add_gift_promotion_settings(writer)
+        await self._add_warehouse_bonus_settings(writer)
+        await self._add_happy_hours(writer)
+
+        return writer
+
+    async def _add_coupons(self, writer: SnapshotWriter) -> None:
+        active = and_(
+            CouponSchema.active.is_(True),
+            or_(CouponSchema.valid_till.is_(None), CouponSchema.valid_till > datetime.now(timezone.utc)),
+        )
+        async for row in await self._connection.stream(CouponSchema.table.select().where(active)):
+            coupon = CouponMapper.map_to_model(row)
+            # Quantity changes with every redemption, such coupons are always read from the database
+            if coupon.quantity is None:
+                writer.add(SnapshotSection.coupons, coupon.name.lower(), dump_dataclass(coupon))
+
+        permit_sections = [
+            (SnapshotSection.coupon_users, CouponPermitUserSchema.user_id, CouponPermitUserSchema.coupon_id),
+            (
+                SnapshotSection.coupon_warehouses,
+                CouponPermitWarehouseSchema.warehouse_id,
+                CouponPermitWarehouseSchema.coupon_id,
+            ),
+            (
+                SnapshotSection.coupon_categories,
+                CouponPermitCategorySchema.category_id,
+                CouponPermitCategorySchema.coupon_id,
+            ),
+        ]
+        for section, column, coupon_id in permit_sections:
+            # Coupons without permits get an empty list
+            query = (
+                select([CouponSchema.id, column])
+                .select_from(CouponSchema.table.outerjoin(column.table, coupon_id == CouponSchema.id))
+                .where(active)
+                .order_by(CouponSchema.id)
+            )
+            async for coupon_key, rows in self._stream_by_coupon(query):
+                writer.add_ids(section, coupon_key, [row[column] for row in rows if row[column] is not None])
+
+        tiers_query = (
+            select(
+                [
+                    CouponSchema.id,
+                    CouponValueOrderNumberSchema.orders_number,
+                    CouponValueOrderNumberSchema.coupon_value,
+                ]
+            )
+            .select_from(
+                CouponSchema.table.outerjoin(
+                    CouponValueOrderNumberSchema.table, CouponValueOrderNumberSchema.coupon_id == CouponSchema.id
+                )
+            )
+            .where(active)
+            .order_by(CouponSchema.id)
+        )
+        async for coupon_key, rows in self._stream_by_coupon(tiers_query):
+            tiers = {
+                row[CouponValueOrderNumberSchema.orders_number]: row[CouponValueOrderNumberSchema.coupon_value]
+                for row in rows
+                if row[CouponValueOrderNumberSchema.orders_number] is not None
+            }
+            writer.add(SnapshotSection.coupon_tiers, coupon_key, tiers)
+
+    async def _stream_by_coupon(self, query: Select) -> AsyncIterator[Tuple[UUID, List[Row]]]:
+        """
+        Rows of a query ordered by coupon id, read through a server-side cursor and grouped by coupon,
+        only the rows of one coupon are held at a time
+        """
+        coupon_id: Optional[UUID] = None
+        rows: List[Row] = []
+        async for row in await self._connection.stream(query):
+            if row[CouponSchema.id] != coupon_id:
+                if coupon_id is not None:
+                    yield coupon_id, rows
+                coupon_id, rows = row[CouponSchema.id], []
+            rows.append(row)
+
+        if coupon_id is not None:
+            yield coupon_id, rows
+
+    async def _add_gift_promotion_settings(self, writer: SnapshotWriter) -> None:
+        query = (
+            GiftPromotionSettingsSchema.table.select()
+            .where(
+                GiftPromotionSettingsSchema.active.is_(True),
+                GiftPromotionSettingsSchema.warehouse_id.isnot(None),
+                GiftPromotionSettingsSchema.date_till > datetime.now(timezone.utc),
+            )
+            .order_by(GiftPromotionSettingsSchema.date_from)
+        )
+        settings: Dict[Any, List[Dict[str, Any]]] = defaultdict(list)
+        for row in await self._connection.execute(query):
+            model = GiftPromotionSettingsMapper.map_to_model(row)
+            settings[model.warehouse_id].append(dump_dataclass(model))
+
+        for warehouse_id, items in settings.items():
+            writer.add(SnapshotSection.gift_promotion_settings, warehouse_id, items)
+
+    async def _add_warehouse_bonus_settings(self, writer: SnapshotWriter) -> None:
+        query = WarehouseBonusSettingsSchema.table.select().where(WarehouseBonusSettingsSchema.active.is_(True))
+        for row in await self._conditions_connection.execute(query):
+            settings = WarehouseBonusSettings(
+                required_subtotal=row[WarehouseBonusSettingsSchema.required_subtotal],
+                bonus_fixed=row[WarehouseBonusSettingsSchema.bonus_fixed],
+                bonus_percent=row[WarehouseBonusSettingsSchema.bonus_percent],
+                happy_hours_only=row[WarehouseBonusSettingsSchema.happy_hours_only],
+            )
+            warehouse_id = row[WarehouseBonusSettingsSchema.warehouse_id]
+            writer.add(SnapshotSection.warehouse_bonus_settings, warehouse_id, dump_dataclass(settings))
+
+    async def _add_happy_hours(self, writer: SnapshotWriter) -> None:
+        happy_hours: Dict[Any, Dict[str, List[Dict[str, Any]]]] = defaultdict(lambda: {"forced": [], "scheduled": []})
+
+        scheduled_query = (
+            select(
+                [
+                    WarehouseHappyHoursSettingsSchema.bonus_amount,
+                    WarehouseHappyHoursScheduleSchema.warehouse_id,
+                    WarehouseHappyHoursScheduleSchema.weekday,
+                    WarehouseHappyHoursScheduleSchema.start_time,
+                    WarehouseHappyHoursScheduleSchema.end_time,
+                    WarehouseHappyHoursScheduleSchema.active,
+                ]
+            )
+            .select_from(
+                WarehouseHappyHoursSettingsSchema.table.join(
+                    WarehouseHappyHoursScheduleSchema.table,
+                    WarehouseHappyHoursSettingsSchema.warehouse_id == WarehouseHappyHoursScheduleSchema.warehouse_id,
+                )
+            )
+            .where(WarehouseHappyHoursScheduleSchema.active.is_(True))
+        )
+        for row in await self._conditions_connection.execute(scheduled_query):
+            dto = HappyHoursDto(
+                warehouse_id=row[WarehouseHappyHoursScheduleSchema.warehouse_id],
+                weekday=row[WarehouseHappyHoursScheduleSchema.weekday],
+                start_time=row[WarehouseHappyHoursScheduleSchema.start_time],
+                end_time=row[WarehouseHappyHoursScheduleSchema.end_time],
+                value=row[WarehouseHappyHoursSettingsSchema.bonus_amount],
+                active=row[WarehouseHappyHoursScheduleSchema.active],
+            )
+            happy_hours[dto.warehouse_id]["scheduled"].append(dump_dataclass(dto))
+
+        # Forced happy hours are in warehouse local time, a day back covers every timezone
+        forced_query = (
+            select(
+                [
+                    WarehouseHappyHoursSettingsSchema.bonus_amount,
+                    WarehouseForcedHappyHoursSchema.warehouse_id,
+                    WarehouseForcedHappyHoursSchema.start_time,
+                    WarehouseForcedHappyHoursSchema.end_time,
+                ]
+            )
+            .select_from(
+                WarehouseHappyHoursSettingsSchema.table.join(
+                    WarehouseForcedHappyHoursSchema.table,
+                    WarehouseHappyHoursSettingsSchema.warehouse_id == WarehouseForcedHappyHoursSchema.warehouse_id,
+                )
+            )
+            .where(WarehouseForcedHappyHoursSchema.end_time > datetime.utcnow() - timedelta(days=1))
+            .order_by(WarehouseForcedHappyHoursSchema.start_time)
+        )
+        for row in await self._conditions_connection.execute(forced_query):
+            forced = ManualHappyHoursDto(
+                warehouse_id=row[WarehouseForcedHappyHoursSchema.warehouse_id],
+                start_time=row[WarehouseForcedHappyHoursSchema.start_time],
+                end_time=row[WarehouseForcedHappyHoursSchema.end_time],
+                value=row[WarehouseHappyHoursSettingsSchema.bonus_amount],
+            )
+            happy_hours[forced.warehouse_id]["forced"].append(dump_dataclass(forced))
+
+        for warehouse_id, item in happy_hours.items():
+            writer.add(SnapshotSection.happy_hours, warehouse_id, item)
+
+
+class SnapshotPublisher:
+    """
+    Keeps the process snapshot current. One process per host holds the file lock and rebuilds the snapshot,
+    every process maps the newest published file
+    """
+
+    def __init__(
+        self,
+        settings: SnapshotSettings,
+        store: SnapshotStore,
+        database: Database,
+        conditions_database: Database,
+    ):
+        self._settings = settings
+        self._store = store
+        self._database = database
+        self._conditions_database = conditions_database
+        self._lock_fd: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _acquire_leadership(self) -> bool:
+        # The lock is released by the OS when the process dies, another worker takes over then
+        if self._lock_fd is not None:
+            return True
+
+        fd = os.open(f"{self._settings.path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+
+        self._lock_fd = fd
+        return True
+
+    async def publish(self) -> None:
+        started_at = time.perf_counter()
+        async with self._database.engine.connect() as connection:
+            async with self._conditions_database.engine.connect() as conditions_connection:
+                writer = await PromotionSnapshotBuilder(connection, conditions_connection).build(time.time_ns())
+        await asyncio.to_thread(writer.write, self._settings.path)
+        logger.info(f"Promotion snapshot version {writer.version} published in {time.perf_counter() - started_at:.2f}s")
+
+    async def start(self) -> None:
+        if not self._settings.enabled or self._task is not None:
+            return
+
+        # A snapshot left by other workers or a previous run makes the cold start instant
+        self._store.reload()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        self._task = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    async def _loop(self) -> None:
+        refresh_interval_ns = self._settings.refresh_interval * 1_000_000_000
+        while True:
+            try:
+                if self._acquire_leadership() and time.time_ns() - (self._store.version or 0) >= refresh_interval_ns:
+                    await self.publish()
+                self._store.reload()
+            except Exception:
+                logger.exception("Unable to refresh promotion snapshot")
+
+            await asyncio.sleep(self._settings.check_interval)
+
+
+snapshot_publisher = SnapshotPublisher(
+    get_service_settings().snapshot,
+    promotion_snapshot,
+    database,
+    conditions_database,
+)
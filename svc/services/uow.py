@@ -1,30 +1,156 @@
+import functools
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from typing import Any, AsyncGenerator, Awaitable, Callable, List, TypeVar
 
 from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncConnection
 
-from svc.persist.database import conditions_database, database
+from svc.persist.database import bulk_database, conditions_database, database
+from svc.persist.lazy_connection import LazyConnection
+from svc.settings import Settings, get_service_settings
+
+T = TypeVar("T")
 
 
 class BaseUnitOfWork:
-    def __init__(self, connection: AsyncConnection):
+    def __init__(self, connection: AsyncConnection, config: Settings):
         self._connection = connection
+        self._config = config.uow
+        self._in_transaction = False
+        self._read_only = False
+        self._transactional = 0
+        self._on_commit: List[Callable[[], Awaitable[None]]] = []
 
     @asynccontextmanager
     async def begin(self) -> AsyncGenerator:
+        if self._read_only:
+            raise RuntimeError("Unit of work is read-only")
+
+        if self._in_transaction:
+            async with self._connection.begin_nested():
+                yield
+            return
+
         if self._connection.in_transaction():
             await self._connection.commit()
 
         async with self._connection.begin():
             yield
 
+    @asynccontextmanager
+    async def transaction(self) -> AsyncGenerator:
+        """
+        In request-scoped mode reads and writes within the block share one transaction,
+        `begin()` blocks become savepoints. Otherwise every `begin()` commits on its own.
+        Reads within the block always go to the primary, they may guard the writes
+        """
+        self._transactional += 1
+        try:
+            async with self._transaction():
+                yield
+        finally:
+            self._transactional -= 1
+
+    @asynccontextmanager
+    async def _transaction(self) -> AsyncGenerator:
+        if not self._config.request_scoped or self._in_transaction:
+            yield
+            return
+
+        if self._connection.in_transaction():
+            await self._connection.commit()
+
+        self._in_transaction = True
+        try:
+            async with self._connection.begin():
+                yield
+        finally:
+            self._in_transaction = False
+            callbacks, self._on_commit = self._on_commit, []
+
+        for callback in callbacks:
+            await callback()
+
+    @asynccontextmanager
+    async def read_only(self) -> AsyncGenerator:
+        """
+        Nothing is committed within the block, `begin()` fails. Reads are rolled back with the connection.
+        Outside of `transaction()` reads may go to a replica
+        """
+        self._read_only = True
+        try:
+            if self._transactional:
+                yield
+            else:
+                async with self.replica_reads():
+                    yield
+        finally:
+            self._read_only = False
+
+    @asynccontextmanager
+    async def replica_reads(self) -> AsyncGenerator:
+        """
+        Reads within the block may go to a replica, for reads that tolerate replication lag.
+        They stay on the primary once the request opened a transaction or wrote
+        """
+        if isinstance(self._connection, LazyConnection):
+            async with self._connection.replica_reads():
+                yield
+        else:
+            yield
+
+    async def on_commit(self, callback: Callable[[], Awaitable[None]]) -> None:
+        """Runs the callback once the writes so far are committed, at the end of a request-scoped transaction"""
+        if self._in_transaction:
+            self._on_commit.append(callback)
+        else:
+            await callback()
+
+
+def transactional(fn: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+    """Runs a service method in `transaction()` of the service unit of work"""
+
+    @functools.wraps(fn)
+    async def wrapper(self: Any, *args: Any, **kwargs: Any) -> T:
+        async with self._uow.transaction():
+            return await fn(self, *args, **kwargs)
+
+    return wrapper
+
+
+def read_only(fn: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+    """Runs a service method in `read_only()` of the service unit of work"""
+
+    @functools.wraps(fn)
+    async def wrapper(self: Any, *args: Any, **kwargs: Any) -> T:
+        async with self._uow.read_only():
+            return await fn(self, *args, **kwargs)
+
+    return wrapper
+
 
 class UnitOfWork(BaseUnitOfWork):
-    def __init__(self, connection: AsyncConnection = Depends(database.connection)):
-        super().__init__(connection)
+    def __init__(
+        self,
+        connection: AsyncConnection = Depends(database.connection),
+        config: Settings = Depends(get_service_settings),
+    ):
+        super().__init__(connection, config)
 
 
 class ConditionsUnitOfWork(BaseUnitOfWork):
-    def __init__(self, connection: AsyncConnection = Depends(conditions_database.connection)):
-        super().__init__(connection)
+    def __init__(
+        self,
+        connection: AsyncConnection = Depends(conditions_database.connection),
+        config: Settings = Depends(get_service_settings),
+    ):
+        super().__init__(connection, config)
+
+
+class BulkUnitOfWork(BaseUnitOfWork):
+    def __init__(
+        self,
+        connection: AsyncConnection = Depends(bulk_database.connection),
+        config: Settings = Depends(get_service_settings),
+    ):
+        super().__init__(connection, config)
@@ -1,6 +1,6 @@
 from enum import Enum
 from functools import lru_cache
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseSettings, Field
 
@@ -18,12 +18,41 @@ class DbSettings(BaseSettings):
     base_name: str = "main"
     port: int = 5432
     pool_size: int = 5
+    max_overflow: int = 10
+    # Seconds to wait for a free connection before the checkout fails
+    pool_timeout: float = 30
+    # Checkouts beyond this many pending ones fail at once instead of queueing, zero disables the limit
+    pool_queue_limit: int = 0
+    # Seconds after which a connection is replaced on checkout, -1 keeps connections
+    pool_recycle: int = -1
+    connect_timeout: float = 10
+    # Seconds between pings of idle pooled connections. Zero pings every connection on checkout instead,
+    # which costs a round-trip per checkout
+    pool_validation_interval: float = 0
     echo: bool = False
+    # Read replicas as "host" or "host:port", with the credentials and database name of the primary
+    replica_hosts: List[str] = []
+    # Seconds of replication lag after which reads go to the primary
+    replica_max_lag: float = 1.0
+    replica_lag_check_interval: float = 1.0
 
     @property
     def url(self) -> str:
         return f"postgresql+asyncpg://{self.username}:{self.password}@{self.host}:{self.port}/{self.base_name}"
 
+    def for_workload(self, pool: "DbPoolSettings") -> "DbSettings":
+        """Settings of a pool reserved for one workload, its reads stay on the primary"""
+        return self.copy(update={**pool.dict(), "replica_hosts": []})
+
+    @property
+    def replica_urls(self) -> List[str]:
+        urls = []
+        for replica in self.replica_hosts:
+            host, _, port = replica.partition(":")
+            port = port or str(self.port)
+            urls.append(f"postgresql+asyncpg://{self.username}:{self.password}@{host}:{port}/{self.base_name}")
+        return urls
+
     @property
     def sync_url(self) -> str:
         return f"postgresql://{self.username}:{self.password}@{self.host}:{self.port}/{self.base_name}"
@@ -37,15 +66,94 @@ class ConditionsDbSettings(DbSettings):
         env_prefix = "conditions_db_"
 
 
+class DbPoolSettings(BaseSettings):
+    pool_size: int = 2
+    max_overflow: int = 0
+    pool_timeout: float = 30
+    pool_queue_limit: int = 0
+
+
+class BulkDbPoolSettings(DbPoolSettings):
+    # Bulk imports hold a connection for one long transaction, extra uploads fail fast instead of piling up
+    pool_timeout: float = 60
+    pool_queue_limit: int = 2
+
+    class Config:
+        env_prefix = "db_bulk_"
+
+
+class ConsumerDbPoolSettings(DbPoolSettings):
+    class Config:
+        env_prefix = "db_consumer_"
+
+
+class UnitOfWorkSettings(BaseSettings):
+    # Reads and writes of a service call share one transaction, nested writes become savepoints.
+    # The connection is then held for the whole call, including requests to other services
+    request_scoped: bool = False
+
+    class Config:
+        env_prefix = "uow_"
+
+
 class KafkaSettings(BaseSettings):
     bootstrap: str = "localhost:9092"
     group_id: str = "promotion"
     max_request_size: int = 1048576
+    # Disable to run the consumer only in dedicated processes (python -m svc.consumer).
+    # Purchase prices it caches reach API workers only through a shared distributed cache url
+    consumer_enabled: bool = True
+    consumer_metrics_port: int = 8001
+    # Messages are handled on this many lanes, in order per order or warehouse
+    consumer_concurrency: int = 8
+    # Messages queued per lane before fetching blocks
+    consumer_max_pending: int = 16
+    # Order paid and canceled events are fetched and applied in batches of up to this size, 0 handles them one by one
+    consumer_batch_size: int = 0
+    # How long a started batch waits to fill up
+    consumer_batch_linger_ms: int = 100
+    # Offsets of handled messages are committed once this many are uncommitted or at the interval
+    consumer_commit_batch_size: int = 100
+    consumer_commit_interval_ms: int = 1000
+    # Failed messages are retried after each of these delays in seconds and then sent to the dead letter topic.
+    # Retry topics are named <group_id>.retry.<delay>s, the dead letter topic <group_id>.dlq.
+    # Enable once the topics are provisioned, they are not created by the service
+    consumer_retry_enabled: bool = False
+    consumer_retry_delays: List[float] = [1, 30, 300]
+    # json, orjson or msgspec, auto picks the fastest installed one
+    consumer_codec: str = "auto"
 
     class Config:
         env_prefix = "kafka_"
 
 
+class InvalidationTransportEnum(Enum):
+    local = "local"
+    postgres = "postgres"
+    redis = "redis"
+    kafka = "kafka"
+
+
+class InvalidationSettings(BaseSettings):
+    transport: InvalidationTransportEnum = InvalidationTransportEnum.local
+    channel: str = "promotion_cache_invalidation"
+    redis_url: str = "redis://localhost:6379"
+    max_keys: int = 100
+
+    class Config:
+        env_prefix = "invalidation_"
+
+
+class SnapshotSettings(BaseSettings):
+    enabled: bool = False
+    path: str = "/tmp/promotion.snapshot"  # nosec B108
+    refresh_interval: int = 60
+    check_interval: float = 1.0
+
+    class Config:
+        env_prefix = "snapshot_"
+
+
 class TracingSettings(BaseSettings):
     jaeger_enabled: bool = False
     jaeger_agent_host_name: Optional[str] = None
@@ -84,8 +192,31 @@ class UserAntifraudConfig(BaseSettings):
         env_prefix = "user_antifraud_"
 
 
+class PriceEventsConfig(BaseSettings):
+    warm_up_enabled: bool = False
+
+    class Config:
+        env_prefix = "price_events_"
+
+
 class CacheRegistryConfig(BaseSettings):
     warehouses_ttl: int = 60 * 60
+    warehouses_refresh_interval: int = 5 * 60
+    warehouses_page_size: int = 500
+    warehouses_preload_timeout: int = 30
+    bonus_settings_ttl: int = 60
+    bonus_settings_max_size: int = 10_000
+    ttl_jitter: float = 0.1
+    coupons_ttl: int = 60
+    # Gift settings and happy hours are written by the admin, not by this service, and nothing publishes
+    # their invalidations: an edit is seen by every worker within this many seconds.
+    # Raise it only together with an invalidation transport that the admin writes publish to
+    promotions_ttl: int = 5
+    promotions_max_size: int = 10_000
+    max_entries: int = 10_000
+    # Approximate bytes held by all local caches of the process together
+    max_bytes: int = 64 * 1024 * 1024
+    namespace_max_entries: Dict[str, int] = {}
 
     class Config:
         env_prefix = "cache_"
@@ -98,6 +229,13 @@ def get_cache_config() -> CacheRegistryConfig:
 
 class CacheDistributedRegistryConfig(BaseSettings):
     purchase_price_ttl: int = 10 * 60
+    order_coupons_ttl: int = 14 * 24 * 60 * 60
+    idempotency_ttl: int = 10 * 60
+    # Longest expected execution of a mutation, duplicates wait for it at most this long
+    idempotency_lock_ttl: int = 30
+    # Redelivered Kafka events are recognized for this long, the latest ones without a cache round trip
+    processed_events_ttl: int = 24 * 60 * 60
+    processed_events_window: int = 10000
     url: str = "memory://"
 
     class Config:
@@ -109,6 +247,40 @@ def get_distributed_cache_config() -> CacheDistributedRegistryConfig:
     return CacheDistributedRegistryConfig()
 
 
+class OrderCouponIndexConfig(BaseSettings):
+    # Skip the database for orders missing from the index. Enable only with a shared distributed cache url,
+    # once the index has been written for longer than orders stay open
+    authoritative: bool = False
+
+    class Config:
+        env_prefix = "order_coupon_index_"
+
+
+class BulkUploadConfig(BaseSettings):
+    # Streamed uploads are validated and saved this many items at a time, each chunk in its own transaction
+    chunk_size: int = 1000
+    max_line_bytes: int = 1024 * 1024
+
+    class Config:
+        env_prefix = "bulk_upload_"
+
+
+class CouponEventsConfig(BaseSettings):
+    # Coupon applied, reverted and paid events are written to the promotion_coupon_events_outbox table
+    # in the transaction of the change and relayed to the topic, keyed by order id
+    enabled: bool = False
+    topic: str = "promotion.coupon.usage"
+    # Workers take turns relaying through a database advisory lock, disable to relay from other processes only
+    relay_enabled: bool = True
+    relay_batch_size: int = 500
+    relay_interval: float = 1.0
+    relay_linger_ms: int = 10
+    relay_lock_id: int = 7_120_049
+
+    class Config:
+        env_prefix = "coupon_events_"
+
+
 class ProgressBarMessages(BaseSettings):
     placeholders: str = ""
     placeholders_split_char = "\n"
@@ -229,15 +401,24 @@ class ConditionsSettings(BaseSettings):
 class Settings(BaseSettings):
     db: DbSettings = DbSettings()
     conditions_db: ConditionsDbSettings = ConditionsDbSettings()
+    db_bulk_pool: BulkDbPoolSettings = BulkDbPoolSettings()
+    db_consumer_pool: ConsumerDbPoolSettings = ConsumerDbPoolSettings()
+    uow: UnitOfWorkSettings = UnitOfWorkSettings()
     tracing: TracingSettings = TracingSettings()
     logging_profile: LoggingProfileEnum = LoggingProfileEnum.debug
     kafka: KafkaSettings = KafkaSettings()
+    invalidation: InvalidationSettings = InvalidationSettings()
+    snapshot: SnapshotSettings = SnapshotSettings()
 
     order_bonus_settings: OrderBonusSettings = OrderBonusSettings()
     order_conditions_settings: ConditionsSettings = ConditionsSettings()
 
     referral_coupon: ReferralCouponConfig = ReferralCouponConfig()
     user_antifraud: UserAntifraudConfig = UserAntifraudConfig()
+    price_events: PriceEventsConfig = PriceEventsConfig()
+    order_coupon_index: OrderCouponIndexConfig = OrderCouponIndexConfig()
+    coupon_events: CouponEventsConfig = CouponEventsConfig()
+    bulk_upload: BulkUploadConfig = BulkUploadConfig()
     min_order_amount: int = 50
 
 
@@ -0,0 +1,273 @@
+import asyncio
+import dataclasses
+import json
+import time
+from collections import defaultdict
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Sequence
+
+from aiokafka import ConsumerRecord, TopicPartition
+from aiokafka.structs import OffsetAndTimestamp
+
+
+class InMemoryKafkaClient:
+    """Stand-in for AIOKafkaConsumer reading records published to InMemoryKafkaBroker"""
+
+    def __init__(
+        self,
+        broker: "InMemoryKafkaBroker",
+        *topics: str,
+        value_deserializer: Optional[Callable[[bytes], Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        self._broker = broker
+        self._topics = set(topics)
+        self._value_deserializer = value_deserializer
+        self._pending = 0
+        self._assignment: set[TopicPartition] = set()
+        self.paused: set[TopicPartition] = set()
+
+    def subscribe(self, topics: Iterable[str], listener: Any = None) -> None:
+        self._topics = set(topics)
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def commit(self, offsets: Dict[TopicPartition, int]) -> None:
+        self._broker.committed.update(offsets)
+
+    def assignment(self) -> set[TopicPartition]:
+        return set(self._assignment)
+
+    def pause(self, *partitions: TopicPartition) -> None:
+        self.paused.update(partitions)
+
+    def resume(self, *partitions: TopicPartition) -> None:
+        self.paused.difference_update(partitions)
+
+    def __aiter__(self) -> AsyncIterator[ConsumerRecord]:
+        return self
+
+    async def __anext__(self) -> ConsumerRecord:
+        self._release()
+        return await self._next()
+
+    async def getmany(
+        self, timeout_ms: int = 0, max_records: Optional[int] = None
+    ) -> Dict[TopicPartition, List[ConsumerRecord]]:
+        self._release()
+        records: Dict[TopicPartition, List[ConsumerRecord]] = defaultdict(list)
+        try:
+            record = await asyncio.wait_for(self._next(), timeout_ms / 1000)
+        except asyncio.TimeoutError:
+            return {}
+
+        count = 1
+        records[TopicPartition(record.topic, record.partition)].append(record)
+        while (max_records is None or count < max_records) and not self._broker.queue.empty():
+            record = self._broker.queue.get_nowait()
+            if record.topic not in self._topics:
+                self._broker.queue.task_done()
+                continue
+            self._pending += 1
+            count += 1
+            records[TopicPartition(record.topic, record.partition)].append(self._consume(record))
+        return dict(records)
+
+    def _release(self) -> None:
+        # Previously returned records are considered processed once the next ones are requested
+        for _ in range(self._pending):
+            self._broker.queue.task_done()
+        self._pending = 0
+
+    async def _next(self) -> ConsumerRecord:
+        while True:
+            record: ConsumerRecord = await self._broker.queue.get()
+            if record.topic in self._topics:
+                break
+            self._broker.queue.task_done()
+
+        self._pending += 1
+        return self._consume(record)
+
+    def _consume(self, record: ConsumerRecord) -> ConsumerRecord:
+        # Partitions of every consumed record are assigned to the single client
+        self._assignment.add(TopicPartition(record.topic, record.partition))
+        if self._value_deserializer is not None:
+            record = dataclasses.replace(record, value=self._value_deserializer(record.value))
+        return record
+
+
+class InMemoryKafkaProducer:
+    """Stand-in for AIOKafkaProducer publishing to InMemoryKafkaBroker"""
+
+    def __init__(self, broker: "InMemoryKafkaBroker", **kwargs: Any) -> None:
+        self._broker = broker
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def send_and_wait(
+        self,
+        topic: str,
+        value: bytes,
+        key: Optional[bytes] = None,
+        partition: int = 0,
+        headers: Sequence[tuple[str, bytes]] = (),
+    ) -> ConsumerRecord:
+        return self._broker.append(topic, value, key=key, partition=partition, headers=headers)
+
+    async def send(
+        self,
+        topic: str,
+        value: bytes,
+        key: Optional[bytes] = None,
+        partition: int = 0,
+        headers: Sequence[tuple[str, bytes]] = (),
+    ) -> "asyncio.Future[ConsumerRecord]":
+        delivery: asyncio.Future[ConsumerRecord] = asyncio.get_running_loop().create_future()
+        delivery.set_result(self._broker.append(topic, value, key=key, partition=partition, headers=headers))
+        return delivery
+
+
+class InMemoryKafkaReader:
+    """Stand-in for AIOKafkaConsumer without a group, reading assigned partitions of published records by offset"""
+
+    def __init__(self, broker: "InMemoryKafkaBroker", **kwargs: Any) -> None:
+        self._broker = broker
+        self._positions: Dict[TopicPartition, int] = {}
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def topics(self) -> set[str]:
+        return set(self._broker.published)
+
+    def partitions_for_topic(self, topic: str) -> Optional[set[int]]:
+        records = self._broker.published.get(topic)
+        return {record.partition for record in records} if records else None
+
+    def assign(self, partitions: Iterable[TopicPartition]) -> None:
+        self._positions = {partition: 0 for partition in partitions}
+
+    def seek(self, partition: TopicPartition, offset: int) -> None:
+        self._positions[partition] = offset
+
+    async def beginning_offsets(self, partitions: Iterable[TopicPartition]) -> Dict[TopicPartition, int]:
+        return {partition: 0 for partition in partitions}
+
+    async def end_offsets(self, partitions: Iterable[TopicPartition]) -> Dict[TopicPartition, int]:
+        return {partition: self._broker.high_watermark(partition) for partition in partitions}
+
+    async def position(self, partition: TopicPartition) -> int:
+        return self._positions[partition]
+
+    async def offsets_for_times(
+        self, timestamps: Dict[TopicPartition, int]
+    ) -> Dict[TopicPartition, Optional[OffsetAndTimestamp]]:
+        return {
+            partition: next(
+                (
+                    OffsetAndTimestamp(record.offset, record.timestamp)
+                    for record in self._records(partition)
+                    if record.timestamp >= timestamp
+                ),
+                None,
+            )
+            for partition, timestamp in timestamps.items()
+        }
+
+    async def getmany(
+        self, *partitions: TopicPartition, timeout_ms: int = 0, max_records: Optional[int] = None
+    ) -> Dict[TopicPartition, List[ConsumerRecord]]:
+        batches = {}
+        for partition in partitions or list(self._positions):
+            position = self._positions[partition]
+            records = [record for record in self._records(partition) if record.offset >= position][:max_records]
+            if records:
+                batches[partition] = records
+                self._positions[partition] = records[-1].offset + 1
+            else:
+                # Offsets without records, like transaction markers, are skipped by the fetch
+                self._positions[partition] = max(position, self._broker.high_watermark(partition))
+        return batches
+
+    def _records(self, partition: TopicPartition) -> List[ConsumerRecord]:
+        return [record for record in self._broker.published[partition.topic] if record.partition == partition.partition]
+
+
+class InMemoryKafkaBroker:
+    def __init__(self) -> None:
+        self.queue: asyncio.Queue[ConsumerRecord] = asyncio.Queue()
+        self._offsets: dict[tuple[str, int], int] = defaultdict(int)
+        self.committed: dict[TopicPartition, int] = {}
+        # Every published record by topic, whether a client consumed it or not
+        self.published: dict[str, list[ConsumerRecord]] = defaultdict(list)
+
+    def publish(
+        self,
+        topic: str,
+        value: dict,
+        *,
+        key: Optional[bytes] = None,
+        partition: int = 0,
+        headers: Sequence[tuple[str, bytes]] = (),
+    ) -> ConsumerRecord:
+        serialized = json.dumps(value, default=str).encode()
+        return self.append(topic, serialized, key=key, partition=partition, headers=headers)
+
+    def append(
+        self,
+        topic: str,
+        serialized: bytes,
+        *,
+        key: Optional[bytes] = None,
+        partition: int = 0,
+        headers: Sequence[tuple[str, bytes]] = (),
+    ) -> ConsumerRecord:
+        offset = self._offsets[(topic, partition)]
+        self._offsets[(topic, partition)] += 1
+        record = ConsumerRecord(
+            topic=topic,
+            partition=partition,
+            offset=offset,
+            timestamp=int(time.time() * 1000),
+            timestamp_type=0,
+            key=key,
+            value=serialized,
+            checksum=None,
+            serialized_key_size=len(key) if key else -1,
+            serialized_value_size=len(serialized),
+            headers=tuple(headers),
+        )
+        self.queue.put_nowait(record)
+        self.published[topic].append(record)
+
+        return record
+
+    def append_marker(self, topic: str, partition: int = 0) -> None:
+        """Takes an offset without a record, as a transaction marker does"""
+        self._offsets[(topic, partition)] += 1
+
+    def high_watermark(self, partition: TopicPartition) -> int:
+        return self._offsets[(partition.topic, partition.partition)]
+
+    def client(self, *topics: str, **kwargs: Any) -> InMemoryKafkaClient:
+        return InMemoryKafkaClient(self, *topics, **kwargs)
+
+    def producer(self, **kwargs: Any) -> InMemoryKafkaProducer:
+        return InMemoryKafkaProducer(self, **kwargs)
+
+    def reader(self, **kwargs: Any) -> InMemoryKafkaReader:
+        return InMemoryKafkaReader(self, **kwargs)
+
+    async def join(self, timeout: float = 5) -> None:
+        await asyncio.wait_for(self.queue.join(), timeout)
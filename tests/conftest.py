@@ -20,8 +20,10 @@ from warehouse.models.warehouse import Location, Polygon, WarehouseModel
 
 from svc.app import create_app
 from svc.persist import schemas
-from svc.persist.database import conditions_database, Database, database
+from svc.persist.database import bulk_database, conditions_database, Database, database
 from svc.persist.schemas.metadata import PublicSchema
+from svc.persist.schemas.outbox import CouponEventOutboxSchema
+from svc.services.cache import DistributedCacheRegistry
 from svc.utils.module_loader import import_submodules
 from tests import factories
 from tests.factories.base_factory import AsyncFactory
@@ -38,6 +40,9 @@ def event_loop(request: pytest.FixtureRequest) -> Iterator[asyncio.AbstractEvent
 @pytest.fixture(scope="session")
 async def db() -> AsyncIterator[Database]:
     await database.startup()
+    # Owned by the service, missing from databases the main schema was provisioned for before
+    async with database.engine.begin() as conn:
+        await conn.run_sync(CouponEventOutboxSchema.table.create, checkfirst=True)
     yield database
     await database.shutdown()
 
@@ -85,6 +90,7 @@ async def db_connection(app: FastAPI, db: Database) -> AsyncIterator[AsyncConnec
             return conn
 
         app.dependency_overrides[db.connection] = get_conn
+        app.dependency_overrides[bulk_database.connection] = get_conn
         yield conn
 
 
@@ -150,6 +156,12 @@ def get_schemas() -> Iterator[PublicSchema]:
         )
 
 
+@pytest.fixture(autouse=True)
+async def clear_processed_events() -> None:
+    # Every in-memory broker starts at offset 0
+    await DistributedCacheRegistry.processed_events.clear()
+
+
 @pytest.fixture(autouse=True)
 async def mock_pricing_get_empty_prices(mocker) -> Mock:
     async def get_product_prices_cents(*args, **kwargs) -> PricingApiResponse[PricingListResult[ProductPriceV2Model]]:
@@ -0,0 +1,147 @@
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncContextManager, AsyncIterator, Callable, List
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from svc.backfill import ORDER_PAID_TOPIC, backfill, parse_timestamp
+from svc.persist.schemas.coupon import UserCouponSchema
+from svc.settings import get_service_settings
+from tests.broker import InMemoryKafkaBroker
+from tests.factories.coupon import CouponFactory
+from tests.factories.user_coupon import UserCouponFactory
+
+from .helpers import get_user_coupon
+
+
+class TestBackfill:
+    @pytest.fixture
+    def connection_factory(self, db_connection: AsyncConnection) -> Callable[[], AsyncContextManager[AsyncConnection]]:
+        @asynccontextmanager
+        async def factory() -> AsyncIterator[AsyncConnection]:
+            yield db_connection
+
+        return factory
+
+    @staticmethod
+    async def create_user_coupons(count: int) -> List[UserCouponSchema]:
+        coupon = await CouponFactory.create(quantity=5)
+        return [await UserCouponFactory(user_id=uuid4(), coupon_id=coupon.id, order_id=uuid4()) for _ in range(count)]
+
+    @staticmethod
+    def publish_paid(broker: InMemoryKafkaBroker, user_coupons: List[UserCouponSchema]) -> None:
+        for index, user_coupon in enumerate(user_coupons):
+            broker.publish(
+                ORDER_PAID_TOPIC,
+                {"event": "customer-order-paid", "order_id": str(user_coupon.order_id)},
+                partition=index % 2,
+            )
+
+    @staticmethod
+    async def get_paid(connection: AsyncConnection, user_coupons: List[UserCouponSchema]) -> List[bool]:
+        paid = []
+        for user_coupon in user_coupons:
+            db_user_coupon = await get_user_coupon(connection, user_coupon_id=user_coupon.id)
+            assert db_user_coupon
+            paid.append(db_user_coupon.order_paid)
+        return paid
+
+    @pytest.mark.asyncio
+    async def test_should_report_rows_without_changing_them(
+        self, db_connection: AsyncConnection, connection_factory: Callable[[], AsyncContextManager[AsyncConnection]]
+    ) -> None:
+        user_coupons = await self.create_user_coupons(4)
+        broker = InMemoryKafkaBroker()
+        self.publish_paid(broker, user_coupons)
+
+        report = await backfill(
+            get_service_settings(),
+            dry_run=True,
+            client_factory=broker.reader,
+            connection_factory=connection_factory,
+        )
+
+        assert (report.messages, report.changed_rows) == (4, 4)
+        assert await self.get_paid(db_connection, user_coupons) == [False] * 4
+
+    @pytest.mark.asyncio
+    async def test_should_set_paid_in_offset_range(
+        self, db_connection: AsyncConnection, connection_factory: Callable[[], AsyncContextManager[AsyncConnection]]
+    ) -> None:
+        user_coupons = await self.create_user_coupons(6)
+        broker = InMemoryKafkaBroker()
+        self.publish_paid(broker, user_coupons)
+
+        report = await backfill(
+            get_service_settings(),
+            partitions=[0],
+            from_offset=1,
+            batch_size=1,
+            client_factory=broker.reader,
+            connection_factory=connection_factory,
+        )
+
+        # Partition 0 holds every other coupon, its first offset is out of range
+        assert (report.messages, report.changed_rows) == (2, 2)
+        assert await self.get_paid(db_connection, user_coupons) == [False, False, True, False, True, False]
+
+    @pytest.mark.asyncio
+    async def test_should_resume_from_checkpoint(
+        self,
+        db_connection: AsyncConnection,
+        connection_factory: Callable[[], AsyncContextManager[AsyncConnection]],
+        tmp_path: Path,
+    ) -> None:
+        user_coupons = await self.create_user_coupons(4)
+        broker = InMemoryKafkaBroker()
+        self.publish_paid(broker, user_coupons)
+        checkpoint_path = tmp_path / "checkpoint.json"
+        checkpoint_path.write_text(json.dumps({"topic": ORDER_PAID_TOPIC, "offsets": {"0": 2, "1": 1}}))
+
+        report = await backfill(
+            get_service_settings(),
+            parallelism=1,
+            checkpoint_path=checkpoint_path,
+            client_factory=broker.reader,
+            connection_factory=connection_factory,
+        )
+
+        assert (report.messages, report.changed_rows) == (1, 1)
+        assert json.loads(checkpoint_path.read_text())["offsets"] == {"0": 2, "1": 2}
+        assert await self.get_paid(db_connection, user_coupons) == [False, False, False, True]
+
+        rerun = await backfill(
+            get_service_settings(),
+            checkpoint_path=checkpoint_path,
+            client_factory=broker.reader,
+            connection_factory=connection_factory,
+        )
+        assert (rerun.messages, rerun.changed_rows) == (0, 0)
+
+    @pytest.mark.asyncio
+    async def test_should_stop_at_offsets_without_records(
+        self, db_connection: AsyncConnection, connection_factory: Callable[[], AsyncContextManager[AsyncConnection]]
+    ) -> None:
+        user_coupons = await self.create_user_coupons(2)
+        broker = InMemoryKafkaBroker()
+        self.publish_paid(broker, user_coupons[:1])
+        # The end offset of the partition lies past its last record
+        broker.append_marker(ORDER_PAID_TOPIC)
+
+        report = await backfill(
+            get_service_settings(),
+            partitions=[0],
+            client_factory=broker.reader,
+            connection_factory=connection_factory,
+        )
+
+        assert (report.messages, report.changed_rows) == (1, 1)
+        assert await self.get_paid(db_connection, user_coupons) == [True, False]
+
+    def test_should_parse_naive_timestamps_as_utc(self) -> None:
+        assert parse_timestamp("2024-01-01T00:00:00") == datetime(2024, 1, 1, tzinfo=timezone.utc)
+        assert parse_timestamp("2024-01-01T02:00:00+02:00") == datetime(2024, 1, 1, tzinfo=timezone.utc)
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from svc.infrastructure.bounded_cache import BoundedMemoryCache, MemoryBudget
+from svc.services.cache import ReadThroughCache
+
+
+class TestBoundedMemoryCache:
+    @pytest.mark.asyncio
+    async def test_should_evict_least_recently_used_per_namespace(self) -> None:
+        cache = BoundedMemoryCache(max_entries=100, max_bytes=1024 * 1024, namespace_max_entries={"small": 2})
+        for key in ("a", "b"):
+            await cache.set(key, key, namespace="small")
+        for key in ("a", "b", "c"):
+            await cache.set(key, key, namespace="large")
+
+        assert await cache.get("a", namespace="small") == "a"
+        await cache.set("c", "c", namespace="small")
+
+        assert await cache.get("a", namespace="small") == "a"
+        assert await cache.get("b", namespace="small") is None
+        assert await cache.get("c", namespace="small") == "c"
+        assert await cache.multi_get(["a", "b", "c"], namespace="large") == ["a", "b", "c"]
+
+    @pytest.mark.asyncio
+    async def test_should_bound_namespace_size_in_bytes(self) -> None:
+        cache = BoundedMemoryCache(max_entries=100, max_bytes=4096)
+        for key in range(10):
+            await cache.set(str(key), "x" * 1000, namespace="blobs")
+
+        values = await cache.multi_get([str(key) for key in range(10)], namespace="blobs")
+        assert values[-1] is not None
+        assert 0 < sum(value is not None for value in values) < 4
+
+    @pytest.mark.asyncio
+    async def test_should_share_budget_between_caches(self) -> None:
+        budget = MemoryBudget(8192)
+        cache = BoundedMemoryCache(max_entries=100, max_bytes=1024 * 1024, budget=budget)
+        read_through = ReadThroughCache[tuple[int], str]("test_budget", ttl=60, budget=budget)
+        for key in range(5):
+            await cache.set(str(key), "x" * 1000, namespace="blobs")
+        for key in range(10):
+            await read_through.set((key,), "x" * 1000)
+
+        assert 0 < budget.used <= budget.max_bytes
+        assert await read_through.get((9,)) is not None
+        assert await read_through.get((0,)) is None
+
+        await cache.clear()
+        await read_through.clear()
+        assert budget.used == 0
+
+    @pytest.mark.asyncio
+    async def test_should_expire_values(self) -> None:
+        cache = BoundedMemoryCache(max_entries=10, max_bytes=1024 * 1024)
+        await cache.set("key", "value", ttl=0.05)
+        assert await cache.exists("key")
+
+        await asyncio.sleep(0.1)
+        assert await cache.get("key") is None
+
+        await cache.set("key", "value")
+        assert await cache.delete("key") == 1
+        assert await cache.get("key") is None
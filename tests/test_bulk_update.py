@@ -8,6 +8,7 @@ from customer_profile.api.models.user import UserListFilter
 from customer_profile.api_client.client import CustomerProfileClient
 from httpx import AsyncClient
 from pytest_mock import MockerFixture
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncConnection
 from warehouse.api_client.warehouse import WarehouseClient
 from warehouse.models.warehouse import WarehouseListFilters
@@ -20,15 +21,20 @@ from svc.api.models.bulk import (
     BulkCouponValueRequest,
     BulkOperation,
     BulkResponse,
+    BulkResultModel,
     CategoriesNotFoundError,
     DuplicatedItemError,
+    TextError,
     UsersNotFoundError,
     WarehousesNotFoundError,
 )
 from svc.api.models.coupon import CouponKind
+from svc.api.models.error_code import ErrorCode
 from svc.infrastructure.catalog.client import CatalogClient
 from svc.infrastructure.catalog.models import CategoryListRequest
+from svc.persist.schemas.coupon import CouponValueOrderNumberSchema
 from svc.services.coupon.dto import CouponModel
+from svc.settings import get_service_settings
 from svc.utils.money import cents_to_dollars, dollars_to_cents
 from tests.factories.coupon import CouponFactory
 from tests.helpers import get_coupon
@@ -451,3 +457,120 @@ async def test_should_detect_duplicates(
     assert isinstance(item1.errors[0], DuplicatedItemError)
     assert item1.errors[0].data == coupon_value2.bulk_item_id
     assert not item2.errors
+
+
+async def test_should_stream_ndjson_coupons_in_chunks(
+    client: AsyncClient,
+    mocker: MockerFixture,
+    db_connection: AsyncConnection,
+) -> None:
+    mock_clients(mocker)
+    mocker.patch.object(get_service_settings().bulk_upload, "chunk_size", 2)
+    coupons = [
+        BulkCouponModel(
+            bulk_item_id=uuid4(),
+            name=name,
+            active=True,
+            value=1000,
+            kind=CouponKind.fixed,
+            valid_till=None,
+            quantity=quantity,
+            limit=None,
+            minimum_order_amount=None,
+            orders_from=None,
+            orders_to=None,
+            max_discount=None,
+            users=None,
+            warehouses=[uuid4()],
+            categories=None,
+        )
+        for name, quantity in (("first", 10), ("second", 10), ("third", 10), ("FIRST", 20))
+    ]
+    lines = (
+        [it.json() for it in coupons[:2]] + ["{not json", "", '{"name": "invalid"}'] + [it.json() for it in coupons[2:]]
+    )
+
+    response = await client.post(
+        "/bulk/coupons/stream", content="\n".join(lines), headers={"content-type": "application/x-ndjson"}
+    )
+    response.raise_for_status()
+
+    results = [BulkResultModel.parse_raw(it) for it in response.text.splitlines()]
+    assert len(results) == 6
+    first, second, not_json, invalid, third, updated = results
+    assert [it.bulk_item_id for it in (first, second, third, updated)] == [it.bulk_item_id for it in coupons]
+    assert not any(it.errors for it in (first, second, third, updated))
+    assert not_json.errors and isinstance(error := not_json.errors[0], TextError)
+    assert error.data.startswith("Line 3:")
+    assert invalid.errors and isinstance(error := invalid.errors[0], TextError)
+    assert error.data.startswith("Line 5:")
+    # A later chunk saves over a coupon of an earlier chunk
+    assert updated.operation == BulkOperation.update
+
+    for coupon in coupons[1:]:
+        assert (db_coupon := await get_coupon(db_connection, name=coupon.name))
+        assert_is_equal(coupon, db_coupon)
+
+
+async def test_should_stream_coupon_values_of_a_coupon_in_chunks(
+    client: AsyncClient,
+    mocker: MockerFixture,
+    db_connection: AsyncConnection,
+) -> None:
+    mocker.patch.object(get_service_settings().bulk_upload, "chunk_size", 1)
+    coupon = await CouponFactory.create()
+    previous = BulkCouponValueModel(bulk_item_id=uuid4(), coupon_name=coupon.name, value=500, orders_number=1)
+    response = await client.post("/bulk/coupons/values", content=BulkCouponValueRequest(items=[previous]).json())
+    response.raise_for_status()
+
+    values = [
+        BulkCouponValueModel(bulk_item_id=uuid4(), coupon_name=coupon.name, value=1000, orders_number=5),
+        BulkCouponValueModel(bulk_item_id=uuid4(), coupon_name=coupon.name, value=2000, orders_number=10),
+    ]
+    response = await client.post(
+        "/bulk/coupons/values/stream",
+        content="\n".join(it.json() for it in values),
+        headers={"content-type": "application/x-ndjson"},
+    )
+    response.raise_for_status()
+
+    results = [BulkResultModel.parse_raw(it) for it in response.text.splitlines()]
+    assert [it.bulk_item_id for it in results] == [it.bulk_item_id for it in values]
+    assert not any(it.errors for it in results)
+
+    # The second chunk keeps the values of the first one and both replace the values saved before
+    statement = select(CouponValueOrderNumberSchema.orders_number).where(
+        CouponValueOrderNumberSchema.coupon_id == coupon.id
+    )
+    assert set((await db_connection.execute(statement)).scalars()) == {5, 10}
+
+
+async def test_should_stream_csv_coupons(
+    client: AsyncClient,
+    mocker: MockerFixture,
+    db_connection: AsyncConnection,
+) -> None:
+    mock_clients(mocker)
+    bulk_item_id, warehouses = uuid4(), [uuid4(), uuid4()]
+    body = (
+        "bulk_item_id,name,active,value,kind,quantity,warehouses\n"
+        f'{bulk_item_id},csv_coupon,true,500,{CouponKind.fixed.value},3,"{warehouses[0]};\n{warehouses[1]}"\n'
+        f"{uuid4()},,true,500,{CouponKind.fixed.value},3,\n"
+    )
+
+    response = await client.post("/bulk/coupons/stream", content=body, headers={"content-type": "text/csv"})
+    response.raise_for_status()
+
+    saved, invalid = [BulkResultModel.parse_raw(it) for it in response.text.splitlines()]
+    assert saved.bulk_item_id == bulk_item_id and not saved.errors and not saved.warnings
+    assert invalid.errors and isinstance(error := invalid.errors[0], TextError)
+    assert error.data.startswith("Line 4:")
+    assert (db_coupon := await get_coupon(db_connection, name="csv_coupon"))
+    assert db_coupon.quantity == 3
+
+
+async def test_should_reject_unsupported_stream_content_type(client: AsyncClient) -> None:
+    response = await client.post("/bulk/coupons/stream", content="[]", headers={"content-type": "application/json"})
+
+    api_response = ApiResponse[BulkResponse].parse_obj(response.json())
+    assert api_response.error and api_response.error.code == ErrorCode.unsupported_content_type
@@ -0,0 +1,81 @@
+import asyncio
+from typing import Optional
+
+import pytest
+
+from svc.services.cache import ReadThroughCache, read_through
+
+
+class Repository:
+    def __init__(self, cache: ReadThroughCache[tuple[int], str]) -> None:
+        self.calls = 0
+
+        @read_through(cache)
+        async def load(self: Repository, item_id: int) -> Optional[str]:
+            self.calls += 1
+            await asyncio.sleep(0.01)
+            return None if item_id < 0 else f"item {item_id}"
+
+        self.load = load.__get__(self)
+
+
+class TestReadThroughCache:
+    @pytest.mark.asyncio
+    async def test_should_load_concurrent_misses_once(self) -> None:
+        repository = Repository(ReadThroughCache("test_single_flight", ttl=60))
+
+        results = await asyncio.gather(*(repository.load(1) for _ in range(10)))
+
+        assert results == ["item 1"] * 10
+        assert repository.calls == 1
+        assert await repository.load(1) == "item 1"
+        assert repository.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_should_reload_when_leader_is_cancelled(self) -> None:
+        repository = Repository(ReadThroughCache("test_cancelled_leader", ttl=60))
+
+        leader = asyncio.create_task(repository.load(1))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(repository.load(1)) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        assert await asyncio.gather(*followers) == ["item 1"] * 3
+        assert repository.calls == 2
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+    @pytest.mark.asyncio
+    async def test_should_cache_negative_results(self) -> None:
+        repository = Repository(ReadThroughCache("test_negative", ttl=60, negative_ttl=60))
+        assert await repository.load(-1) is None
+        assert await repository.load(-1) is None
+        assert repository.calls == 1
+
+        repository = Repository(ReadThroughCache("test_no_negative", ttl=60))
+        assert await repository.load(-1) is None
+        assert await repository.load(-1) is None
+        assert repository.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_should_evict_least_recently_used(self) -> None:
+        cache = ReadThroughCache[tuple[int], str]("test_bounded", ttl=60, max_size=2)
+        repository = Repository(cache)
+        await repository.load(1)
+        await repository.load(2)
+        await repository.load(1)
+        await repository.load(3)
+
+        assert await cache.get((1,)) == "item 1"
+        assert await cache.get((2,)) is None
+        assert await cache.get((3,)) == "item 3"
+
+    @pytest.mark.asyncio
+    async def test_should_expire_values(self) -> None:
+        cache = ReadThroughCache[tuple[int], str]("test_expiry", ttl=0.05, jitter=0.1)
+        await cache.set((1,), "value")
+        assert await cache.get((1,)) == "value"
+
+        await asyncio.sleep(0.1)
+        assert await cache.get((1,)) is None
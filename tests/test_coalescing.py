@@ -0,0 +1,64 @@
+import asyncio
+from uuid import uuid4
+
+import pytest
+
+from svc.api.models.gifts import GetGiftRequest
+from svc.services.coalescing import RequestCoalescer, canonical_hash, coalesce
+
+
+class Service:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    @coalesce("test_service")
+    async def compute(self, request: GetGiftRequest, *, scale: int = 1) -> dict:
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return {"subtotal": request.order_subtotal * scale}
+
+
+class TestRequestCoalescing:
+    @pytest.mark.asyncio
+    async def test_should_share_identical_in_flight_calls(self) -> None:
+        service = Service()
+        request = GetGiftRequest(warehouse_id=uuid4(), order_subtotal=100)
+
+        results = await asyncio.gather(
+            *(service.compute(request.copy()) for _ in range(5)),
+            service.compute(request, scale=2),
+        )
+
+        assert service.calls == 2
+        assert all(it is results[0] for it in results[:5])
+        assert results[5] == {"subtotal": 200}
+
+        await service.compute(request)
+        assert service.calls == 3
+
+    def test_should_hash_arguments_canonically(self) -> None:
+        warehouse_id = uuid4()
+        assert canonical_hash({"a": 1, "b": warehouse_id}) == canonical_hash({"b": str(warehouse_id), "a": 1})
+        assert canonical_hash(x=1, y=2) == canonical_hash(y=2, x=1)
+        assert canonical_hash(1) != canonical_hash(2)
+
+    @pytest.mark.asyncio
+    async def test_should_recompute_when_leader_is_cancelled(self) -> None:
+        coalescer = RequestCoalescer("test_cancelled")
+        calls = 0
+
+        async def call() -> int:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return calls
+
+        leader = asyncio.create_task(coalescer.run("key", call))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(coalescer.run("key", call))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        assert await follower == 2
+        with pytest.raises(asyncio.CancelledError):
+            await leader
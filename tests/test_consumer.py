@@ -3,7 +3,12 @@ from uuid import uuid4
 import pytest
 from sqlalchemy.ext.asyncio import AsyncConnection
 
-from svc.events.message_handlers import handle_order_canceled, handle_order_paid
+from svc.events.message_handlers import (
+    handle_order_canceled,
+    handle_order_paid,
+    handle_orders_canceled,
+    handle_orders_paid,
+)
 from svc.events.messages import OrderCanceledMessage, OrderPaidMessage
 from tests.factories.coupon import CouponFactory
 from tests.factories.user_coupon import UserCouponFactory
@@ -58,3 +63,41 @@ class TestOrderCanceledMessage:
         )
         assert db_coupon and db_coupon.quantity - coupon.quantity == 1, "Quantity should be reverted"
         assert not db_user_coupon, "UserCoupon should be deleted"
+
+
+class TestOrderBatchMessages:
+    @pytest.mark.asyncio
+    async def test_should_apply_paid_orders_batch(self, db_connection: AsyncConnection) -> None:
+        coupon = await CouponFactory.create(quantity=5)
+        user_coupons = [
+            await UserCouponFactory(user_id=uuid4(), coupon_id=coupon.id, order_id=uuid4()) for _ in range(3)
+        ]
+
+        await handle_orders_paid(
+            [OrderPaidMessage(order_id=it.order_id) for it in user_coupons] + [OrderPaidMessage(order_id=uuid4())],
+            db_connection,
+        )
+
+        for user_coupon in user_coupons:
+            db_user_coupon = await get_user_coupon(db_connection, user_coupon_id=user_coupon.id)
+            assert db_user_coupon and db_user_coupon.order_paid is True
+        assert (await get_coupon(db_connection, coupon_id=coupon.id)).quantity == 5
+
+    @pytest.mark.asyncio
+    async def test_should_revert_canceled_orders_batch(self, db_connection: AsyncConnection) -> None:
+        coupon = await CouponFactory.create(quantity=5)
+        other_coupon = await CouponFactory.create(quantity=1)
+        user_coupons = [
+            await UserCouponFactory(user_id=uuid4(), coupon_id=coupon.id, order_id=uuid4()) for _ in range(3)
+        ]
+        user_coupons.append(await UserCouponFactory(user_id=uuid4(), coupon_id=other_coupon.id, order_id=uuid4()))
+
+        await handle_orders_canceled(
+            [OrderCanceledMessage(order_id=it.order_id) for it in user_coupons + user_coupons[:1]],
+            db_connection,
+        )
+
+        for user_coupon in user_coupons:
+            assert not await get_user_coupon(db_connection, user_coupon_id=user_coupon.id)
+        assert (await get_coupon(db_connection, coupon_id=coupon.id)).quantity == 8
+        assert (await get_coupon(db_connection, coupon_id=other_coupon.id)).quantity == 2
@@ -0,0 +1,65 @@
+import asyncio
+from uuid import uuid4
+
+import pytest
+from httpx import AsyncClient
+from pytest_mock import MockerFixture
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from svc.services.coupon.coupon_service import CouponService
+from tests.factories.coupon import CouponFactory
+from tests.factories.user_coupon import UserCouponFactory
+
+from .helpers import get_coupon
+
+
+class TestIdempotency:
+    @pytest.mark.asyncio
+    async def test_should_apply_coupon_once_per_idempotency_key(
+        self, client: AsyncClient, db_connection: AsyncConnection, mocker: MockerFixture
+    ) -> None:
+        add_coupon = mocker.spy(CouponService, "add_coupon")
+        coupon = await CouponFactory.create(quantity=5, name="some")
+        order_id = uuid4()
+        request_data = {
+            "user_id": str(uuid4()),
+            "warehouse_id": str(uuid4()),
+            "name": coupon.name,
+            "order_subtotal": 5000,
+            "paid_orders_count": 5,
+            "delivered_orders_count": 5,
+            "order_items": [],
+            "unique_identifier": "abcdefg",
+        }
+        headers = {"Idempotency-Key": str(uuid4())}
+
+        responses = await asyncio.gather(
+            *(client.post(f"/coupons/orders/{order_id}", json=request_data, headers=headers) for _ in range(3))
+        )
+        replayed = await client.post(f"/coupons/orders/{order_id}", json=request_data, headers=headers)
+
+        assert add_coupon.call_count == 1
+        assert all(it.status_code == 200 for it in responses)
+        assert all(it.json() == responses[0].json() for it in [*responses, replayed])
+        assert responses[0].json()["result"]["discount_amount"] == 500
+        db_coupon = await get_coupon(db_connection, coupon_id=coupon.id)
+        assert coupon.quantity - db_coupon.quantity == 1
+
+    @pytest.mark.asyncio
+    async def test_should_execute_requests_with_other_key_or_route(
+        self, client: AsyncClient, mocker: MockerFixture
+    ) -> None:
+        delete_coupon = mocker.spy(CouponService, "delete_coupon")
+        coupon = await CouponFactory.create(quantity=5)
+        order_ids = [uuid4(), uuid4()]
+        for order_id in order_ids:
+            await UserCouponFactory.create(coupon_id=coupon.id, user_id=uuid4(), order_id=order_id)
+        headers = {"Idempotency-Key": str(uuid4())}
+
+        for order_id in order_ids:
+            response = await client.delete(f"/coupons/{coupon.id}/orders/{order_id}", headers=headers)
+            assert response.json()["result"]["id"] == str(coupon.id)
+        assert delete_coupon.call_count == 2
+
+        await client.delete(f"/coupons/{coupon.id}/orders/{order_ids[0]}")
+        assert delete_coupon.call_count == 3
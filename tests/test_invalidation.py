@@ -0,0 +1,165 @@
+import asyncio
+from typing import Iterator
+from uuid import uuid4
+
+import pytest
+from httpx import AsyncClient
+from pytest_mock import MockerFixture
+
+from svc.infrastructure.invalidation.bus import InvalidationBus, InvalidationEvent
+from svc.infrastructure.invalidation.postgres import PostgresInvalidationTransport
+from svc.infrastructure.warehouse.models import WarehouseShortModel
+from svc.invalidate import invalidate
+from svc.persist.database import Database
+from svc.services import invalidation as invalidation_module
+from svc.services.adapters import warehouse_directory as warehouse_directory_module
+from svc.services.adapters.warehouse_directory import WarehouseDirectory
+from svc.services.cache import LocalCacheRegistry
+from svc.services.invalidation import (
+    InvalidationEntity,
+    get_invalidation_bus,
+    invalidate_warehouse,
+    invalidate_warehouse_bonus_settings,
+    register_local_cache_handlers,
+)
+from svc.settings import CacheRegistryConfig, InvalidationTransportEnum, get_service_settings
+from tests.test_bulk_update import mock_clients
+
+
+class TestPostgresInvalidationBus:
+    @pytest.mark.asyncio
+    async def test_should_deliver_events_to_every_instance(self, db: Database) -> None:
+        channel = f"test_invalidation_{uuid4().hex}"
+        # Two buses with their own listener connections stand for two app instances
+        instances = [InvalidationBus(PostgresInvalidationTransport(db, channel)) for _ in range(2)]
+        received: list[list[InvalidationEvent]] = [[], []]
+        for bus, events in zip(instances, received):
+            register_local_cache_handlers(bus)
+
+            async def collect(event: InvalidationEvent, events: list[InvalidationEvent] = events) -> None:
+                events.append(event)
+
+            bus.subscribe(InvalidationEntity.warehouse_bonus_settings, collect)
+            await bus.start()
+
+        warehouse_id = uuid4()
+        await LocalCacheRegistry.warehouse_bonus_settings.set((warehouse_id,), object())
+        try:
+            await instances[0].publish(InvalidationEntity.warehouse_bonus_settings, [warehouse_id])
+            for _ in range(50):
+                if all(received):
+                    break
+                await asyncio.sleep(0.05)
+        finally:
+            for bus in instances:
+                await bus.stop()
+
+        for events in received:
+            assert [(it.entity, it.keys) for it in events] == [("warehouse_bonus_settings", [str(warehouse_id)])]
+        assert await LocalCacheRegistry.warehouse_bonus_settings.get((warehouse_id,)) is None
+
+    @pytest.mark.asyncio
+    async def test_should_clear_entity_on_keyless_event(self) -> None:
+        warehouse_id = uuid4()
+        await LocalCacheRegistry.warehouse_bonus_settings.set((warehouse_id,), object())
+
+        await invalidate_warehouse_bonus_settings(
+            InvalidationEvent(entity=InvalidationEntity.warehouse_bonus_settings, keys=None, version=1)
+        )
+
+        assert await LocalCacheRegistry.warehouse_bonus_settings.get((warehouse_id,)) is None
+
+    @pytest.mark.asyncio
+    async def test_should_refresh_warehouses_on_keyless_event(self, mocker: MockerFixture) -> None:
+        settings = CacheRegistryConfig(warehouses_refresh_interval=60)
+        directory = WarehouseDirectory(settings)
+        stale, fresh = (WarehouseShortModel(id=uuid4(), active=active, tz="UTC") for active in (True, False))
+        loaded = [[stale], [fresh]]
+        refreshed = asyncio.Event()
+
+        async def list_all_warehouses(page_size: int) -> list[WarehouseShortModel]:
+            warehouses = loaded.pop(0)
+            if not loaded:
+                refreshed.set()
+            return warehouses
+
+        manager = mocker.Mock(list_all_warehouses=list_all_warehouses)
+        mocker.patch.object(warehouse_directory_module, "WarehouseManager", return_value=manager)
+        mocker.patch.object(warehouse_directory_module, "warehouse_directory", directory)
+        mocker.patch.object(invalidation_module, "warehouse_directory", directory)
+        await directory.start()
+        try:
+            await invalidate_warehouse(InvalidationEvent(entity=InvalidationEntity.warehouse, keys=None, version=1))
+            # The previous directory is served until the new one is loaded
+            assert directory.get(stale.id) == stale
+
+            await asyncio.wait_for(refreshed.wait(), 1)
+        finally:
+            await directory.stop()
+
+        assert directory.get(stale.id) is None
+        assert directory.get(fresh.id) == fresh
+
+    @pytest.mark.asyncio
+    async def test_should_fail_external_write_publish(self, db: Database, mocker: MockerFixture) -> None:
+        settings = get_service_settings().copy(deep=True)
+        settings.invalidation.transport = InvalidationTransportEnum.postgres
+        mocker.patch.object(PostgresInvalidationTransport, "publish", side_effect=ConnectionError("unreachable"))
+
+        with pytest.raises(ConnectionError):
+            await invalidate(settings, InvalidationEntity.happy_hours, [uuid4()])
+
+    @pytest.mark.asyncio
+    async def test_should_publish_external_writes(self, db: Database) -> None:
+        settings = get_service_settings().copy(deep=True)
+        settings.invalidation.transport = InvalidationTransportEnum.postgres
+        settings.invalidation.channel = f"test_invalidation_{uuid4().hex}"
+        bus = InvalidationBus(PostgresInvalidationTransport(db, settings.invalidation.channel))
+        received: list[InvalidationEvent] = []
+
+        async def collect(event: InvalidationEvent) -> None:
+            received.append(event)
+
+        bus.subscribe(InvalidationEntity.happy_hours, collect)
+        await bus.start()
+        warehouse_id = uuid4()
+        try:
+            await invalidate(settings, InvalidationEntity.happy_hours, [warehouse_id])
+            for _ in range(50):
+                if received:
+                    break
+                await asyncio.sleep(0.05)
+        finally:
+            await bus.stop()
+
+        assert [(it.entity, it.keys) for it in received] == [("happy_hours", [str(warehouse_id)])]
+
+
+class TestBulkUploadInvalidation:
+    @pytest.fixture
+    def coupon_events(self) -> Iterator[list[InvalidationEvent]]:
+        received: list[InvalidationEvent] = []
+
+        async def collect(event: InvalidationEvent) -> None:
+            received.append(event)
+
+        bus = get_invalidation_bus()
+        bus.subscribe(InvalidationEntity.coupon, collect)
+        yield received
+        bus.unsubscribe(InvalidationEntity.coupon, collect)
+
+    @pytest.mark.asyncio
+    async def test_should_publish_coupon_event_after_upload(
+        self, client: AsyncClient, mocker: MockerFixture, coupon_events: list[InvalidationEvent]
+    ) -> None:
+        mock_clients(mocker)
+        assert get_service_settings().invalidation.transport.value == "local"
+
+        response = await client.post(
+            "/bulk/coupons",
+            json={"items": [{"name": f"coupon-{uuid4().hex[:8]}", "active": True, "value": 100, "kind": "fixed"}]},
+        )
+
+        assert response.status_code == 200, response.text
+        coupon_ids = [it["bulk_item_id"] for it in response.json()["result"]["items"]]
+        assert len(coupon_events) == 1 and len(coupon_events[0].keys or []) == len(coupon_ids)
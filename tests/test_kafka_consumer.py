@@ -0,0 +1,369 @@
+import asyncio
+import time
+from operator import itemgetter
+from typing import Dict, List
+from unittest.mock import AsyncMock, Mock
+from uuid import UUID, uuid4
+
+import pytest
+from aiocache import Cache
+from aiokafka import TopicPartition
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from svc.dead_letters import replay
+from svc.events.messages import OrderPaidMessage
+from svc.infrastructure.kafka.codecs import Codec, get_codec, get_codecs
+from svc.infrastructure.kafka.consumer import KafkaConsumer, TopicInfo
+from svc.infrastructure.kafka.dedupe import ProcessedEventStore
+from svc.infrastructure.kafka.message import partial_decoder
+from svc.infrastructure.kafka.offsets import OffsetTracker
+from svc.infrastructure.kafka.retry import RetryPublisher
+from svc.persist.database import Database
+from svc.settings import get_service_settings
+from tests.broker import InMemoryKafkaBroker
+
+TOPIC = "customer.order.paid"
+
+
+class TestKafkaConsumer:
+    @pytest.mark.asyncio
+    async def test_should_handle_keys_concurrently_and_in_order(self, db: Database) -> None:
+        handled: Dict[UUID, List[int]] = {}
+        in_flight = max_in_flight = 0
+
+        async def handler(message: OrderPaidMessage, connection: AsyncConnection) -> None:
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            handled.setdefault(message.order_id, []).append(message.created_at.microsecond)
+            in_flight -= 1
+
+        broker = InMemoryKafkaBroker()
+        consumer = KafkaConsumer([TOPIC], "", "", db, client_factory=broker.client, concurrency=4)
+        consumer.register_topic_handler(
+            TOPIC, TopicInfo(message_cls=OrderPaidMessage, handler=handler, key=itemgetter("order_id"))
+        )
+        order_ids = [uuid4() for _ in range(8)]
+        for sequence in range(5):
+            for order_id in order_ids:
+                broker.publish(
+                    TOPIC,
+                    {
+                        "event": "customer-order-paid",
+                        "order_id": str(order_id),
+                        "created_at": f"2024-01-01T00:00:00.00000{sequence}+00:00",
+                    },
+                )
+
+        await consumer.start()
+        await broker.join()
+        await consumer.stop()
+
+        assert 1 < max_in_flight <= 4
+        assert handled == {order_id: [0, 1, 2, 3, 4] for order_id in order_ids}
+
+    @pytest.mark.asyncio
+    async def test_should_handle_batches_on_one_connection(self, db: Database) -> None:
+        batches: List[List[UUID]] = []
+        connections = set()
+
+        async def batch_handler(messages: List[OrderPaidMessage], connection: AsyncConnection) -> None:
+            batches.append([it.order_id for it in messages])
+            connections.add(id(connection))
+
+        broker = InMemoryKafkaBroker()
+        consumer = KafkaConsumer([TOPIC], "", "", db, client_factory=broker.client, batch_size=4, batch_linger=0.05)
+        consumer.register_topic_handler(
+            TOPIC, TopicInfo(message_cls=OrderPaidMessage, handler=AsyncMock(), batch_handler=batch_handler)
+        )
+        order_ids = [uuid4() for _ in range(10)]
+        for order_id in order_ids:
+            broker.publish(TOPIC, {"event": "customer-order-paid", "order_id": str(order_id)})
+
+        await consumer.start()
+        while sum(map(len, batches)) < len(order_ids):
+            await asyncio.sleep(0.01)
+        await consumer.stop()
+
+        assert [len(it) for it in batches] == [4, 4, 2]
+        assert [order_id for batch in batches for order_id in batch] == order_ids
+        assert len(connections) == 1
+
+    @pytest.mark.asyncio
+    async def test_should_commit_only_handled_offsets(self, db: Database) -> None:
+        blocked_order_id = uuid4()
+        unblocked = asyncio.Event()
+        handled = 0
+
+        async def handler(message: OrderPaidMessage, connection: AsyncConnection) -> None:
+            nonlocal handled
+            if message.order_id == blocked_order_id:
+                await unblocked.wait()
+            handled += 1
+
+        broker = InMemoryKafkaBroker()
+        consumer = KafkaConsumer(
+            [TOPIC], "", "", db, client_factory=broker.client, concurrency=2, commit_batch_size=1, commit_interval=60
+        )
+        # The blocked message gets a lane of its own
+        consumer.register_topic_handler(
+            TOPIC,
+            TopicInfo(
+                message_cls=OrderPaidMessage,
+                handler=handler,
+                key=lambda value: value["order_id"] == str(blocked_order_id),
+            ),
+        )
+        order_ids = [uuid4(), uuid4(), blocked_order_id] + [uuid4() for _ in range(5)]
+        for order_id in order_ids:
+            broker.publish(TOPIC, {"event": "customer-order-paid", "order_id": str(order_id)})
+
+        await consumer.start()
+        while handled < len(order_ids) - 1:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.01)
+        assert broker.committed == {TopicPartition(TOPIC, 0): 2}
+
+        unblocked.set()
+        await consumer.stop()
+        assert broker.committed == {TopicPartition(TOPIC, 0): len(order_ids)}
+
+
+class TestOffsetTracker:
+    def test_should_advance_past_contiguous_done_offsets(self) -> None:
+        partition = TopicPartition(TOPIC, 0)
+        tracker = OffsetTracker()
+        generations = [tracker.add(partition, offset) for offset in range(4)]
+
+        tracker.done(partition, 1, generations[1])
+        tracker.done(partition, 3, generations[3])
+        assert tracker.positions() == {}
+        assert tracker.backlog == 4
+
+        tracker.done(partition, 0, generations[0])
+        assert tracker.positions() == {partition: 2}
+        assert tracker.advanced == 2
+
+        tracker.committed({partition: 2})
+        tracker.done(partition, 2, generations[2])
+        assert tracker.positions() == {partition: 4}
+        assert tracker.advanced == 2
+        assert tracker.backlog == 2
+
+    def test_should_ignore_forgotten_partitions(self) -> None:
+        partition = TopicPartition(TOPIC, 0)
+        tracker = OffsetTracker()
+        generation = tracker.add(partition, 0)
+
+        tracker.forget([partition])
+        tracker.done(partition, 0, generation)
+
+        assert tracker.positions() == {}
+        assert tracker.backlog == 0
+
+    def test_should_ignore_records_of_earlier_assignments(self) -> None:
+        partition = TopicPartition(TOPIC, 0)
+        tracker = OffsetTracker()
+        revoked = [tracker.add(partition, offset) for offset in range(3)]
+        tracker.done(partition, 2, revoked[2])
+        tracker.forget([partition])
+
+        # Reassigned, the records are fetched again while the earlier ones are still handled
+        generations = [tracker.add(partition, offset) for offset in range(2)]
+        tracker.done(partition, 0, revoked[0])
+        tracker.done(partition, 1, revoked[1])
+        assert tracker.positions() == {}
+        assert tracker.backlog == 2
+
+        tracker.done(partition, 0, generations[0])
+        tracker.done(partition, 1, generations[1])
+        tracker.add(partition, 2)
+        assert tracker.positions() == {partition: 2}
+        assert tracker.backlog == 3
+
+    @pytest.mark.asyncio
+    async def test_should_skip_processed_messages(self, db: Database) -> None:
+        handled: List[UUID] = []
+
+        async def handler(message: OrderPaidMessage, connection: AsyncConnection) -> None:
+            handled.append(message.order_id)
+
+        processed_events = ProcessedEventStore(Cache(), "processed_events", ttl=60, window_size=1)
+        order_ids = [uuid4(), uuid4()]
+        for _ in range(2):
+            # Redelivery of the same offsets
+            broker = InMemoryKafkaBroker()
+            for order_id in order_ids:
+                broker.publish(TOPIC, {"event": "customer-order-paid", "order_id": str(order_id)})
+
+            consumer = KafkaConsumer(
+                [TOPIC], "", "", db, client_factory=broker.client, processed_events=processed_events
+            )
+            consumer.register_topic_handler(TOPIC, TopicInfo(message_cls=OrderPaidMessage, handler=handler))
+            await consumer.start()
+            await broker.join()
+            await consumer.stop()
+
+        assert handled == order_ids
+
+
+class TestRetries:
+    @pytest.mark.asyncio
+    async def test_should_retry_and_dead_letter_failed_messages(self, db: Database) -> None:
+        attempts: List[UUID] = []
+        trace_id = "0af7651916cd43dd8448eb211c80319c"
+
+        async def handler(message: OrderPaidMessage, connection: AsyncConnection) -> None:
+            attempts.append(message.order_id)
+            raise RuntimeError("failed")
+
+        broker = InMemoryKafkaBroker()
+        retry = RetryPublisher("", "test", [0.01, 0.02], producer_factory=broker.producer)
+        consumer = KafkaConsumer([TOPIC], "", "test", db, client_factory=broker.client, retry=retry)
+        consumer.register_topic_handler(TOPIC, TopicInfo(message_cls=OrderPaidMessage, handler=handler))
+        order_id = uuid4()
+        broker.publish(
+            TOPIC,
+            {"event": "customer-order-paid", "order_id": str(order_id)},
+            key=b"key",
+            headers=[("trace_id", trace_id.encode()), ("span_id", b"b7ad6b7169203331"), ("sampled", b"1")],
+        )
+
+        await consumer.start()
+        while not broker.published[retry.dead_letter_topic]:
+            await asyncio.sleep(0.01)
+        await consumer.stop()
+
+        assert attempts == [order_id] * 3
+        assert [len(broker.published[topic]) for topic in retry.retry_topics] == [1, 1]
+        dead_letter = broker.published[retry.dead_letter_topic][0]
+        headers = {key: value.decode() for key, value in dead_letter.headers}
+        assert headers["retry_topic"] == TOPIC
+        assert headers["retry_attempt"] == "3"
+        assert headers["retry_error"] == "RuntimeError('failed')"
+        assert headers["trace_id"] == trace_id
+        assert dead_letter.key == b"key"
+
+    @pytest.mark.asyncio
+    async def test_should_pause_retry_partition_until_due(self, db: Database) -> None:
+        handled: List[UUID] = []
+
+        async def handler(message: OrderPaidMessage, connection: AsyncConnection) -> None:
+            handled.append(message.order_id)
+
+        broker = InMemoryKafkaBroker()
+        client = broker.client()
+        retry = RetryPublisher("", "test", [0.1], producer_factory=broker.producer)
+        consumer = KafkaConsumer(
+            [TOPIC], "", "test", db, client_factory=lambda **kwargs: client, retry=retry, max_pending=2
+        )
+        consumer.register_topic_handler(TOPIC, TopicInfo(message_cls=OrderPaidMessage, handler=handler))
+        retry_partition = TopicPartition(retry.retry_topics[0], 0)
+        due_ms = str(int((time.time() + 0.1) * 1000)).encode()
+        order_ids = [uuid4() for _ in range(3)]
+        for order_id in order_ids:
+            broker.publish(
+                retry_partition.topic,
+                {"event": "customer-order-paid", "order_id": str(order_id)},
+                headers=[("retry_topic", TOPIC.encode()), ("retry_attempt", b"1"), ("retry_due_ms", due_ms)],
+            )
+
+        await consumer.start()
+        while retry_partition not in client.paused:
+            await asyncio.sleep(0.01)
+        assert not handled
+
+        while len(handled) < len(order_ids):
+            await asyncio.sleep(0.01)
+        await consumer.stop()
+
+        assert handled == order_ids
+        assert retry_partition not in client.paused
+        assert broker.committed == {retry_partition: 3}
+
+    @pytest.mark.asyncio
+    async def test_should_dead_letter_malformed_messages(self, db: Database) -> None:
+        handler = AsyncMock()
+        broker = InMemoryKafkaBroker()
+        retry = RetryPublisher("", "test", [0.01], producer_factory=broker.producer)
+        consumer = KafkaConsumer([TOPIC], "", "test", db, client_factory=broker.client, retry=retry)
+        consumer.register_topic_handler(TOPIC, TopicInfo(message_cls=OrderPaidMessage, handler=handler))
+        broker.publish(TOPIC, {"event": "customer-order-paid"})
+
+        await consumer.start()
+        await broker.join()
+        await consumer.stop()
+
+        handler.assert_not_awaited()
+        assert not broker.published[retry.retry_topics[0]]
+        assert len(broker.published[retry.dead_letter_topic]) == 1
+
+    @pytest.mark.asyncio
+    async def test_should_replay_dead_letters(self) -> None:
+        settings = get_service_settings().copy(deep=True)
+        settings.kafka.consumer_retry_enabled = True
+        settings.kafka.consumer_retry_delays = [1]
+        broker = InMemoryKafkaBroker()
+        dead_letter_topic = f"{settings.kafka.group_id}.dlq"
+        for attempt in ("2", "3"):
+            broker.publish(
+                dead_letter_topic,
+                {"event": "customer-order-paid", "order_id": str(uuid4())},
+                headers=[("retry_topic", TOPIC.encode()), ("retry_attempt", attempt.encode())],
+            )
+
+        replayed = await replay(
+            settings, idle_timeout=0.01, client_factory=broker.client, producer_factory=broker.producer
+        )
+
+        assert replayed == 2
+        retries = broker.published[f"{settings.kafka.group_id}.retry.1s"]
+        assert [
+            {key: value.decode() for key, value in it.headers if key in ("retry_topic", "retry_attempt")}
+            for it in retries
+        ] == [{"retry_topic": TOPIC, "retry_attempt": "0"}] * 2
+        assert [it.value for it in retries] == [it.value for it in broker.published[dead_letter_topic]]
+        assert broker.committed == {TopicPartition(dead_letter_topic, 0): 2}
+
+
+class TestDecoding:
+    def test_should_validate_only_required_fields(self) -> None:
+        order_id = uuid4()
+        decode = partial_decoder(OrderPaidMessage, "order_id")
+
+        message = decode({"event": "customer-order-paid", "order_id": str(order_id), "created_at": "unparsed"})
+
+        assert message.order_id == order_id
+        assert message.created_at == "unparsed"
+        with pytest.raises(ValidationError):
+            decode({"event": "customer-order-paid", "order_id": "not an uuid"})
+        with pytest.raises(ValidationError):
+            decode({"event": "customer-order-paid"})
+
+    @pytest.mark.parametrize("name", get_codecs())
+    def test_should_round_trip_values(self, name: str) -> None:
+        codec = get_codec(name)
+        order_id = uuid4()
+
+        assert codec.loads(codec.dumps({"order_id": order_id})) == {"order_id": str(order_id)}
+        with pytest.raises(ValueError):
+            codec.loads(b"{")
+
+    @pytest.mark.asyncio
+    async def test_should_skip_unknown_topics_before_decoding(self, db: Database) -> None:
+        handler = AsyncMock()
+        codec = Mock(wraps=Codec())
+        broker = InMemoryKafkaBroker()
+        consumer = KafkaConsumer([TOPIC, "unknown"], "", "", db, client_factory=broker.client, codec=codec)
+        consumer.register_topic_handler(TOPIC, TopicInfo(message_cls=OrderPaidMessage, handler=handler))
+        broker.publish("unknown", {"event": "unknown"})
+        broker.publish(TOPIC, {"event": "customer-order-paid", "order_id": str(uuid4())})
+
+        await consumer.start()
+        await broker.join()
+        await consumer.stop()
+
+        handler.assert_awaited_once()
+        codec.loads.assert_called_once()
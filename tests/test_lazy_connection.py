@@ -0,0 +1,247 @@
+from typing import Any, AsyncIterator, List
+from uuid import uuid4
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from pytest_mock import MockerFixture
+from sqlalchemy import false, func, literal, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
+
+from svc.persist import lazy_connection
+from svc.persist.database import Database
+from svc.persist.lazy_connection import LazyConnection
+from svc.persist.replicas import ReplicaSet
+from svc.persist.schemas.coupon import CouponSchema, UserCouponSchema
+from svc.settings import get_service_settings
+from tests.factories.coupon import CouponFactory
+from tests.helpers import get_coupon
+
+
+class StaleReplicaConnection:
+    """A replica that stopped replicating: reads see the snapshot of a connection opened earlier"""
+
+    def __init__(self, connection: AsyncConnection) -> None:
+        self._connection = connection
+
+    async def execute(self, *args: Any, **kwargs: Any) -> Any:
+        return await self._connection.execute(*args, **kwargs)
+
+    async def close(self) -> None:
+        pass
+
+
+class TestLazyConnection:
+    @pytest.mark.asyncio
+    async def test_should_return_connection_after_reads(self, db: Database) -> None:
+        pool = db.engine.sync_engine.pool
+        checked_out = pool.checkedout()
+        connection = LazyConnection(db.engine)
+
+        assert not connection.checked_out
+        result = await connection.execute(select(literal(1)))
+
+        assert not connection.checked_out
+        assert pool.checkedout() == checked_out
+        assert result.scalar() == 1
+        await connection.close()
+
+    @pytest.mark.asyncio
+    async def test_should_hold_connection_for_transaction_and_writes(self, db: Database) -> None:
+        connection = LazyConnection(db.engine)
+
+        async with connection.begin():
+            await connection.execute(select(literal(1)))
+            assert connection.checked_out
+        assert not connection.checked_out
+
+        await connection.execute(CouponSchema.table.update().where(false()).values(quantity=0))
+        assert connection.checked_out and connection.in_transaction()
+        await connection.commit()
+        assert not connection.checked_out
+        await connection.close()
+
+    @pytest.mark.asyncio
+    async def test_should_hold_connection_for_text_and_locking_statements(self, db: Database) -> None:
+        connection = LazyConnection(db.engine)
+
+        await connection.execute(text(f"UPDATE {CouponSchema.table.name} SET quantity = 0 WHERE false"))
+        assert connection.checked_out and connection.in_transaction()
+        await connection.rollback()
+
+        await connection.execute(select(CouponSchema.id).where(false()).with_for_update())
+        assert connection.checked_out and connection.in_transaction()
+        await connection.rollback()
+        assert not connection.checked_out
+        await connection.close()
+
+
+class TestReplicaRouting:
+    @pytest.fixture
+    async def replicas(self, db: Database) -> AsyncIterator[ReplicaSet]:
+        # The primary stands in for a replica, it is not in recovery and reports no lag
+        settings = get_service_settings().db
+        replicas = ReplicaSet([create_async_engine(settings.url)], max_lag=1.0, check_interval=60)
+        await replicas.start()
+        yield replicas
+        await replicas.stop()
+        await replicas.dispose()
+
+    @pytest.mark.asyncio
+    async def test_should_read_from_replica_until_first_write(self, db: Database, replicas: ReplicaSet) -> None:
+        replica_pool = replicas.engines[0].sync_engine.pool
+        connection = LazyConnection(db.engine, replicas)
+
+        async with connection.replica_reads():
+            assert (await connection.execute(select(literal(1)))).scalar() == 1
+            assert not connection.checked_out
+            assert replica_pool.checkedin() == 1
+
+            await connection.execute(CouponSchema.table.update().where(false()).values(quantity=0))
+            await connection.execute(select(literal(1)))
+            assert connection.checked_out and connection.in_transaction()
+        await connection.close()
+
+    @pytest.mark.asyncio
+    async def test_should_read_from_primary_outside_replica_reads(self, db: Database, replicas: ReplicaSet) -> None:
+        replica_pool = replicas.engines[0].sync_engine.pool
+        checked_in = replica_pool.checkedin()
+        connection = LazyConnection(db.engine, replicas)
+
+        assert (await connection.execute(select(literal(1)))).scalar() == 1
+        assert replica_pool.checkedin() == checked_in
+        await connection.close()
+
+    @pytest.mark.asyncio
+    async def test_should_apply_coupon_once_with_lagging_replica(
+        self,
+        app: FastAPI,
+        client: AsyncClient,
+        db: Database,
+        db_connection: AsyncConnection,
+        replicas: ReplicaSet,
+        mocker: MockerFixture,
+    ) -> None:
+        coupon = await CouponFactory.create(quantity=5, name="some")
+        order_id = uuid4()
+
+        # The replica keeps seeing the tables as they were before the coupon was applied
+        stale_connection = await replicas.engines[0].connect()
+        await stale_connection.execution_options(isolation_level="REPEATABLE READ")
+        await stale_connection.execute(select(func.count()).select_from(UserCouponSchema.table))
+        checkout = lazy_connection.checkout
+
+        async def checkout_stale_replica(engine: AsyncEngine, *args: Any, **kwargs: Any) -> Any:
+            if engine is replicas.engines[0]:
+                return StaleReplicaConnection(stale_connection)
+            return await checkout(engine, *args, **kwargs)
+
+        mocker.patch.object(lazy_connection, "checkout", checkout_stale_replica)
+
+        async def get_lazy_connection() -> AsyncIterator[LazyConnection]:
+            connection = LazyConnection(db.engine, replicas)
+            try:
+                yield connection
+            finally:
+                await connection.close()
+
+        connection_override = app.dependency_overrides[db.connection]
+        app.dependency_overrides[db.connection] = get_lazy_connection
+        request_data = {
+            "user_id": str(uuid4()),
+            "warehouse_id": str(uuid4()),
+            "name": coupon.name,
+            "order_subtotal": 5000,
+            "paid_orders_count": 5,
+            "delivered_orders_count": 5,
+            "order_items": [
+                {
+                    "id": str(uuid4()),
+                    "categories_ids": [str(uuid4())],
+                    "product_id": str(uuid4()),
+                    "subtotal": 5000,
+                    "product_type": "regular",
+                    "actual_price": 1000,
+                    "quantity": 5,
+                }
+            ],
+        }
+        try:
+            # A retry of the same request
+            for _ in range(2):
+                response = await client.post(f"/coupons/orders/{order_id}", json=request_data)
+                assert response.status_code == 200
+                assert response.json()["result"]["discount_amount"] == 500
+        finally:
+            app.dependency_overrides[db.connection] = connection_override
+            await stale_connection.close()
+
+        count_statement = (
+            select(func.count()).select_from(UserCouponSchema.table).where(UserCouponSchema.order_id == order_id)
+        )
+        assert (await db_connection.execute(count_statement)).scalar() == 1
+        db_coupon = await get_coupon(db_connection, coupon_id=coupon.id)
+        assert coupon.quantity - db_coupon.quantity == 1
+
+    @pytest.mark.asyncio
+    async def test_should_serve_read_only_paths_from_replica(
+        self, app: FastAPI, client: AsyncClient, db: Database, replicas: ReplicaSet, mocker: MockerFixture
+    ) -> None:
+        coupon = await CouponFactory.create(name="replica")
+        checkout = lazy_connection.checkout
+        engines: List[AsyncEngine] = []
+
+        async def recording_checkout(engine: AsyncEngine, *args: Any, **kwargs: Any) -> Any:
+            engines.append(engine)
+            return await checkout(engine, *args, **kwargs)
+
+        mocker.patch.object(lazy_connection, "checkout", recording_checkout)
+
+        async def get_lazy_connection() -> AsyncIterator[LazyConnection]:
+            connection = LazyConnection(db.engine, replicas)
+            try:
+                yield connection
+            finally:
+                await connection.close()
+
+        connection_override = app.dependency_overrides[db.connection]
+        app.dependency_overrides[db.connection] = get_lazy_connection
+        recalculate_data = {
+            "warehouse_id": str(uuid4()),
+            "order_subtotal": 5000,
+            "paid_orders_count": 5,
+            "delivered_orders_count": 5,
+            "order_items": [
+                {
+                    "id": str(uuid4()),
+                    "categories_ids": [str(uuid4())],
+                    "product_id": str(uuid4()),
+                    "subtotal": 5000,
+                    "product_type": "regular",
+                    "actual_price": 1000,
+                    "quantity": 5,
+                }
+            ],
+        }
+        try:
+            response = await client.post(f"/coupons/{coupon.id}/orders/{uuid4()}", json=recalculate_data)
+            assert response.status_code == 200
+            response = await client.post("/banner", json={"warehouse_id": str(uuid4()), "order_subtotal": 5000})
+            assert response.status_code == 200
+        finally:
+            app.dependency_overrides[db.connection] = connection_override
+
+        # Coupon, permits, value tiers and gift settings are all read from the replica
+        assert engines and all(it is replicas.engines[0] for it in engines)
+
+    @pytest.mark.asyncio
+    async def test_should_fall_back_to_primary_for_lagging_replicas(self, db: Database, replicas: ReplicaSet) -> None:
+        replicas.mark_unavailable(replicas.engines[0])
+        replica_pool = replicas.engines[0].sync_engine.pool
+        checked_in = replica_pool.checkedin()
+        connection = LazyConnection(db.engine, replicas)
+
+        assert replicas.choose() is None
+        assert (await connection.execute(select(literal(1)))).scalar() == 1
+        assert replica_pool.checkedin() == checked_in
+        await connection.close()
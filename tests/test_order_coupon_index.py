@@ -0,0 +1,46 @@
+from uuid import uuid4
+
+import pytest
+from pytest_mock import MockerFixture
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from svc.events.initiate import create_coupon_service
+from svc.services.cache import DistributedCacheRegistry
+from svc.services.coupon.coupon_manager import CouponManager
+from svc.settings import get_service_settings
+from tests.factories.coupon import CouponFactory
+
+from .helpers import get_user_coupon
+
+
+class TestOrderCouponIndex:
+    @pytest.mark.asyncio
+    async def test_should_skip_database_for_orders_without_coupon(
+        self, db_connection: AsyncConnection, mocker: MockerFixture
+    ) -> None:
+        mocker.patch.object(get_service_settings().order_coupon_index, "authoritative", True)
+        get_current_order_coupon = mocker.spy(CouponManager, "get_current_order_coupon")
+
+        await create_coupon_service(db_connection).process_paid(uuid4())
+
+        get_current_order_coupon.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_should_follow_stored_and_reverted_coupons(
+        self, db_connection: AsyncConnection, mocker: MockerFixture
+    ) -> None:
+        mocker.patch.object(get_service_settings().order_coupon_index, "authoritative", True)
+        coupon = await CouponFactory.create(quantity=5)
+        order_id = uuid4()
+        coupon_service = create_coupon_service(db_connection)
+
+        await coupon_service.store_coupon_usage(coupon.id, uuid4(), order_id, False, None)
+        assert await DistributedCacheRegistry.order_coupons.get(order_id) == coupon.id
+
+        await coupon_service.process_paid(order_id)
+        user_coupon = await get_user_coupon(db_connection, coupon_id=coupon.id, order_id=order_id)
+        assert user_coupon and user_coupon.order_paid is True
+
+        await coupon_service.process_cancelled(order_id)
+        assert await DistributedCacheRegistry.order_coupons.get(order_id) is None
+        assert await get_user_coupon(db_connection, coupon_id=coupon.id, order_id=order_id) is None
@@ -0,0 +1,152 @@
+import asyncio
+import json
+from typing import Any, List
+from uuid import uuid4
+
+import pytest
+from pytest_mock import MockerFixture
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from svc.events.initiate import create_coupon_service
+from svc.persist.database import Database
+from svc.persist.schemas.outbox import CouponEventOutboxSchema
+from svc.services.outbox_relay import OutboxRelay
+from svc.settings import get_service_settings
+from tests.broker import InMemoryKafkaBroker
+from tests.factories.coupon import CouponFactory
+
+
+async def count_outbox(connection: AsyncConnection) -> int:
+    count = (await connection.execute(select(func.count()).select_from(CouponEventOutboxSchema.table))).scalar()
+    await connection.commit()
+    return count
+
+
+class TestCouponEventOutbox:
+    @pytest.mark.asyncio
+    async def test_should_relay_events_in_order(
+        self, db: Database, db_connection: AsyncConnection, mocker: MockerFixture
+    ) -> None:
+        mocker.patch.object(get_service_settings().coupon_events, "enabled", True)
+        coupon_service = create_coupon_service(db_connection)
+        coupon = await CouponFactory.create(quantity=5)
+        user_id, order_id = uuid4(), uuid4()
+
+        await coupon_service.store_coupon_usage(coupon.id, user_id, order_id, False, None)
+        await coupon_service.process_paid(order_id)
+        await coupon_service.revert_coupon_usage(coupon.id, order_id)
+        assert await count_outbox(db_connection) == 3
+
+        broker = InMemoryKafkaBroker()
+        settings = get_service_settings().coupon_events.copy(update={"relay_batch_size": 2, "relay_interval": 0.01})
+        relay = OutboxRelay(settings, "", db, producer_factory=broker.producer)
+        await relay.start()
+        try:
+            while len(broker.published[settings.topic]) < 3:
+                await asyncio.sleep(0.01)
+        finally:
+            await relay.stop()
+
+        events = [json.loads(it.value) for it in broker.published[settings.topic]]
+        assert [it["event"] for it in events] == ["coupon-applied", "coupon-paid", "coupon-reverted"]
+        assert {(it["coupon_id"], it["order_id"]) for it in events} == {(str(coupon.id), str(order_id))}
+        assert events[0]["user_id"] == str(user_id)
+        assert {it.key for it in broker.published[settings.topic]} == {str(order_id).encode()}
+        assert await count_outbox(db_connection) == 0
+
+    @pytest.mark.asyncio
+    async def test_should_not_hold_transaction_while_sending(
+        self, db: Database, db_connection: AsyncConnection, mocker: MockerFixture
+    ) -> None:
+        mocker.patch.object(get_service_settings().coupon_events, "enabled", True)
+        coupon_service = create_coupon_service(db_connection)
+        coupon = await CouponFactory.create(quantity=5)
+        await coupon_service.store_coupon_usage(coupon.id, uuid4(), uuid4(), False, None)
+
+        broker = InMemoryKafkaBroker()
+        producer = broker.producer()
+        send = producer.send
+        open_transactions: List[int] = []
+
+        async def observing_send(*args: Any, **kwargs: Any) -> Any:
+            async with db.engine.connect() as connection:
+                statement = text(
+                    "SELECT count(*) FROM pg_stat_activity "
+                    "WHERE state = 'idle in transaction' AND query ILIKE '%promotion_coupon_events_outbox%'"
+                )
+                open_transactions.append((await connection.execute(statement)).scalar())
+            return await send(*args, **kwargs)
+
+        producer.send = observing_send
+        settings = get_service_settings().coupon_events.copy(update={"relay_interval": 0.01})
+        relay = OutboxRelay(settings, "", db, producer_factory=lambda **kwargs: producer)
+        await relay.start()
+        try:
+            while await count_outbox(db_connection):
+                await asyncio.sleep(0.01)
+        finally:
+            await relay.stop()
+
+        assert len(broker.published[settings.topic]) == 1
+        assert open_transactions == [0]
+
+    @pytest.mark.asyncio
+    async def test_should_stop_relaying_before_stopping_producer(
+        self, db: Database, db_connection: AsyncConnection, mocker: MockerFixture
+    ) -> None:
+        mocker.patch.object(get_service_settings().coupon_events, "enabled", True)
+        coupon_service = create_coupon_service(db_connection)
+        coupon = await CouponFactory.create(quantity=5)
+        await coupon_service.store_coupon_usage(coupon.id, uuid4(), uuid4(), False, None)
+
+        producer = InMemoryKafkaBroker().producer()
+        stop = producer.stop
+        sending = asyncio.Event()
+        steps: List[str] = []
+
+        async def blocked_send(*args: Any, **kwargs: Any) -> Any:
+            sending.set()
+            try:
+                await asyncio.Event().wait()
+            finally:
+                steps.append("send cancelled")
+
+        async def observing_stop() -> None:
+            steps.append("producer stopped")
+            await stop()
+
+        producer.send = blocked_send
+        producer.stop = observing_stop
+        relay = OutboxRelay(get_service_settings().coupon_events, "", db, producer_factory=lambda **kwargs: producer)
+        await relay.start()
+        await asyncio.wait_for(sending.wait(), 1)
+        await relay.stop()
+
+        assert steps == ["send cancelled", "producer stopped"]
+        assert await count_outbox(db_connection) == 1
+
+    @pytest.mark.asyncio
+    async def test_should_write_batch_events(self, db_connection: AsyncConnection, mocker: MockerFixture) -> None:
+        mocker.patch.object(get_service_settings().coupon_events, "enabled", True)
+        coupon_service = create_coupon_service(db_connection)
+        coupon = await CouponFactory.create(quantity=5)
+        order_ids = [uuid4() for _ in range(3)]
+        for order_id in order_ids:
+            await coupon_service.store_coupon_usage(coupon.id, uuid4(), order_id, False, None)
+
+        assert await coupon_service.process_paid_batch(order_ids) == 3
+        # Already paid coupons don't change and get no event
+        assert await coupon_service.process_paid_batch(order_ids) == 0
+        await coupon_service.process_cancelled_batch(order_ids[:1])
+
+        assert await count_outbox(db_connection) == 7
+
+    @pytest.mark.asyncio
+    async def test_should_not_write_events_when_disabled(self, db_connection: AsyncConnection) -> None:
+        coupon_service = create_coupon_service(db_connection)
+        coupon = await CouponFactory.create(quantity=5)
+
+        await coupon_service.store_coupon_usage(coupon.id, uuid4(), uuid4(), False, None)
+
+        assert await count_outbox(db_connection) == 0
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import literal, select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from svc.persist.database import Database
+from svc.persist.lazy_connection import LazyConnection
+from svc.persist.pool import PoolQueueFullError, PoolValidator, checkout, instrument_pool
+from svc.settings import get_service_settings
+
+
+def get_sample(name: str) -> float:
+    return REGISTRY.get_sample_value(f"promotion_{name}", {"pool": "main"}) or 0
+
+
+class TestPoolInstrumentation:
+    @pytest.mark.asyncio
+    async def test_should_observe_checkouts(self, db: Database) -> None:
+        checkouts = get_sample("db_pool_checkout_seconds_count")
+        connection_ages = get_sample("db_pool_connection_age_seconds_count")
+
+        await LazyConnection(db.engine).execute(select(literal(1)))
+
+        assert get_sample("db_pool_checkout_seconds_count") == checkouts + 1
+        assert get_sample("db_pool_connection_age_seconds_count") == connection_ages + 1
+        assert get_sample("db_pool_checked_out") == db.engine.sync_engine.pool.checkedout()
+
+    @pytest.mark.asyncio
+    async def test_should_validate_idle_connections(self, db: Database) -> None:
+        await LazyConnection(db.engine).execute(select(literal(1)))
+        pool = db.engine.sync_engine.pool
+        idle = pool.checkedin()
+        invalidations = get_sample("db_pool_invalidations_total")
+
+        await PoolValidator(db.engine, interval=60).validate()
+
+        assert pool.checkedin() == idle
+        assert get_sample("db_pool_invalidations_total") == invalidations
+
+    @pytest.mark.asyncio
+    async def test_should_reject_checkouts_beyond_queue_limit(self) -> None:
+        engine = create_async_engine(get_service_settings().db.url, pool_size=1, max_overflow=0)
+        instrument_pool(engine, "test_bulkhead", queue_limit=1)
+        try:
+            held = await checkout(engine)
+            waiting = asyncio.create_task(checkout(engine))
+            await asyncio.sleep(0.05)
+
+            with pytest.raises(PoolQueueFullError):
+                await checkout(engine)
+
+            await held.close()
+            await (await waiting).close()
+        finally:
+            await engine.dispose()
@@ -0,0 +1,86 @@
+from uuid import uuid4
+
+import pytest
+
+from svc.api.models.order import ProductType
+from svc.events.consumer import create_consumer
+from svc.infrastructure.pricing.models import ProductsPricesItemCacheKey
+from svc.persist.database import Database
+from svc.services.cache import DistributedCacheRegistry
+from svc.settings import get_service_settings
+from tests.broker import InMemoryKafkaBroker
+
+PRICE_CHANGED_TOPIC = "pricing.product.price.changed"
+
+
+class TestPriceChangedMessage:
+    @pytest.mark.asyncio
+    async def test_should_overwrite_and_evict_cached_prices(self, db: Database) -> None:
+        warehouse_id = uuid4()
+        changed_id, removed_id, regular_id = uuid4(), uuid4(), uuid4()
+        cache = DistributedCacheRegistry()
+        await cache.purchase_prices.multi_set(
+            [
+                (ProductsPricesItemCacheKey(product_id=changed_id, warehouse_id=warehouse_id), 10),
+                (ProductsPricesItemCacheKey(product_id=removed_id, warehouse_id=warehouse_id), 20),
+            ]
+        )
+
+        broker = InMemoryKafkaBroker()
+        broker.publish(
+            PRICE_CHANGED_TOPIC,
+            {
+                "event": "pricing-price-changed",
+                "warehouse_id": str(warehouse_id),
+                "items": [
+                    {"product_id": str(changed_id), "product_type": ProductType.alcohol, "purchase_price": 15},
+                    {"product_id": str(removed_id), "product_type": ProductType.alcohol, "purchase_price": None},
+                    {"product_id": str(regular_id), "product_type": ProductType.regular, "purchase_price": 30},
+                ],
+            },
+        )
+        consumer = create_consumer(
+            get_service_settings(), db, client_factory=broker.client, producer_factory=broker.producer
+        )
+        await consumer.start()
+        await broker.join()
+        await consumer.stop()
+
+        prices = await cache.purchase_prices.multi_get(
+            [
+                ProductsPricesItemCacheKey(product_id=changed_id, warehouse_id=warehouse_id),
+                ProductsPricesItemCacheKey(product_id=removed_id, warehouse_id=warehouse_id),
+                ProductsPricesItemCacheKey(product_id=regular_id, warehouse_id=warehouse_id),
+            ]
+        )
+        assert prices == [15, None, None], "Only alcohol prices should be cached"
+
+    @pytest.mark.asyncio
+    async def test_should_warm_up_stale_prices(
+        self, db: Database, mocker, mock_pricing_get_prices_with_items_purchase
+    ) -> None:
+        warehouse_id = uuid4()
+        product_id = uuid4()
+        mocker.patch.object(get_service_settings().price_events, "warm_up_enabled", True)
+
+        broker = InMemoryKafkaBroker()
+        broker.publish(
+            PRICE_CHANGED_TOPIC,
+            {
+                "event": "pricing-price-changed",
+                "warehouse_id": str(warehouse_id),
+                "items": [{"product_id": str(product_id), "product_type": ProductType.alcohol}],
+            },
+        )
+        consumer = create_consumer(
+            get_service_settings(), db, client_factory=broker.client, producer_factory=broker.producer
+        )
+        await consumer.start()
+        await broker.join()
+        await consumer.stop()
+
+        price = await DistributedCacheRegistry().purchase_prices.get(
+            ProductsPricesItemCacheKey(product_id=product_id, warehouse_id=warehouse_id)
+        )
+        assert price == 50
+        assert mock_pricing_get_prices_with_items_purchase.call_count == 1
@@ -0,0 +1,114 @@
+from decimal import Decimal
+from pathlib import Path
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from svc.infrastructure.snapshot import SnapshotStore, SnapshotWriter
+from svc.persist.schemas.coupon import CouponSchema
+from svc.services.coupon.coupon_manager import CouponManager
+from svc.services.snapshot import SnapshotSection, promotion_snapshot
+from svc.services.snapshot_builder import PromotionSnapshotBuilder
+from svc.settings import get_service_settings
+from tests.factories.conditions_settings import WarehouseBonusSettingsFactory
+from tests.factories.coupon import CouponFactory
+from tests.factories.coupon_orders_number import CouponOrderNumber
+from tests.factories.coupon_permit_warehouse import CouponPermitWarehouseFactory
+from tests.factories.gift_promotion_setting import GiftPromotionSettingsFactory
+
+
+class TestSnapshotStore:
+    def test_should_swap_published_versions(self, tmp_path: Path) -> None:
+        path = str(tmp_path / "promotion.snapshot")
+        keys = [uuid4() for _ in range(100)]
+        writer = SnapshotWriter(version=1)
+        for i, key in enumerate(keys):
+            writer.add("items", key, {"value": i})
+        writer.add("names", "Coupon", {"value": "coupon"})
+        writer.write(path)
+
+        store = SnapshotStore(path)
+        assert store.reload()
+        assert [store.get("items", it) for it in keys] == [{"value": i} for i in range(100)]
+        assert store.get("names", "Coupon") == {"value": "coupon"}
+        assert store.get("names", "missing") is None
+        assert store.get("missing", "Coupon") is None
+        assert not store.reload()
+
+        store.invalidate("items", [keys[0]], version=2)
+        assert store.get("items", keys[0]) is None
+
+        writer = SnapshotWriter(version=3)
+        writer.add("items", keys[0], {"value": "new"})
+        writer.write(path)
+
+        assert store.reload()
+        assert store.version == 3
+        assert store.get("items", keys[0]) == {"value": "new"}
+        assert store.get("items", keys[1]) is None
+
+    def test_should_search_id_lists_in_place(self, tmp_path: Path) -> None:
+        path = str(tmp_path / "promotion.snapshot")
+        key, ids = uuid4(), [uuid4() for _ in range(100)]
+        writer = SnapshotWriter(version=1)
+        writer.add_ids("ids", key, ids)
+        writer.add_ids("ids", "empty", [])
+        writer.write(path)
+
+        store = SnapshotStore(path)
+        assert store.reload()
+        assert (found := store.get_ids("ids", key)) is not None
+        assert len(found) == 100 and all(it in found for it in ids) and uuid4() not in found
+        assert list(found) == sorted(ids, key=lambda it: it.bytes)
+        assert (empty := store.get_ids("ids", "empty")) is not None and not empty
+        assert store.get_ids("ids", "missing") is None
+
+        store.invalidate("ids", [key], version=2)
+        assert store.get_ids("ids", key) is None
+
+
+class TestPromotionSnapshotBuilder:
+    @pytest.mark.asyncio
+    async def test_should_serve_promotions_from_snapshot(
+        self,
+        tmp_path: Path,
+        db_connection: AsyncConnection,
+        conditions_db_connection: AsyncConnection,
+    ) -> None:
+        warehouse_id = uuid4()
+        coupon = await CouponFactory.create(name="SnapShot")
+        limited_coupon = await CouponFactory.create(quantity=5)
+        await CouponPermitWarehouseFactory.create(coupon_id=coupon.id, warehouse_id=warehouse_id)
+        await CouponOrderNumber.create(coupon_id=coupon.id, orders_number=2, coupon_value=25)
+        gift = await GiftPromotionSettingsFactory.create(warehouse_id=warehouse_id)
+        await WarehouseBonusSettingsFactory.create(warehouse_id=warehouse_id, required_subtotal=5000)
+
+        path = str(tmp_path / "promotion.snapshot")
+        writer = await PromotionSnapshotBuilder(db_connection, conditions_db_connection).build(version=1)
+        writer.write(path)
+        store = SnapshotStore(path)
+        store.reload()
+
+        assert store.get(SnapshotSection.coupons, "snapshot")["id"] == str(coupon.id)
+        assert store.get(SnapshotSection.coupons, limited_coupon.name.lower()) is None
+        assert list(store.get_ids(SnapshotSection.coupon_warehouses, coupon.id)) == [warehouse_id]
+        assert len(store.get_ids(SnapshotSection.coupon_users, coupon.id)) == 0
+        assert Decimal(store.get(SnapshotSection.coupon_tiers, coupon.id)["2"]) == 25
+        assert [it["id"] for it in store.get(SnapshotSection.gift_promotion_settings, warehouse_id)] == [gift.id]
+        assert store.get(SnapshotSection.warehouse_bonus_settings, warehouse_id)["required_subtotal"] == 5000
+
+        promotion_snapshot.path = path
+        try:
+            assert promotion_snapshot.reload()
+            # Rows are gone, the answers come from the snapshot
+            await db_connection.execute(CouponSchema.table.delete().where(CouponSchema.id == coupon.id))
+            manager = CouponManager(db_connection, get_service_settings())
+
+            found = await manager.get_active_coupon_by_name("SNAPSHOT")
+            assert found is not None and found.id == coupon.id
+            assert await manager.is_permitted_warehouse(warehouse_id, coupon.id)
+            assert not await manager.is_permitted_warehouse(uuid4(), coupon.id)
+        finally:
+            promotion_snapshot.close()
+            promotion_snapshot.path = get_service_settings().snapshot.path
@@ -0,0 +1,74 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from svc.persist.schemas.coupon import CouponSchema
+from svc.services.cache import ReadThroughCache, TimeBound
+from svc.services.coupon.coupon_manager import CouponManager
+from svc.services.gift.gift_manager import GiftManager
+from svc.settings import get_service_settings
+from tests.factories.coupon import CouponFactory
+from tests.factories.gift_promotion_setting import GiftPromotionSettingsFactory
+
+
+class TestTimeBoundExpiry:
+    @pytest.mark.asyncio
+    async def test_should_expire_value_at_boundary(self) -> None:
+        cache = ReadThroughCache[tuple[int], TimeBound[str]]("test_time_bound", ttl=60)
+        valid_till = datetime.now(timezone.utc) + timedelta(milliseconds=100)
+
+        await cache.set((1,), TimeBound(value="current", valid_till=valid_till))
+        await cache.set((2,), TimeBound(value="expired", valid_till=datetime.now(timezone.utc)))
+        await cache.set((3,), TimeBound(value="unbound"))
+
+        assert (await cache.get((1,))) == TimeBound(value="current", valid_till=valid_till)
+        assert await cache.get((2,)) is None
+
+        await asyncio.sleep(0.2)
+        assert await cache.get((1,)) is None
+        assert await cache.get((3,)) == TimeBound(value="unbound")
+
+
+class TestGiftPromotionSettingsWindow:
+    @pytest.mark.asyncio
+    async def test_should_switch_settings_at_boundary(self, db_connection: AsyncConnection) -> None:
+        warehouse_id = uuid4()
+        switch_at = datetime.now(timezone.utc) + timedelta(milliseconds=300)
+        current = await GiftPromotionSettingsFactory.create(warehouse_id=warehouse_id, date_till=switch_at)
+        upcoming = await GiftPromotionSettingsFactory.create(warehouse_id=warehouse_id, date_from=switch_at)
+        manager = GiftManager(db_connection, get_service_settings())
+
+        settings = await manager.get_active_gift_promotion_settings(warehouse_id)
+        assert settings is not None and settings.id == current.id
+
+        await asyncio.sleep(0.4)
+        settings = await manager.get_active_gift_promotion_settings(warehouse_id)
+        assert settings is not None and settings.id == upcoming.id
+
+
+class TestActiveCouponExpiry:
+    @pytest.mark.asyncio
+    async def test_should_expire_coupon_at_valid_till(self, db_connection: AsyncConnection) -> None:
+        coupon = await CouponFactory.create(valid_till=datetime.now(timezone.utc) + timedelta(milliseconds=300))
+        manager = CouponManager(db_connection, get_service_settings())
+
+        assert (found := await manager.get_active_coupon_by_name(coupon.name)) and found.id == coupon.id
+        # Cached copies stay intact when callers adjust the value
+        value, found.value = found.value, 0
+        assert (found := await manager.get_active_coupon_by_name(coupon.name)) and found.value == value
+
+        await asyncio.sleep(0.4)
+        assert await manager.get_active_coupon_by_name(coupon.name) is None
+
+    @pytest.mark.asyncio
+    async def test_should_not_cache_coupon_with_quantity(self, db_connection: AsyncConnection) -> None:
+        coupon = await CouponFactory.create(quantity=5)
+        manager = CouponManager(db_connection, get_service_settings())
+
+        assert (found := await manager.get_active_coupon_by_name(coupon.name)) and found.quantity == 5
+        await db_connection.execute(CouponSchema.table.update().where(CouponSchema.id == coupon.id).values(quantity=4))
+
+        assert (found := await manager.get_active_coupon_by_name(coupon.name)) and found.quantity == 4
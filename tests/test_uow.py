@@ -0,0 +1,68 @@
+from unittest.mock import AsyncMock
+
+import pytest
+from pytest_mock import MockerFixture
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from svc.services.coupon.coupon_manager import CouponManager
+from svc.services.uow import UnitOfWork
+from svc.settings import get_service_settings
+from tests.factories.coupon import CouponFactory
+
+from .helpers import get_coupon
+
+
+class TestUnitOfWork:
+    @pytest.mark.asyncio
+    async def test_should_share_request_scoped_transaction(
+        self, db_connection: AsyncConnection, mocker: MockerFixture
+    ) -> None:
+        mocker.patch.object(get_service_settings().uow, "request_scoped", True)
+        uow = UnitOfWork(connection=db_connection, config=get_service_settings())
+        coupon_manager = CouponManager(connection=db_connection, config=get_service_settings())
+        coupon = await CouponFactory.create(quantity=5)
+        callback = AsyncMock()
+
+        async with uow.transaction():
+            async with uow.begin():
+                await coupon_manager.increment_coupon_quantity(coupon.id)
+
+            with pytest.raises(RuntimeError):
+                async with uow.begin():
+                    await coupon_manager.increment_coupon_quantity(coupon.id)
+                    raise RuntimeError()
+
+            await uow.on_commit(callback)
+            callback.assert_not_awaited()
+
+        callback.assert_awaited_once()
+        assert (await get_coupon(db_connection, coupon_id=coupon.id)).quantity == 6
+
+    @pytest.mark.asyncio
+    async def test_should_roll_back_request_scoped_transaction(
+        self, db_connection: AsyncConnection, mocker: MockerFixture
+    ) -> None:
+        mocker.patch.object(get_service_settings().uow, "request_scoped", True)
+        uow = UnitOfWork(connection=db_connection, config=get_service_settings())
+        coupon_manager = CouponManager(connection=db_connection, config=get_service_settings())
+        coupon = await CouponFactory.create(quantity=5)
+        callback = AsyncMock()
+
+        with pytest.raises(RuntimeError):
+            async with uow.transaction():
+                async with uow.begin():
+                    await coupon_manager.increment_coupon_quantity(coupon.id)
+                await uow.on_commit(callback)
+                raise RuntimeError()
+
+        callback.assert_not_awaited()
+        assert (await get_coupon(db_connection, coupon_id=coupon.id)).quantity == 5
+
+    @pytest.mark.asyncio
+    async def test_should_reject_writes_in_read_only_mode(self, db_connection: AsyncConnection) -> None:
+        uow = UnitOfWork(connection=db_connection, config=get_service_settings())
+
+        async with uow.read_only():
+            with pytest.raises(RuntimeError):
+                async with uow.begin():
+                    pass
@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from pytest_mock import MockerFixture
+from warehouse.api_client.client import WarehouseGeneralClient
+from warehouse.models.warehouse import WarehouseListFilters
+
+from svc.infrastructure.warehouse.warehouse_manager import WarehouseManager
+from svc.services.adapters.warehouse_adapter import WarehouseAdapter
+from svc.services.adapters.warehouse_directory import WarehouseDirectory
+from svc.services.cache import LocalCacheRegistry
+from svc.settings import CacheRegistryConfig
+
+
+class TestWarehouseDirectory:
+    @pytest.mark.asyncio
+    async def test_should_preload_all_pages(self, mocker: MockerFixture, get_warehouse_mocked) -> None:
+        warehouse_ids = [uuid4() for _ in range(5)]
+
+        async def list_warehouses(filters: WarehouseListFilters) -> SimpleNamespace:
+            page = warehouse_ids[filters.offset : filters.offset + filters.limit]
+            return SimpleNamespace(
+                error=None,
+                result=SimpleNamespace(
+                    items=[SimpleNamespace(id=it, active=True, tz="America/Chicago") for it in page],
+                ),
+            )
+
+        client = WarehouseGeneralClient.instance()
+        list_mock = mocker.patch.object(client.warehouse, "list_warehouses", wraps=list_warehouses)
+
+        directory = WarehouseDirectory(CacheRegistryConfig(warehouses_page_size=2))
+        assert directory.ready is False
+
+        manager = WarehouseManager(client)
+        await directory.refresh(manager)
+
+        assert directory.ready is True
+        assert list_mock.call_count == 3
+        adapter = WarehouseAdapter(manager, LocalCacheRegistry(), directory)
+        for warehouse_id in warehouse_ids:
+            assert (await adapter.get_warehouse(warehouse_id)).id == warehouse_id
+        assert client.warehouse.get_warehouse.call_count == 0
+
+        unknown_id = uuid4()
+        assert (await adapter.get_warehouse(unknown_id)).id == unknown_id
+        assert client.warehouse.get_warehouse.call_count == 1
+        assert directory.get(unknown_id) is not None